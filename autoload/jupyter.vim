@@ -18,11 +18,11 @@ function! s:init_python() abort
           \ '',
           \ '# Import',
           \ 'try:',
-          \ '    from jupyter_vim import JupyterVimSession',
-          \ '    _jupyter_session = JupyterVimSession()',
+          \ '    from jupyter_vim import SessionRegistry',
+          \ '    _jupyter_sessions = SessionRegistry()',
           \
           \ '    # For direct calls',
-          \ '    from jupyter_util import str_to_py, find_jupyter_kernel_ids, find_signals',
+          \ '    from jupyter_util import str_to_py, find_signals, find_kernel_names',
           \ 'except Exception as exc:',
           \ '    vim.bindeval("s:")["init_outcome"] = ("could not import jupyter_vim <- {0}: {1}".format(exc.__class__.__name__, exc))',
           \ 'else:',
@@ -52,6 +52,7 @@ function! jupyter#init_python() abort
     try
         let s:_init_python = s:init_python()
         let s:_init_python = 1
+        call s:watch_exec_hooks()
     catch /^\[jupyter-vim\]/
         " Only catch errors from jupyter-vim itself here, so that for
         " unexpected Python exceptions the traceback will be shown
@@ -68,35 +69,117 @@ function! jupyter#init_python() abort
     return s:_init_python
 endfunction
 
-" Do not initialize python until this autoload script is called for
-" a compatible filetype (usually via jupyter#Connect).
-call jupyter#init_python()
+" Python is initialized by the first function needing it, not when this
+" script is loaded: opening a file stays fast until jupyter-vim is used.
+
+" Python keeps a snapshot of b:jupyter_exec_* per buffer, checked against
+" their values at each send: only drop it with the buffer
+function! s:watch_exec_hooks() abort
+    augroup JupyterExecHooks
+        autocmd!
+        autocmd BufWipeout * call jupyter#ExecHooksChanged(str2nr(expand('<abuf>')))
+    augroup END
+endfunction
+
+" The b:jupyter_exec_* of the current buffer, read by python when they change
+function! jupyter#ExecHooks() abort
+    return map(['before', 'pre', 'post', 'after'],
+                \ {_, name -> get(b:, 'jupyter_exec_' . name, '')})
+endfunction
+
+" Drop the snapshot of buffer a:1, of all buffers if none or 0
+function! jupyter#ExecHooksChanged(...) abort
+    if s:_init_python != 1 | return | endif
+    execute 'python3 _jupyter_sessions.invalidate_exec_hooks(' . get(a:, 1, 0) . ')'
+endfunction
 
 "-----------------------------------------------------------------------------
 "        Vim -> Jupyter Public Functions:
 "-----------------------------------------------------------------------------
 
 function! jupyter#Connect(...) abort
+    if !jupyter#init_python() | return | endif
     let l:kernel_file = a:0 > 0 ? a:1 : '*.json'
-    python3 _jupyter_session.connect_to_kernel(
+    python3 _jupyter_sessions.connect(
                 \ str_to_py(vim.current.buffer.vars['jupyter_kernel_type']),
                 \ filename=vim.eval('l:kernel_file'))
 endfunction
 
 function! jupyter#CompleteConnect(ArgLead, CmdLine, CursorPos) abort
-    " Get kernel id from python
-    let l:kernel_ids = py3eval('find_jupyter_kernel_ids()')
+    if !jupyter#init_python() | return [] | endif
+    " Get the ids of the live kernels from python, cached
+    let l:kernel_ids = py3eval('_jupyter_sessions.discovery.kernel_ids()')
     " Filter id matching user arg
     call filter(l:kernel_ids, '-1 != match(v:val, a:ArgLead)')
     " Return list
     return l:kernel_ids
 endfunction
 
+function! jupyter#Start(...) abort
+    if !jupyter#init_python() | return | endif
+    let l:kernel_name = a:0 > 0 ? a:1 : ''
+    python3 _jupyter_sessions.start_kernel(
+                \ str_to_py(vim.current.buffer.vars['jupyter_kernel_type']),
+                \ vim.eval('l:kernel_name'))
+endfunction
+
+function! jupyter#CompleteStart(ArgLead, CmdLine, CursorPos) abort
+    if !jupyter#init_python() | return [] | endif
+    let l:kernel_names = py3eval('find_kernel_names()')
+    return filter(l:kernel_names, '-1 != match(v:val, a:ArgLead)')
+endfunction
+
+" Start the kernels of g:jupyter_pool, i.e. from an autocmd
+function! jupyter#StartPool() abort
+    if !jupyter#init_python() | return | endif
+    python3 _jupyter_sessions.start_pool()
+endfunction
+
+function! jupyter#Stats(reset, ...) abort
+    if !jupyter#init_python() | return | endif
+    let l:filename = a:0 > 0 ? fnamemodify(a:1, ':p') : ''
+    python3 _jupyter_sessions.show_stats(vim.eval('l:filename'),
+                \ bool(int(vim.eval('a:reset'))))
+endfunction
+
+function! jupyter#TraceStart(keep, ...) abort
+    if !jupyter#init_python() | return | endif
+    let l:size = a:0 > 0 ? a:1 : 0
+    python3 _jupyter_sessions.trace_start(int(vim.eval('l:size')),
+                \ bool(int(vim.eval('a:keep'))))
+endfunction
+
+function! jupyter#TraceStop(...) abort
+    if !jupyter#init_python() | return | endif
+    let l:filename = a:0 > 0 ? fnamemodify(a:1, ':p') : ''
+    python3 _jupyter_sessions.trace_stop(vim.eval('l:filename'))
+endfunction
+
+function! jupyter#TraceSave(filename) abort
+    if !jupyter#init_python() | return | endif
+    let l:filename = fnamemodify(a:filename, ':p')
+    python3 _jupyter_sessions.trace_save(vim.eval('l:filename'))
+endfunction
+
+function! jupyter#ListKernels() abort
+    if !jupyter#init_python() | return | endif
+    python3 _jupyter_sessions.list_kernels()
+endfunction
+
+" Kernel and connection state of the current buffer, for the statusline:
+" never initializes python
+function! jupyter#Status() abort
+    if s:_init_python != 1 | return '' | endif
+    return py3eval('_jupyter_sessions.status()')
+endfunction
+
 function! jupyter#Disconnect(...) abort
-    python3 _jupyter_session.disconnect_from_kernel()
+    if !jupyter#init_python() | return | endif
+    python3 _jupyter_sessions.disconnect()
 endfunction
 
 function! jupyter#JupyterCd(...) abort 
+    if !jupyter#init_python() | return | endif
     " Behaves just like typical `cd`.
     let l:dirname = a:0 ? a:1 : '$HOME'
     " Helpers:
@@ -107,29 +190,72 @@ function! jupyter#JupyterCd(...) abort
     " Expand (to get %)
     let l:dirname = expand(l:dirname)
     let l:dirname = escape(l:dirname, '"')
-    python3 _jupyter_session.change_directory(vim.eval('l:dirname'))
+    python3 _jupyter_sessions.current().change_directory(vim.eval('l:dirname'))
 endfunction
 
 function! jupyter#RunFile(...) abort
+    if !jupyter#init_python() | return | endif
     " filename is the last argument on the command line
     let l:flags = (a:0 > 1) ? join(a:000[:-2], ' ') : ''
     let l:filename = a:0 ? a:000[-1] : expand('%:p')
-    python3 _jupyter_session.run_file(
+    python3 _jupyter_sessions.current().run_file(
                 \ flags=vim.eval('l:flags'),
                 \ filename=vim.eval('l:filename'))
 endfunction
 
 function! jupyter#SendCell() abort
-    python3 _jupyter_session.run_cell()
+    if !jupyter#init_python() | return | endif
+    python3 _jupyter_sessions.current().run_cell()
+endfunction
+
+function! jupyter#SendAllCells() abort
+    if !jupyter#init_python() | return | endif
+    python3 _jupyter_sessions.current().run_cells()
+endfunction
+
+function! jupyter#SendCellsAbove() abort
+    if !jupyter#init_python() | return | endif
+    python3 _jupyter_sessions.current().run_cells(above=True)
+endfunction
+
+function! jupyter#SendCellAll(shard, ...) abort
+    if !jupyter#init_python() | return | endif
+    python3 _jupyter_sessions.send_cell_all(vim.eval('a:000'), bool(int(vim.eval('a:shard'))))
+endfunction
+
+function! jupyter#SendRangeAll(shard, ...) range abort
+    if !jupyter#init_python() | return | endif
+    execute a:firstline . ',' . a:lastline . 'python3 _jupyter_sessions.send_range_all('
+          \ . 'vim.eval("a:000"), bool(int(vim.eval("a:shard"))))'
+endfunction
+
+function! jupyter#CompleteSessions(ArgLead, CmdLine, CursorPos) abort
+    if !jupyter#init_python() | return [] | endif
+    let l:kernel_ids = py3eval('list(_jupyter_sessions.sessions)')
+    return filter(l:kernel_ids, '-1 != match(v:val, a:ArgLead)')
+endfunction
+
+function! jupyter#JumpCell(count) abort
+    if !jupyter#init_python() | return | endif
+    execute 'python3 _jupyter_sessions.current().jump_cell(' . a:count . ')'
 endfunction
 
 function! jupyter#SendCode(code) abort
+    if !jupyter#init_python() | return | endif
     " NOTE: 'run_command' gives more checks than just raw 'send'
-    python3 _jupyter_session.run_command(vim.eval('a:code'))
+    python3 _jupyter_sessions.current().run_command(vim.eval('a:code'))
 endfunction
 
 function! jupyter#SendRange() range abort
-    execute a:firstline . ',' . a:lastline . 'python3 _jupyter_session.send_range()'
+    if !jupyter#init_python() | return | endif
+    execute a:firstline . ',' . a:lastline . 'python3 _jupyter_sessions.current().send_range()'
+endfunction
+
+function! jupyter#SendBufferAsVariable(raw, name, ...) abort
+    if !jupyter#init_python() | return | endif
+    let l:filename = a:0 > 0 ? fnamemodify(a:1, ':p') : ''
+    python3 _jupyter_sessions.current().send_buffer_as_variable(
+                \ vim.eval('a:name'), vim.eval('l:filename'), bool(int(vim.eval('a:raw'))))
 endfunction
 
 function! jupyter#SendCount(count) abort
@@ -150,6 +276,7 @@ function! jupyter#SendCount(count) abort
 endfunction
 
 function! jupyter#TerminateKernel(kill, ...) abort
+    if !jupyter#init_python() | return | endif
     if a:kill && !has('win32') && !has('win64')
         let l:sig='SIGKILL'
     elseif a:0 > 0
@@ -158,10 +285,11 @@ function! jupyter#TerminateKernel(kill, ...) abort
     else
         let l:sig='SIGTERM'
     endif
-    execute 'python3 _jupyter_session.signal_kernel("'.l:sig.'")'
+    execute 'python3 _jupyter_sessions.current().signal_kernel("'.l:sig.'")'
 endfunction
 
 function! jupyter#CompleteTerminateKernel(ArgLead, CmdLine, CursorPos) abort
+    if !jupyter#init_python() | return [] | endif
     " Get signals from Python
     let l:signals = py3eval('find_signals()')
     " Filter signal with user arg
@@ -170,12 +298,35 @@ function! jupyter#CompleteTerminateKernel(ArgLead, CmdLine, CursorPos) abort
     return l:signals
 endfunction
 
-function! jupyter#StartMonitor() abort
-    python3 _jupyter_session.start_monitor()
+function! jupyter#StartMonitor(...) abort
+    if !jupyter#init_python() | return | endif
+    python3 _jupyter_sessions.start_monitor(vim.eval('a:000'))
+endfunction
+
+function! jupyter#CompleteMonitor(ArgLead, CmdLine, CursorPos) abort
+    let l:args = ['channels=shell,iopub,control', 'types=', 'types=-status,-execute_input',
+          \ 'mine', 'maxlen=']
+    return filter(l:args, 'v:val =~# ''^'' . a:ArgLead')
 endfunction
 
 function! jupyter#StopMonitor() abort
-    python3 _jupyter_session.stop_monitor()
+    if !jupyter#init_python() | return | endif
+    python3 _jupyter_sessions.stop_monitor()
+endfunction
+
+function! jupyter#Show(expr) abort
+    if !jupyter#init_python() | return | endif
+    python3 _jupyter_sessions.show(vim.eval('a:expr'))
+endfunction
+
+function! jupyter#Fetch(expr) abort
+    if !jupyter#init_python() | return | endif
+    python3 _jupyter_sessions.fetch(vim.eval('a:expr'))
+endfunction
+
+function! jupyter#Variables() abort
+    if !jupyter#init_python() | return | endif
+    python3 _jupyter_sessions.start_variables()
 endfunction
 
 
@@ -189,9 +340,20 @@ function! jupyter#PythonDbstop() abort
     normal! j
 endfunction
 
-" Timer callback to fill jupyter console buffer
+" Open the channel on which the kernel thread wakes vim up
+function! jupyter#OpenWakeupChannel(port) abort
+    let s:wakeup_channel = ch_open('127.0.0.1:' . a:port,
+          \ {'mode': 'raw', 'callback': 'jupyter#Wakeup'})
+endfunction
+
+" Channel callback: display what the kernel thread queued
+function! jupyter#Wakeup(channel, msg) abort
+    python3 _jupyter_sessions.drain()
+endfunction
+
+" Timer callback, when vim cannot be woken up by a channel
 function! jupyter#UpdateEchom(timer) abort
-    python3 _jupyter_session.kernel_client.timer_echom()
+    python3 _jupyter_sessions.drain()
 endfunction
 
 "=============================================================================
@@ -0,0 +1,69 @@
+"=============================================================================
+"     File: autoload/jupyter/bridge.vim
+"
+"  Description: Run the kernel client in a bridge process (python3/jupyter_bridge.py)
+"               and display its events, see g:jupyter_bridge
+"
+"=============================================================================
+
+" Bridge job of each kernel, by name
+let s:jobs = {}
+
+" Start the bridge job `name`, if not running. Returns 1 on success.
+function! jupyter#bridge#Start(name, script) abort
+    if jupyter#bridge#IsRunning(a:name) | return 1 | endif
+    let s:jobs[a:name] = job_start([get(g:, 'jupyter_bridge_python', 'python3'), a:script], {
+          \ 'mode': 'json',
+          \ 'callback': function('jupyter#bridge#OnEvent', [a:name]),
+          \ 'err_cb': 'jupyter#bridge#OnError',
+          \ 'noblock': 1,
+          \ })
+    return jupyter#bridge#IsRunning(a:name)
+endfunction
+
+function! jupyter#bridge#IsRunning(name) abort
+    return has_key(s:jobs, a:name) && job_status(s:jobs[a:name]) ==# 'run'
+endfunction
+
+function! jupyter#bridge#Stop(name) abort
+    if jupyter#bridge#IsRunning(a:name)
+        call job_stop(s:jobs[a:name])
+    endif
+    silent! call remove(s:jobs, a:name)
+endfunction
+
+" Send a request (json string) to bridge `name` and wait for the reply (json string)
+function! jupyter#bridge#Request(name, request, timeout) abort
+    if !jupyter#bridge#IsRunning(a:name)
+        return json_encode({'error': 'not running'})
+    endif
+    return json_encode(ch_evalexpr(s:jobs[a:name], json_decode(a:request),
+          \ {'timeout': a:timeout}))
+endfunction
+
+" Channel callback: display echom events here, pass the others to python
+function! jupyter#bridge#OnEvent(name, channel, event) abort
+    if type(a:event) != v:t_dict | return | endif
+    if get(a:event, 'event', '') ==# 'echom'
+        call s:echom(a:event.arg, a:event.style)
+    else
+        python3 _jupyter_sessions.on_bridge_event(vim.eval('a:name'),
+              \ vim.eval('json_encode(a:event)'))
+    endif
+endfunction
+
+" Stderr of the bridge: tracebacks and warnings of the kernel client
+function! jupyter#bridge#OnError(channel, msg) abort
+    call s:echom('Bridge: ' . a:msg, 'WarningMsg')
+endfunction
+
+" Same display as echom in python3/jupyter_util.py
+function! s:echom(arg, style) abort
+    execute 'echohl ' . a:style
+    let l:prefix = a:style ==# 'None' ? '' : a:style . ': '
+    for l:msg in split(a:arg, "\n", 1)
+        echom l:prefix . ' ' . l:msg
+        let l:prefix = ''
+    endfor
+    echohl None
+endfunction
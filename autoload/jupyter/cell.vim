@@ -0,0 +1,48 @@
+"=============================================================================
+"     File: autoload/jupyter/cell.vim
+"
+"  Description: Track the changes of the buffers for the cell index, cell
+"               text objects
+"
+"=============================================================================
+
+" Get the changes of the buffer since the last call, and start listening to
+" them. Returns {'tick': b:changedtick, 'changes': [[start, end, added], ...]}
+" with 0-based line numbers, or 'changes': -1 if they are unknown.
+function! jupyter#cell#Changes(bufnr) abort
+    let l:listening = exists('*listener_add')
+    if l:listening
+        if !getbufvar(a:bufnr, 'jupyter_cell_listener', 0)
+            call setbufvar(a:bufnr, 'jupyter_cell_changes', -1)
+            call setbufvar(a:bufnr, 'jupyter_cell_listener',
+                  \ listener_add(function('s:on_change'), a:bufnr))
+        endif
+        call listener_flush(a:bufnr)
+    endif
+    let l:changes = getbufvar(a:bufnr, 'jupyter_cell_changes', -1)
+    call setbufvar(a:bufnr, 'jupyter_cell_changes', l:listening ? [] : -1)
+    return {'tick': getbufvar(a:bufnr, 'changedtick'), 'changes': l:changes}
+endfunction
+
+" Listener callback: queue the changed ranges until the index is looked up.
+" Vim may merge several changes in one call: a:start, a:end and a:added then
+" span all of them, only a:changes holds each range in order.
+function! s:on_change(bufnr, start, end, added, changes) abort
+    let l:changes = getbufvar(a:bufnr, 'jupyter_cell_changes', [])
+    if type(l:changes) != v:t_list || len(l:changes) + len(a:changes) > 100
+        " Too many changes: cheaper to index the whole buffer again
+        call setbufvar(a:bufnr, 'jupyter_cell_changes', -1)
+        return
+    endif
+    for l:change in a:changes
+        call add(l:changes, [l:change.lnum - 1, l:change.end - 1, l:change.added])
+    endfor
+endfunction
+
+" Select the current cell, with its separator line if not inner
+function! jupyter#cell#TextObj(inner) abort
+    if !jupyter#init_python() | return | endif
+    let [l:first, l:last] = py3eval('_jupyter_sessions.current().cell_bounds('
+          \ . (a:inner ? 'True' : 'False') . ')')
+    execute 'normal! ' . (l:first + 1) . 'GV' . (l:last + 1) . 'G'
+endfunction
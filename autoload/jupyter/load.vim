@@ -3,13 +3,38 @@ function! jupyter#load#MakeStandardCommands() abort
     " keys buffer-local for select filetypes.
     command! -buffer -nargs=* -complete=customlist,jupyter#CompleteConnect
         \ JupyterConnect call jupyter#Connect(<f-args>)
+    command! -buffer -nargs=? -complete=customlist,jupyter#CompleteStart
+        \ JupyterStart call jupyter#Start(<f-args>)
+    command! -buffer -nargs=0    JupyterKernels         call jupyter#ListKernels()
+    command! -buffer -nargs=? -bang -complete=file
+        \ JupyterStats call jupyter#Stats(<bang>0, <f-args>)
+    command! -buffer -nargs=? -bang
+        \ JupyterTraceStart call jupyter#TraceStart(<bang>0, <f-args>)
+    command! -buffer -nargs=? -complete=file
+        \ JupyterTraceStop call jupyter#TraceStop(<f-args>)
+    command! -buffer -nargs=1 -complete=file
+        \ JupyterTraceSave call jupyter#TraceSave(<f-args>)
     command! -buffer -nargs=0    JupyterDisconnect      call jupyter#Disconnect()
     command! -buffer -nargs=1    JupyterSendCode        call jupyter#SendCode(<args>)
     command! -buffer -count      JupyterSendCount       call jupyter#SendCount(<count>)
     command! -buffer -range -bar JupyterSendRange       <line1>,<line2>call jupyter#SendRange()
+    command! -buffer -nargs=+ -bang -complete=file
+        \ JupyterSendBufferAsVariable call jupyter#SendBufferAsVariable(<bang>0, <f-args>)
     command! -buffer -nargs=0    JupyterSendCell        call jupyter#SendCell()
-    command! -buffer -nargs=0    JupyterStartMonitor   call jupyter#StartMonitor()
+    command! -buffer -nargs=0    JupyterSendCellsAbove  call jupyter#SendCellsAbove()
+    command! -buffer -nargs=0    JupyterSendAllCells    call jupyter#SendAllCells()
+    command! -buffer -nargs=* -bang -complete=customlist,jupyter#CompleteSessions
+        \ JupyterSendCellAll call jupyter#SendCellAll(<bang>0, <f-args>)
+    command! -buffer -nargs=* -bang -range -complete=customlist,jupyter#CompleteSessions
+        \ JupyterSendRangeAll <line1>,<line2>call jupyter#SendRangeAll(<bang>0, <f-args>)
+    command! -buffer -count=1    JupyterNextCell        call jupyter#JumpCell(<count>)
+    command! -buffer -count=1    JupyterPrevCell        call jupyter#JumpCell(-<count>)
+    command! -buffer -nargs=* -complete=customlist,jupyter#CompleteMonitor
+        \ JupyterStartMonitor   call jupyter#StartMonitor(<f-args>)
     command! -buffer -nargs=0    JupyterStopMonitor   call jupyter#StopMonitor()
+    command! -buffer -nargs=1    JupyterShow          call jupyter#Show(<q-args>)
+    command! -buffer -nargs=1    JupyterFetch         call jupyter#Fetch(<q-args>)
+    command! -buffer -nargs=0    JupyterVariables     call jupyter#Variables()
     command! -buffer -nargs=? -complete=dir  JupyterCd  call jupyter#JupyterCd(<f-args>)
     command! -buffer -nargs=? -bang -complete=customlist,jupyter#CompleteTerminateKernel
         \ JupyterTerminateKernel  call jupyter#TerminateKernel(<bang>0, <f-args>)
@@ -34,12 +59,24 @@ function! jupyter#load#MapStandardKeys() abort
     nmap <buffer> <silent> <localleader>e        <Plug>JupyterRunTextObj
     vmap <buffer> <silent> <localleader>e        <Plug>JupyterRunVisual
 
+    " Move between cells, select cells
+    nnoremap <buffer> <silent> ]j    :<C-u>execute v:count1 . 'JupyterNextCell'<CR>
+    nnoremap <buffer> <silent> [j    :<C-u>execute v:count1 . 'JupyterPrevCell'<CR>
+    omap <buffer> <silent> ij        <Plug>JupyterCellInner
+    xmap <buffer> <silent> ij        <Plug>JupyterCellInner
+    omap <buffer> <silent> aj        <Plug>JupyterCellAround
+    xmap <buffer> <silent> aj        <Plug>JupyterCellAround
+
     nnoremap <buffer> <silent> <localleader>U    :JupyterUpdateShell<CR>
 endfunction
 
 " Create <Plug> for user mappings
 noremap <silent> <Plug>JupyterRunTextObj    :<C-u>set operatorfunc=<SID>opfunc_run_code<CR>g@
 noremap <silent> <Plug>JupyterRunVisual     :<C-u>call <SID>opfunc_run_code(visualmode())<CR>gv
+onoremap <silent> <Plug>JupyterCellInner    :<C-u>call jupyter#cell#TextObj(1)<CR>
+xnoremap <silent> <Plug>JupyterCellInner    :<C-u>call jupyter#cell#TextObj(1)<CR>
+onoremap <silent> <Plug>JupyterCellAround   :<C-u>call jupyter#cell#TextObj(0)<CR>
+xnoremap <silent> <Plug>JupyterCellAround   :<C-u>call jupyter#cell#TextObj(0)<CR>
 
 "-----------------------------------------------------------------------------
 "        Operator Function:
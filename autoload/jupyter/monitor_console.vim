@@ -8,7 +8,7 @@ function! jupyter#monitor_console#OpenJupyterMonitor() abort
     " vint: next-line -ProhibitAutocmdWithNoGroup
     autocmd! InsertEnter,InsertLeave __jupyter_monitor__
     " Can't wipeout the buffer while we are still inside the buffer
-    autocmd BufWinLeave __jupyter_monitor__ python3 _jupyter_session.stop_monitor(wipeout_buffer=False)
+    autocmd BufWinLeave __jupyter_monitor__ python3 _jupyter_sessions.stop_monitor(wipeout_buffer=False)
 
     " Save current window
     let win_id = win_getid()
@@ -22,7 +22,8 @@ function! jupyter#monitor_console#OpenJupyterMonitor() abort
     let &switchbuf=save_swbuf
 
     " Make sure buffer is a scratch buffer before we write to it
-    setlocal bufhidden=hide buftype=nofile
+    " No undo: the buffer is written for a whole session
+    setlocal bufhidden=hide buftype=nofile undolevels=-1
     setlocal nobuflisted nonumber noswapfile nomodifiable
     execute 'setlocal syntax=' . win_syntax
 
@@ -32,7 +33,18 @@ function! jupyter#monitor_console#OpenJupyterMonitor() abort
     return bufnr('__jupyter_monitor__')
 endfunction
 
-" Timer callback to fill jupyter console buffer
-function! jupyter#monitor_console#UpdateConsoleBuffer(timer) abort
-    python3 if _jupyter_session.monitor: _jupyter_session.monitor.timer_write_msgs()
+" Move the cursor of the windows of the monitor to its last line
+function! jupyter#monitor_console#ScrollToEnd(bufnr) abort
+    if exists('*win_execute')
+        for l:win_id in win_findbuf(a:bufnr)
+            call win_execute(l:win_id, 'normal! G')
+        endfor
+        return
+    endif
+    let l:cur_win = win_getid()
+    for l:win_id in win_findbuf(a:bufnr)
+        call win_gotoid(l:win_id)
+        normal! G
+    endfor
+    call win_gotoid(l:cur_win)
 endfunction
@@ -0,0 +1,51 @@
+" Sidebar of :JupyterVariables, its rows edited in place by Python
+
+" Open the sidebar on the right (or reuse it if open), return its number:
+" the cursor goes back to the previous window
+function! jupyter#variables#Open() abort
+    let l:winid = win_getid()
+    let l:bufnr = bufnr('__jupyter_variables__')
+    if l:bufnr > 0 && bufwinnr(l:bufnr) > 0
+        return l:bufnr
+    endif
+    execute 'botright vertical 70new __jupyter_variables__'
+
+    " No undo: the rows are rewritten after each execution
+    setlocal bufhidden=wipe buftype=nofile undolevels=-1
+    setlocal nobuflisted nonumber noswapfile nowrap cursorline winfixwidth
+    let b:jupyter_variables_count = 0
+    let b:jupyter_variables_dirty = 0
+    let &l:statusline = '%<[Jupyter] variables%=%{b:jupyter_variables_count} '
+
+    " The rows changed are written once shown: when the window scrolls
+    augroup JupyterVariables
+        autocmd! * <buffer>
+        autocmd BufWipeout <buffer> python3 _jupyter_sessions.stop_variables()
+        autocmd CursorMoved <buffer> call s:on_scroll(bufnr('%'))
+        if exists('##WinScrolled')
+            autocmd! WinScrolled
+            autocmd WinScrolled * call s:on_scroll(winbufnr(str2nr(expand('<amatch>'))))
+        endif
+    augroup END
+
+    let l:bufnr = bufnr('%')
+    call win_gotoid(l:winid)
+    return l:bufnr
+endfunction
+
+" The first and last lines of each window showing the buffer
+function! jupyter#variables#Visible(bufnr) abort
+    let l:lines = []
+    for l:win_id in win_findbuf(a:bufnr)
+        let l:info = getwininfo(l:win_id)[0]
+        call add(l:lines, [l:info.topline, l:info.botline])
+    endfor
+    return l:lines
+endfunction
+
+" Write the dirty rows of the sidebar that came into view
+function! s:on_scroll(bufnr) abort
+    if getbufvar(a:bufnr, 'jupyter_variables_dirty', 0)
+        python3 _jupyter_sessions.show_variables()
+    endif
+endfunction
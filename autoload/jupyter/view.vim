@@ -0,0 +1,35 @@
+" Scratch buffer of :JupyterShow and :JupyterFetch, filled page by page as the cursor moves
+
+" Open the view in a split (or jump to it if open), return its number:
+" the cursor stays in it, to scroll
+function! jupyter#view#Open() abort
+    let save_swbuf=&switchbuf
+    set switchbuf=useopen
+    let l:cmd = bufnr('__jupyter_view__') > 0 ? 'sbuffer' : 'new'
+    execute l:cmd . ' ' . '__jupyter_view__'
+    let &switchbuf=save_swbuf
+
+    " No undo: the buffer is only appended to
+    setlocal bufhidden=hide buftype=nofile undolevels=-1
+    setlocal nobuflisted nonumber noswapfile nowrap
+    let b:jupyter_view_title = ''
+    let b:jupyter_view_done = 0
+    let &l:statusline = '%<[Jupyter] %{b:jupyter_view_title}'
+                \ . '%=%{b:jupyter_view_done ? "" : "more... "}%l/%L'
+
+    augroup JupyterView
+        autocmd! * <buffer>
+        autocmd CursorMoved <buffer> call jupyter#view#More()
+        autocmd BufWipeout <buffer> python3 _jupyter_sessions.view_close()
+    augroup END
+
+    return bufnr('__jupyter_view__')
+endfunction
+
+" Read the next page when the cursor is less than two windows from the end
+function! jupyter#view#More() abort
+    if b:jupyter_view_done || line('.') + 2 * winheight(0) < line('$')
+        return
+    endif
+    python3 _jupyter_sessions.view_more()
+endfunction
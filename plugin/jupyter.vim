@@ -17,11 +17,18 @@ endif
 "-----------------------------------------------------------------------------
 let g:jupyter_default_settings = {
     \ 'auto_connect': 0,
+    \ 'bridge': 0,
+    \ 'bridge_python': 'python3',
     \ 'cell_separators': ['##', '#%%', '# %%', '# <codecell>'],
     \ 'highlight_cells': 1, 
     \ 'mapkeys': 1,
+    \ 'monitor_max_lines': 10000,
+    \ 'monitor_max_rate': 500,
+    \ 'pool': {},
+    \ 'session_packer': '',
     \ 'timer_interval': 500,
-    \ 'verbose': 0
+    \ 'verbose': 0,
+    \ 'view_page_lines': 1000
 \ }
 
 for [s:key, s:val] in items(g:jupyter_default_settings)
@@ -0,0 +1,158 @@
+"""
+Index of the cells of a buffer, for the cell commands.
+
+A cell is delimited by the lines matching one of `g:jupyter_cell_separators`.
+The numbers of these lines are kept sorted so that the cell around a line is
+found by bisection. They are updated from the ranges of lines changed in the
+buffer (see :h listener_add()) instead of scanning it all again.
+
+.. note:: Line numbers are 0-based, as in python buffers.
+"""
+
+# Standard
+import bisect
+import re
+
+# Export only
+__all__ = ['CellIndex']
+
+
+class CellIndex():
+    """Sorted line numbers of the cell separators of a buffer.
+
+    Parameters
+    ----------
+    separators : list of str
+        Regexes matching the beginning of a separator line.
+
+    Attributes
+    ----------
+    lines : list of int
+        Sorted line numbers of the separators.
+    changedtick : int
+        `b:changedtick` of the buffer when the index was last updated.
+    """
+    def __init__(self, separators):
+        self.separators = list(separators)
+        self.regex = re.compile('|'.join(f'(?:{sep})' for sep in separators)) \
+            if separators else None
+        self.lines = list()
+        self.changedtick = -1
+
+    def is_separator(self, line):
+        """Check if given line is a cell separator."""
+        return self.regex is not None and self.regex.match(line) is not None
+
+    def rebuild(self, buffer):
+        """Index all the lines of `buffer` (list of str)."""
+        self.lines = [i for i, line in enumerate(buffer) if self.is_separator(line)]
+
+    def update(self, buffer, changes):
+        """Update the index after the buffer changed.
+
+        Only the lines in the changed ranges are matched against the
+        separators, the others are shifted.
+
+        Parameters
+        ----------
+        buffer : list of str
+            The buffer, after all the changes.
+        changes : list of (int, int, int)
+            Changes in the order they happened: lines `start` to `end`
+            (excluded) were replaced by `end - start + added` lines.
+        """
+        dirty = None
+        for start, end, added in changes:
+            # Forget separators in the range, shift the ones below
+            low = bisect.bisect_left(self.lines, start)
+            high = bisect.bisect_left(self.lines, end)
+            self.lines[low:] = [line + added for line in self.lines[high:]]
+
+            # Grow the range to rescan, shifting it as lines are added
+            dirty_start, dirty_end = dirty or (start, end + added)
+            if dirty_end >= end:
+                dirty_end += added
+            elif dirty_end > start:
+                dirty_end = end + added
+            dirty = (min(dirty_start, start), max(dirty_end, end + added))
+
+        if dirty:
+            self.rescan(buffer, *dirty)
+
+    def rescan(self, buffer, start, end):
+        """Index lines `start` to `end` (excluded) of `buffer` again."""
+        end = min(end, len(buffer))
+        start = min(start, end)
+        low = bisect.bisect_left(self.lines, start)
+        high = bisect.bisect_left(self.lines, end)
+        self.lines[low:high] = [start + i for i, line in enumerate(buffer[start:end])
+                                if self.is_separator(line)]
+
+    def cell_bounds(self, line, n_lines):
+        """Get the first and last lines of the cell containing `line`.
+
+        On a separator line, this is the cell below it.
+
+        Parameters
+        ----------
+        line : int
+            A line of the cell.
+        n_lines : int
+            Number of lines in the buffer.
+
+        Returns
+        -------
+        (int, int)
+            The first and last lines of the cell, separators excluded.
+        """
+        # Skip past the first cell separator above, if it exists
+        i_above = bisect.bisect_right(self.lines, line)
+        upper_bound = self.lines[i_above - 1] + 1 if i_above else 0
+
+        # Move before the next cell separator, if it exists
+        start = min(upper_bound + 1, n_lines - 1)
+        i_below = bisect.bisect_left(self.lines, start)
+        lower_bound = self.lines[i_below] - 1 if i_below < len(self.lines) else n_lines - 1
+
+        # Make sure bounds are within buffer limits
+        upper_bound = max(0, min(upper_bound, n_lines - 1))
+        lower_bound = max(0, min(lower_bound, n_lines - 1))
+
+        # Make sure of proper ordering of bounds
+        return upper_bound, max(upper_bound, lower_bound)
+
+    def cells(self, n_lines, stop=None):
+        """Get the bounds of the non-empty cells, top to bottom.
+
+        Parameters
+        ----------
+        n_lines : int
+            Number of lines in the buffer.
+        stop : int, optional, default=None
+            Only get the cells ending before this line.
+
+        Returns
+        -------
+        list of (int, int)
+            The first and last lines of each cell, separators excluded.
+        """
+        stop = n_lines if stop is None else min(stop, n_lines)
+        starts = [0] + [line + 1 for line in self.lines]
+        ends = self.lines + [n_lines]
+        return [(start, end - 1) for start, end in zip(starts, ends)
+                if start < end and end <= stop]
+
+    def next_cell(self, line, count=1, n_lines=None):
+        """Get the first line of the `count`-th cell below `line`.
+
+        With a negative `count`, get the one of the `-count`-th cell above.
+        Stays on `line` if there is no such cell below.
+        """
+        i_above = bisect.bisect_right(self.lines, line)
+        i_target = i_above - 1 + count
+        if i_target < 0:
+            return 0
+        if i_target >= len(self.lines):
+            return line
+        target = self.lines[i_target] + 1
+        return target if n_lines is None else min(target, n_lines - 1)
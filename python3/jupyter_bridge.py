@@ -0,0 +1,157 @@
+"""
+Bridge process: talk to the kernel out of vim's python.
+
+Run by `jupyter#bridge#Start()` as a vim job when `g:jupyter_bridge` is set.
+The kernel client, its asyncio loop and the decoding of every kernel message
+live here, so that a flood of output does not compete for the GIL with vim.
+Vim only receives what it displays.
+
+Protocol: newline-delimited JSON, as a vim channel in `json` mode speaks it
+(see :h channel-use).
+    vim -> bridge: [id, {"op": <op>, ...}], answered by [id, <reply>]
+    bridge -> vim: [0, {"event": <event>, ...}], for the channel callback
+
+.. note:: This is a standalone script: it does not need vim.
+"""
+
+# Standard
+import json
+import sys
+from threading import Lock
+
+# Local
+from jupyter_messenger import JupyterMessenger
+
+# Export only
+__all__ = ['Bridge', 'BridgeKernel']
+
+
+class PipeWaker():
+    """Stand-in for :obj:`VimWaker`: write queued messages to vim at once.
+
+    Writing an event on the pipe is what wakes vim up here: the channel
+    callback displays it.
+    """
+    def __init__(self, kernel):
+        self.kernel = kernel
+
+    def start(self):
+        """Nothing to connect, vim reads the pipe."""
+
+    def stop(self):
+        """Nothing to close, vim reads the pipe."""
+
+    def wake(self):
+        """Send the queued echom messages to vim (any thread)."""
+        while not self.kernel.echom_queue.empty():
+            _, arg, args = self.kernel.echom_queue.get_nowait()
+            self.kernel.bridge.emit('echom', arg=arg, style=args.get('style', 'None'))
+
+
+class BridgeKernel(JupyterMessenger):
+    """The in-process messenger, reporting to vim through the bridge."""
+    def __init__(self, bridge):
+        super().__init__()
+        self.bridge = bridge
+        self.waker = PipeWaker(self)
+
+    async def _async_connect(self, filename, packer=''):
+        """Connect then hand the kernel infos over to vim."""
+        await super()._async_connect(filename, packer)
+        self.bridge.emit('kernel_info', kernel_info=self.kernel_info)
+
+    def set_state(self, state):
+        """Update the connection state, and send it to vim."""
+        if state != self.state:
+            super().set_state(state)
+            self.bridge.emit('state', state=state)
+
+
+class Bridge():
+    """Read requests from vim on stdin, answer and send events on stdout.
+
+    Parameters
+    ----------
+    stdin, stdout : file
+        Text streams to and from vim.
+    """
+    def __init__(self, stdin=sys.stdin, stdout=sys.stdout):
+        self.stdin = stdin
+        self.stdout = stdout
+        self.write_lock = Lock()
+        self.kernel = BridgeKernel(self)
+
+    def write(self, msg_id, msg):
+        """Write one message to vim (any thread)."""
+        line = json.dumps([msg_id, msg], separators=(',', ':'))
+        with self.write_lock:
+            self.stdout.write(line + '\n')
+            self.stdout.flush()
+
+    def emit(self, event, **content):
+        """Send an event to the channel callback of vim (any thread)."""
+        self.write(0, dict(content, event=event))
+
+    def serve(self):
+        """Answer the requests until vim disconnects or closes stdin."""
+        for line in self.stdin:
+            if not line.strip():
+                continue
+            msg_id, request = json.loads(line)
+            try:
+                reply = self.handle(request)
+            except Exception as exc:  # pylint: disable=broad-except
+                reply = {'error': f'{exc.__class__.__name__}: {exc}'}
+            self.write(msg_id, reply)
+            if request.get('op') == 'disconnect':
+                break
+
+    def handle(self, request):
+        """Run one request of vim.
+
+        Parameters
+        ----------
+        request : dict
+            The operation `op` and its parameters.
+
+        Returns
+        -------
+        dict
+            The reply to the request.
+        """
+        kernel = self.kernel
+        op = request.get('op')
+        if op == 'connect':
+            kernel.connect(request['kernel_type'], request['filename'],
+                           request.get('packer', ''))
+            return {}
+        if op == 'check_connection':
+            return {'connected': kernel.check_connection()}
+        if op == 'execute':
+            msg_id = kernel.execute(
+                request['code'], ismeta=request.get('ismeta', False),
+                hooks=tuple(request['hooks']), **request.get('kwargs', {}))
+            return {'msg_id': msg_id}
+        if op == 'run_batch':
+            batch_id = request['batch_id']
+            future = kernel.run_batch(
+                [tuple(block) for block in request['batch']], tuple(request['hooks']))
+
+            def report(done):
+                result = None if done.cancelled() or done.exception() else done.result()
+                self.emit('batch', batch_id=batch_id, result=result)
+            future.add_done_callback(report)
+            return {}
+        if op == 'disconnect':
+            kernel.close()
+            return {}
+        raise ValueError(f'Unknown operation: {op}')
+
+
+def main():
+    """Serve vim on stdin and stdout."""
+    Bridge().serve()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,58 +5,279 @@ See: <http://jupyter-client.readthedocs.io/en/stable/api/client.html>
 """
 
 # Standard
+import ast
 import asyncio
 import collections
+import concurrent.futures
+import json
+import os
 from textwrap import dedent
 from threading import Thread
-from queue import Queue, Empty
+from queue import Queue
+import socket
 import sys
-
-# Py module
-from jupyter_client import AsyncKernelManager, find_connection_file
+import time
+import uuid
 
 # Local
-from jupyter_util import echom, unquote_string, match_kernel_id, get_vim
+from jupyter_util import echom, unquote_string, match_kernel_id, get_vim, exec_hooks
+from jupyter_router import MessageRouter
 from language import list_languages, get_language
+from request_stats import RequestStats
+from trace_recorder import TraceRecorder, CHANNELS
+
+# Process local (absent in the bridge process, see jupyter_bridge.py)
+try:
+    import vim
+except ImportError:
+    vim = None
+
+
+# States of the connection in which the kernel runs code, see JupyterMessenger.state
+CONNECTED_STATES = ('idle', 'busy', 'starting')
+
+
+class VimWaker():
+    """Wake vim up from the asyncio thread when there is something to display.
+
+    Vim opens a raw channel on a local socket: writing a byte to it calls
+    `jupyter#Wakeup` which drains the display queues. Without channel
+    support, fall back on polling with a timer every `g:jupyter_timer_interval`.
+
+    Attributes
+    ----------
+    latencies : :obj:`collections.deque` of float
+        Last seconds elapsed between the arrival of a message in the asyncio
+        thread and its display in vim.
+    """
+    def __init__(self):
+        self.sock = None
+        self.polling = False
+        self.pending = False
+        self.latencies = collections.deque(maxlen=1000)
+
+    def start(self):
+        """Connect vim to the wakeup socket, or start polling if impossible."""
+        if self.sock or self.polling:
+            return
+
+        if int(get_vim('has("channel")', 0)):
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                server.bind(('127.0.0.1', 0))
+                server.listen(1)
+                server.settimeout(5)
+                vim.command('call jupyter#OpenWakeupChannel({})'
+                            .format(server.getsockname()[1]))
+                self.sock, _ = server.accept()
+            except (OSError, vim.error):
+                self.sock = None
+            finally:
+                server.close()
+
+        if self.sock is None:
+            self.polling = True
+            self.rearm()
+
+    def stop(self):
+        """Close the wakeup socket, vim closes its channel."""
+        self.polling = False
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def rearm(self):
+        """Start the next polling timer, if polling."""
+        if not self.polling:
+            return
+        timer_interval = get_vim('g:jupyter_timer_interval', 500)
+        vim.command(f'call timer_start({timer_interval}, "jupyter#UpdateEchom")')
+
+    def wake(self):
+        """Ask vim to drain the display queues (any thread).
+
+        Only one wakeup is sent until vim calls `begin_drain`: it resets the
+        flag before draining, so what is queued during the drain wakes vim
+        again.
+        """
+        if self.pending or self.sock is None:
+            return
+        self.pending = True
+        try:
+            self.sock.send(b'\n')
+        except OSError:
+            # Not sent: the next wakeup tries again
+            self.pending = False
+
+    def begin_drain(self):
+        """Acknowledge the wakeup: anything queued from now on wakes vim again."""
+        self.pending = False
+
+    def record(self, arrival):
+        """Record the latency of a message displayed now, arrived at `arrival`."""
+        self.latencies.append(time.monotonic() - arrival)
+
+    def latency(self):
+        """Summarize the recorded display latencies.
 
-# Process local
-import vim
+        Returns
+        -------
+        dict
+            dict with keys: {'count', 'last_ms', 'mean_ms', 'max_ms'}
+        """
+        if not self.latencies:
+            return {'count': 0, 'last_ms': 0, 'mean_ms': 0, 'max_ms': 0}
+        return {
+            'count': len(self.latencies),
+            'last_ms': 1000 * self.latencies[-1],
+            'mean_ms': 1000 * sum(self.latencies) / len(self.latencies),
+            'max_ms': 1000 * max(self.latencies),
+        }
+
+
+class KernelThread():
+    """Background thread running the asyncio loop of the kernel clients.
+
+    Shared by the clients of every kernel vim is connected to: one thread,
+    one zmq context (and its io thread) and one :obj:`VimWaker` for all.
+
+    Attributes
+    ----------
+    loop : :obj:`asyncio.AbstractEventLoop`
+        Loop of the thread, created on first use.
+    context : :obj:`zmq.asyncio.Context` or None
+        Context of the sockets of the clients, created when the thread starts.
+    waker : :obj:`VimWaker`
+        Signal to vim that something was queued for display.
+    stats : :obj:`RequestStats`
+        Timings of the requests sent by vim commands, to all the kernels.
+    trace : :obj:`TraceRecorder`
+        The messages received from all the kernels, when recording.
+    """
+    def __init__(self):
+        self._loop = None
+        self.thread = None
+        self.context = None
+        self.waker = VimWaker()
+        self.stats = RequestStats()
+        self.trace = TraceRecorder()
+
+    @property
+    def loop(self):
+        """The asyncio loop of the thread, created on first use."""
+        if self._loop is None:
+            if sys.platform == 'win32':
+                asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+            self._loop = asyncio.new_event_loop()
+        return self._loop
+
+    def running(self):
+        """Check if the thread runs the loop."""
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """Start the thread and create the zmq context, if not done yet."""
+        if self.context is None:
+            # Slow to import: only when connecting
+            import zmq.asyncio  # pylint: disable=import-outside-toplevel
+            self.context = zmq.asyncio.Context()
+        if not self.running():
+            self.thread = Thread(target=self.loop.run_forever, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stop the loop and its thread, close the zmq context and the waker."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self.running():
+            self.thread.join(1)
+        self.thread = None
+        if self.context is not None:
+            self.context.destroy(linger=0)
+            self.context = None
+        self.waker.stop()
 
 
 class JupyterMessenger():
     """Handle primitive messages to/from jupyter kernel.
 
+    Parameters
+    ----------
+    kernel_thread : :obj:`KernelThread`, optional, default=None
+        Thread shared with the clients of other kernels, a new one if None:
+        it is then stopped by :meth:`disconnect`.
+
     Attributes
     ----------
     km_client : :obj:`KernelManager` client
         Object to handle connections with the kernel.
         See: <http://jupyter-client.readthedocs.io/en/stable/api/client.html>
+    loop : :obj:`asyncio.AbstractEventLoop`
+        Loop of the background thread, created on first use.
+    router : :obj:`MessageRouter`
+        Dispatcher of the incoming messages to the coroutines awaiting them,
+        created on first use.
+    waker : :obj:`VimWaker`
+        Signal to vim that something was queued for display, the one of the
+        thread.
+    state : str
+        State of the connection, kept by the asyncio thread from the iopub
+        `status` messages and the heartbeat: 'disconnected', 'connecting',
+        'idle', 'busy', 'starting', 'dead' (no heartbeat) or 'reconnecting'.
+    state_changed : bool
+        Whether `state` changed since vim last redrew its statusline.
+    packer : str
+        Serializer of the messages, see :func:`session_packer.get_packer`.
     kernel_info : dict
         Information about the kernel itself.
         dict with keys:
             'kernel_type' : str, the type of kernel, i.e. `python`.
+            'language' : str, the language reported by the kernel, i.e. `python`.
             'cfile' : str, filename of the connection file, i.e. `kernel-123.json`.
             'pid' : int, the pid of the kernel process.
             'cwd' : str, the current working directory of the kernel.
             'hostname' : str, the hostname of the kernel.
     """
-    def __init__(self):
+    out_of_process = False
+
+    def __init__(self, kernel_thread=None):
         self.km_client = None      # KernelManager client
-        self.background_thread = None
-        if sys.platform == 'win32':
-            asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-        self.loop = asyncio.new_event_loop()
+        self.owns_thread = kernel_thread is None
+        self.kernel_thread = kernel_thread or KernelThread()
         self.kernel_info = dict()  # Kernel information
         self.lang = get_language('')
 
-        # Producers and consumers of each channel
+        # Producers of each channel and router to their consumers
         self.producers = dict()
-        self.consumers = dict()
+        self._router = None
+
+        # Connection state, and what follows the heartbeat
+        self.state = 'disconnected'
+        self.state_changed = False
+        self.watcher = None
+        self.connection_file = None
+        self.connection_info = None
+        self.packer = ''
 
         # Message scheduled to be displayed using echom.
         self.echom_queue = Queue()
-
-    def connect(self, kernel_type, filename='kernel-*.json'):
+        self.waker = self.kernel_thread.waker
+        self.stats = self.kernel_thread.stats
+        self.trace = self.kernel_thread.trace
+
+    @property
+    def loop(self):
+        """The asyncio loop of the background thread, created on first use."""
+        return self.kernel_thread.loop
+
+    @property
+    def router(self):
+        """The router of the messages of this kernel, created on first use."""
+        if self._router is None:
+            self._router = MessageRouter(self.loop)
+        return self._router
+
+    def connect(self, kernel_type, filename='kernel-*.json', packer=''):
         """Connect to the kernel.
 
         Launches a background thread to deal with future communication with the
@@ -68,118 +289,234 @@ class JupyterMessenger():
             The type of kernel, i.e. `python`.
         filename : str
             Filename of the kernel connection file.
+        packer : str, optional, default=''
+            Serializer of the messages: 'json', 'orjson' or 'msgpack', the
+            fastest json if empty. See `g:jupyter_session_packer`.
         """
         self.kernel_info['kernel_type'] = kernel_type
         self.kernel_info['cfile_user'] = filename
         self.lang = get_language(kernel_type)
 
-        if not self.loop.is_running():
-            self.background_thread = Thread(target=self.loop.run_forever, daemon=True)
-            self.background_thread.start()
+        self.kernel_thread.start()
 
         # Attempt to connect to the kernel. Since we run async functions in the
         # thead we created above, we must make sure to always schedule them in
         # a thread-safe manner.
-        asyncio.run_coroutine_threadsafe(self._async_connect(filename), self.loop)
+        asyncio.run_coroutine_threadsafe(self._async_connect(filename, packer), self.loop)
 
-        # Start timer that periodically checks for echom messages to display
-        timer_interval = get_vim('g:jupyter_timer_interval', 500)
-        vim.command(f'call timer_start({timer_interval}, "jupyter#UpdateEchom")')
+        # Let the background thread wake vim up when there is something to echom
+        self.waker.start()
 
-    async def _async_connect(self, filename):
+    async def _async_connect(self, filename, packer=''):
         """The async part of the connection to the kernel.
 
         Parameters
         ----------
         filename : str
             Filename of the kernel connection file.
+        packer : str, optional, default=''
+            Serializer of the messages, see :meth:`connect`.
         """
-        connection_file = find_connection_file(filename)
-        kernel_manager = AsyncKernelManager(connection_file=connection_file)
+        # Slow to import: only when connecting
+        # pylint: disable=import-outside-toplevel
+        from jupyter_client import find_connection_file
+        from session_packer import get_packer
 
-        kernel_manager.load_connection_file()
-        self.km_client = kernel_manager.client()
-        self.km_client.start_channels()
-
-        for channel in ['shell', 'iopub', 'control']:
-            self.producers[channel] = self.loop.create_task(
-                self._listen_to_channel(channel))
+        self.set_state('connecting')
+        try:
+            self.packer = get_packer(packer)[0]
+        except ValueError as err:
+            self.packer = get_packer()[0]
+            self.thread_echom(f'g:jupyter_session_packer: {err}, using {self.packer}',
+                              style='WarningMsg')
+        self.connection_file = find_connection_file(filename)
+        self.open_channels(self.load_connection_file(self.connection_file))
+        self.watcher = self.loop.create_task(self._watch_connection())
 
         await self.get_kernel_info()
+        self.set_state('idle')
         self.thread_echom(
             f'Connected to {self.kernel_info["kernel_type"]} kernel on '
             f'{self.kernel_info["hostname"]}:{self.kernel_info["cwd"]}',
             style='Question'
         )
 
-    def disconnect(self):
-        """Disconnect silently from kernel and close channels."""
-        if self.km_client:
-            self.km_client.stop_channels()
-            self.km_client = None
-        self.loop.call_soon_threadsafe(lambda: [task.cancel() for task in asyncio.all_tasks(self.loop.stop)])
-        self.loop.call_soon_threadsafe(self.loop.stop)
-        if self.background_thread and self.background_thread.is_alive():
-            self.background_thread.join(1)
-            self.background_thread = None
-        self.kernel_info = dict()
-        self.lang = get_language('')
-        echom('Disconnected.', style='Directory')
+    def load_connection_file(self, connection_file):
+        """Get a kernel manager with the ports and key of `connection_file`."""
+        # Slow to import: only when connecting
+        from jupyter_client import AsyncKernelManager  # pylint: disable=import-outside-toplevel
 
+        kernel_manager = AsyncKernelManager(connection_file=connection_file,
+                                            context=self.kernel_thread.context)
+        kernel_manager.load_connection_file()
+        return kernel_manager
 
-    async def _listen_to_channel(self, channel):
-        """Listen to a kernel channel and notify any consumers of messages.
+    def open_channels(self, kernel_manager):
+        """Start the channels to the kernel and their listeners (asyncio thread)."""
+        # Slow to import: only when connecting
+        from session_packer import set_packer  # pylint: disable=import-outside-toplevel
 
-        Parameters
-        ----------
-        channel : 'shell' | 'iopub' | 'control'
-            The channel to listen on.
+        set_packer(kernel_manager.session, self.packer)
+        self.connection_info = kernel_manager.get_connection_info()
+        # The context of the thread: not passed on by the manager
+        self.km_client = kernel_manager.client(context=self.kernel_thread.context)
+        self.km_client.start_channels()
+
+        for channel in ['shell', 'iopub', 'control']:
+            self.producers[channel] = self.loop.create_task(
+                self._listen_to_channel(channel))
+
+    async def cancel_producers(self):
+        """Stop listening to the channels."""
+        for task in self.producers.values():
+            task.cancel()
+        await asyncio.gather(*self.producers.values(), return_exceptions=True)
+        self.producers = dict()
+
+    def set_state(self, state):
+        """Update the connection state, vim redraws its statusline (any thread)."""
+        if state == self.state:
+            return
+        self.state = state
+        self.state_changed = True
+        self.waker.wake()
+
+    async def _watch_connection(self, interval=1, max_delay=30):
+        """Follow the heartbeat of the kernel, reconnect when it is lost.
+
+        The heartbeat channel pings the kernel again and again: if the kernel
+        restarts with the same ports, it beats again by itself. Meanwhile,
+        the connection file is reloaded if it changes, with an exponential
+        backoff from `interval` to `max_delay` seconds.
         """
+        delay = interval
+        lost = False
         while True:
-            if channel == 'shell':
-                msg = await self.km_client.shell_channel.get_msg()
-            elif channel == 'iopub':
-                msg = await self.km_client.iopub_channel.get_msg()
-            elif channel == 'control':
-                msg = await self.km_client.control_channel.get_msg()
+            await asyncio.sleep(delay)
+            if self.km_client.hb_channel.is_beating():
+                if lost:
+                    # A restarted kernel has another pid
+                    try:
+                        await asyncio.wait_for(self.get_kernel_info(), 10)
+                    except asyncio.TimeoutError:
+                        continue
+                    lost = False
+                    self.set_state('idle')
+                    self.thread_echom(f'Reconnected to kernel, pid {self.kernel_info["pid"]}',
+                                      style='Question')
+                delay = interval
+            elif not lost:
+                lost = True
+                self.set_state('dead')
+                self.thread_echom('Kernel heartbeat lost, reconnecting...', style='WarningMsg')
             else:
-                raise ValueError(f'Unknown channel: {channel}')
+                self.set_state('reconnecting')
+                # New ports: check them soon
+                delay = interval if await self._reload_connection_file() \
+                    else min(2 * delay, max_delay)
 
-            if channel in self.consumers:
-                waiting = self.consumers[channel]
-                while len(waiting) > 0:
-                    future = waiting.pop()
-                    future.set_result(msg)
+    async def _reload_connection_file(self):
+        """Reopen the channels if the connection file changed (restarted kernel).
 
-    async def get_next_msg(self, channel):
-        """Listen to a channel for the next incoming message.
+        Returns
+        -------
+        bool
+            Whether the channels were reopened.
+        """
+        try:
+            kernel_manager = self.load_connection_file(self.connection_file)
+        except (OSError, ValueError, KeyError):
+            return False
+        if kernel_manager.get_connection_info() == self.connection_info:
+            return False
+        await self.cancel_producers()
+        self.km_client.stop_channels()
+        self.open_channels(kernel_manager)
+        return True
+
+    def check_connection(self):
+        """Check that we have a client connected to the kernel.
+
+        The state is kept up to date by the asyncio thread: no round trip.
 
-        This returns a Future that is then awaited on. As soon as a message
-        arrives, the Future will have its result set.
+        Returns
+        -------
+        bool
+            True if client is connected, False if not.
+        """
+        return self.km_client is not None and self.state in CONNECTED_STATES
 
-        This works concurrently: multiple calls to get_next_msg will result in
-        multiple futures that will trigger on the same message.
+    def close(self):
+        """Stop listening to the kernel and close the channels, silently.
+
+        The background thread is stopped too, unless shared.
+        """
+        async def cancel_all():
+            if self.watcher is not None:
+                self.watcher.cancel()
+                await asyncio.gather(self.watcher, return_exceptions=True)
+            await self.cancel_producers()
+
+        if (self.producers or self.watcher) and self.kernel_thread.running():
+            try:
+                asyncio.run_coroutine_threadsafe(cancel_all(), self.loop).result(5)
+            except concurrent.futures.TimeoutError:
+                pass
+        self.producers = dict()
+        self.watcher = None
+        if self.km_client:
+            self.km_client.stop_channels()
+            self.km_client = None
+        if self.owns_thread:
+            self.kernel_thread.stop()
+        self.set_state('disconnected')
+
+    def disconnect(self):
+        """Disconnect from kernel and close channels."""
+        self.close()
+        self.kernel_info = dict()
+        self.lang = get_language('')
+        echom('Disconnected.', style='Directory')
+
+    async def _listen_to_channel(self, channel):
+        """Listen to a kernel channel and route messages to their consumers.
 
         Parameters
         ----------
         channel : 'shell' | 'iopub' | 'control'
             The channel to listen on.
-
-        Returns
-        -------
-        asyncio.Future
-            A future that will trigger when the message arrives. The result of
-            the future will be set to the contents of the message.
         """
-        consumer_list = self.consumers.get(channel, collections.deque())
-        future = self.loop.create_future()
-        consumer_list.append(future)
-        self.consumers[channel] = consumer_list
-        return await future
+        if channel == 'shell':
+            kernel_channel = self.km_client.shell_channel
+        elif channel == 'iopub':
+            kernel_channel = self.km_client.iopub_channel
+        elif channel == 'control':
+            kernel_channel = self.km_client.control_channel
+        else:
+            raise ValueError(f'Unknown channel: {channel}')
+        i_channel = CHANNELS.index(channel)
+        sock, session = kernel_channel.socket, kernel_channel.session
 
-    async def get_reply(self, msg_id, channel):
+        while True:
+            # As kernel_channel.get_msg, but keeping the frames for their size
+            frames = await sock.recv_multipart()
+            msg = session.deserialize(session.feed_identities(frames)[1])
+            if self.trace.active:
+                self.trace.record(self, i_channel, msg, sum(map(len, frames)))
+
+            if channel == 'iopub' and msg['header']['msg_type'] == 'status':
+                self.set_state(msg['content'].get('execution_state', self.state))
+            self.stats.on_message(channel, msg)
+            self.router.dispatch(channel, msg)
+
+    def get_reply(self, msg_id, channel):
         """Get kernel reply from sent client message with msg_id (async).
 
+        The subscription is made when this function is called, not when the
+        result is awaited: call it before yielding to the loop after the
+        message is sent so that the reply cannot be missed. Many replies can
+        be awaited concurrently, i.e. with `asyncio.gather`.
+
         Parameters
         ----------
         msg_id : int
@@ -189,40 +526,26 @@ class JupyterMessenger():
 
         Returns
         -------
-        dict
-            Message response.
+        coroutine
+            To await for the message response (dict).
         """
-        while True:
-            msg = await self.get_next_msg(channel)
-            if msg['parent_header']['msg_id'] == msg_id:
-                return msg
-
-    def check_connection(self):
-        """Check that we have a client connected to the kernel.
+        return self.router.subscribe(channel, msg_id).get_once()
 
-        Returns
-        -------
-        bool
-            True if client is connected, False if not.
-        """
-        return self.km_client.hb_channel.is_beating() if self.km_client else False
+    @staticmethod
+    def get_exec_hooks():
+        """Get the code to run around each execution in the current buffer.
 
-    async def get_pending_msgs(self):
-        """Get pending message pool.
+        .. note:: vim thread only.
 
         Returns
         -------
-        list of :obj:`msg`
-            List of messages waiting on the `iopub_channel`.
+        tuple of str
+            `b:jupyter_exec_before`, `_pre`, `_post` and `_after`, from the
+            snapshot of the buffer, see :obj:`ExecHooks`.
         """
-        msgs = list()
-        try:
-            msgs = await self.km_client.iopub_channel.get_msgs()
-        except (Empty, TypeError, KeyError, IndexError, ValueError):
-            pass
-        return msgs
+        return exec_hooks.get()
 
-    def execute(self, code, ismeta=False, **kwargs):
+    def execute(self, code, ismeta=False, hooks=None, origin=None, **kwargs):
         """Execute some code on the kernel.
 
         Parameters
@@ -231,6 +554,13 @@ class JupyterMessenger():
             The programming code to execute on the kernel.
         ismeta : bool, default=False
             Whether the before/pre/post/after content should be used or not.
+        hooks : tuple of str, optional, default=None
+            The before/pre/post/after content, read from the buffer if None:
+            must be given when not called from the vim thread.
+        origin : (str, float), optional, default=None
+            The vim command sending it and when it was called, to time the
+            request, see :obj:`RequestStats`. The command running if None:
+            must be given when not called from the vim thread.
         **kwargs : dict
 
         Returns
@@ -239,29 +569,258 @@ class JupyterMessenger():
             Id of the message. Useful for obtaining a reponse.
         """
         # Pre
+        before = after = ''
         if not ismeta:
-            before = get_vim('b:jupyter_exec_before', '')
-            pre = get_vim('b:jupyter_exec_pre', '')
-            post = get_vim('b:jupyter_exec_post', '')
-            after = get_vim('b:jupyter_exec_after', '')
-
-            # Craft new message
-            if before:
-                self.execute(before, ismeta=True)
-            code = pre + code + post
+            before, pre, post, after = hooks or self.get_exec_hooks()
+            if pre or post:
+                code = pre + code + post
 
         # Dedent the code so we don't get odd indentation errors.
         code = dedent(code)
 
+        # Before: in the same request if the language permits, not in front
+        # of a cell magic, which must stay on the first line
+        if before:
+            magic = self.lang.cell_magic
+            if self.lang.fold_before != '-1' and not (
+                    magic != '-1' and code.lstrip().startswith(magic)):
+                code = self.lang.fold_before.format(dedent(before), code)
+            else:
+                self.execute(before, ismeta=True)
+
         # Actually send execute_request
-        msg_id = self.km_client.execute(code, **kwargs)
+        msg_id = self.execute_request(code, **kwargs)
+        if not ismeta:
+            self.stats.track(msg_id, origin or self.stats.current)
 
         # Send after unless it is blank
         if not ismeta and after:
-            self.km_client.execute(after)
+            self.execute_request(after)
 
         return msg_id
 
+    def execute_request(self, code, silent=False, store_history=True,
+                        user_expressions=None, allow_stdin=None, stop_on_error=True):
+        """Send an execute_request, as `KernelClient.execute` (any thread).
+
+        Returns
+        -------
+        msg_id
+            Id of the message.
+        """
+        content = {
+            'code': code,
+            'silent': silent,
+            'store_history': store_history,
+            'user_expressions': user_expressions or dict(),
+            'allow_stdin': self.km_client.allow_stdin if allow_stdin is None else allow_stdin,
+            'stop_on_error': stop_on_error,
+        }
+        msg = self.km_client.session.msg('execute_request', content)
+        self.send('shell', msg)
+        return msg['header']['msg_id']
+
+    def send(self, channel, msg, buffers=None):
+        """Send a message on a channel, from the asyncio thread (any thread).
+
+        The listener of the channel awaits its replies on the same socket.
+        `Session.send` writes through a blocking shadow of the socket: zmq
+        then consumes the readiness of the socket unbeknownst to pyzmq, and
+        the listener is never woken up for the replies already there. Sent
+        through the asyncio socket, pyzmq wakes it up. zmq sockets are not
+        thread safe either: from another thread, the loop sends, in order.
+
+        Parameters
+        ----------
+        channel : 'shell' | 'control'
+            The channel to send on.
+        msg : dict
+            The message, made by the session of the client.
+        buffers : list of bytes, optional, default=None
+            The binary buffers of the message.
+        """
+        def send_now():
+            # The channels may have been reopened meanwhile: the current ones
+            if self.km_client is None:
+                return
+            session = self.km_client.session
+            frames = session.serialize(msg) + list(buffers or ())
+            getattr(self.km_client, f'{channel}_channel').socket.send_multipart(
+                frames, copy=max(map(len, frames)) < session.copy_threshold)
+
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            send_now()
+        else:
+            self.loop.call_soon_threadsafe(send_now)
+
+    def run_batch(self, batch, hooks=None):
+        """Execute a batch of code blocks on the kernel, without blocking vim.
+
+        Each block is reported with echom as soon as its reply arrives.
+
+        Parameters
+        ----------
+        batch : list of (str, str)
+            Label, i.e. `lines 1-3`, and code of each block.
+        hooks : tuple of str, optional, default=None
+            The before/pre/post/after content, read from the buffer if None.
+
+        Returns
+        -------
+        :obj:`concurrent.futures.Future`
+            Resolves to the list of (msg_id, status) of each block.
+        """
+        hooks = hooks or self.get_exec_hooks()
+        origin = self.stats.current or ('run_batch', time.monotonic())
+        return asyncio.run_coroutine_threadsafe(
+            self._run_batch(batch, hooks, origin), self.loop)
+
+    async def _run_batch(self, batch, hooks, origin=None):
+        """Pipeline the execute_requests of a batch and await their replies.
+
+        All blocks are sent back-to-back with `stop_on_error`: after an error,
+        the kernel aborts the blocks still queued.
+
+        Parameters
+        ----------
+        batch : list of (str, str)
+            Label and code of each block.
+        hooks : tuple of str
+            The before/pre/post/after content.
+        origin : (str, float), optional, default=None
+            The vim command running the batch and when, see :meth:`execute`.
+
+        Returns
+        -------
+        list of (str, str)
+            msg_id and status ('ok', 'error' or 'aborted') of each block.
+        """
+        start = time.monotonic()
+        msg_ids = list()
+        replies = list()
+        for _, code in batch:
+            msg_id = self.execute(code, hooks=hooks, origin=origin,
+                                  allow_stdin=False, stop_on_error=True)
+            msg_ids.append(msg_id)
+            replies.append(self.get_reply(msg_id, 'shell'))
+            # Let the socket send it, see _listen_to_channel
+            await asyncio.sleep(0)
+
+        # Report each block as it completes
+        statuses = list()
+        for i_block, (label, _) in enumerate(batch):
+            reply = await replies[i_block]
+            status = reply.get('content', {}).get('status', 'unknown')
+            statuses.append(status)
+            self.thread_echom(
+                f'Cell {i_block+1}/{len(batch)} ({label.strip()}): {status}',
+                style={'ok': 'None', 'error': 'ErrorMsg'}.get(status, 'WarningMsg'))
+
+        elapsed = time.monotonic() - start
+        n_ok = statuses.count('ok')
+        self.thread_echom(
+            f'{n_ok}/{len(batch)} cells ok in {elapsed:.2f} s'
+            f' ({len(batch) / max(elapsed, 1e-9):.1f} cells/s)',
+            style='Question' if n_ok == len(batch) else 'WarningMsg')
+        return list(zip(msg_ids, statuses))
+
+    def send_variable(self, name, data, encoding='utf-8', label='', timeout=60):
+        """Bind bytes to a variable of the kernel, without blocking vim.
+
+        The bytes go as is in a buffer of a `comm_open` message, see
+        `Language.bind`: no code to parse, no json escaping, and no copy by
+        zmq past its copy threshold. The result is reported with echom.
+
+        Parameters
+        ----------
+        name : str
+            The variable.
+        data : bytes-like
+            The content, i.e. a :obj:`mmap.mmap` of a file: it must not be
+            changed or closed until sent, zmq keeps a reference until then.
+        encoding : str, optional, default='utf-8'
+            Bind a str decoded with it, bytes if empty.
+        label : str, optional, default=''
+            What is sent, for the message, i.e. the name of the file.
+        timeout : float, optional, default=60
+            Seconds to wait for the reply before giving up, i.e. if the
+            kernel died.
+
+        Returns
+        -------
+        :obj:`concurrent.futures.Future`
+            Resolves to the reply of the kernel: {'status': 'ok', 'size'}, or
+            {'status': 'error', 'ename', 'evalue'}.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self._send_variable(name, data, encoding, label, timeout), self.loop)
+
+    async def _send_variable(self, name, data, encoding, label, timeout):
+        """Register the comm target, open a comm with the bytes, await its reply."""
+        start = time.monotonic()
+        # The shell channel keeps the order: the target exists before the comm_open
+        self.execute(self.lang.bind, ismeta=True, silent=True)
+        session = self.km_client.session
+        msg = session.msg('comm_open', {
+            'comm_id': uuid.uuid4().hex, 'target_name': 'jupyter_vim',
+            'data': {'name': name, 'encoding': encoding}})
+        outputs = self.router.subscribe('iopub', msg['header']['msg_id'])
+
+        async def get_reply():
+            while True:
+                msg = await outputs.get()
+                msg_type = msg['header']['msg_type']
+                if msg_type == 'comm_msg':
+                    return msg['content'].get('data', {})
+                if msg_type == 'status' and msg['content'].get('execution_state') == 'idle':
+                    return {'status': 'error', 'ename': 'RuntimeError',
+                            'evalue': 'the kernel has no jupyter_vim comm target'}
+
+        try:
+            self.send('shell', msg, buffers=[data])
+            reply = await asyncio.wait_for(get_reply(), timeout)
+        except asyncio.TimeoutError:
+            reply = {'status': 'error', 'ename': 'TimeoutError',
+                     'evalue': f'no reply from the kernel in {timeout} s'}
+        finally:
+            outputs.close()
+
+        elapsed = time.monotonic() - start
+        if reply.get('status') == 'ok':
+            self.thread_echom(f'{name} = {label or "buffer"}: {len(data) / 2**20:.1f} MB '
+                              f'in {elapsed:.2f} s', style='Question')
+        else:
+            self.thread_echom(f'Cannot bind {name}: {reply.get("ename")}: {reply.get("evalue")}',
+                              style='Error')
+        return reply
+
+    async def execute_timed(self, code, hooks, origin=None):
+        """Execute code on the kernel and await its reply (asyncio thread).
+
+        Parameters
+        ----------
+        code : str
+            The code to execute.
+        hooks : tuple of str
+            The before/pre/post/after content.
+        origin : (str, float), optional, default=None
+            The vim command sending it and when, see :meth:`execute`.
+
+        Returns
+        -------
+        (str, str, float)
+            msg_id, status and seconds elapsed until the reply.
+        """
+        start = time.monotonic()
+        msg_id = self.execute(code, hooks=hooks, origin=origin, allow_stdin=False)
+        reply = await self.get_reply(msg_id, 'shell')
+        status = reply.get('content', {}).get('status', 'unknown')
+        return msg_id, status, time.monotonic() - start
+
     async def execute_and_get_reply(self, code):
         """Execute code on the kernel and get back variable _res
 
@@ -272,25 +831,170 @@ class JupyterMessenger():
         str
             Unquoted string of the message reply.
         """
-        # Send message
+        # Send message, subscribe to its outputs before yielding to the loop
         msg_id = self.execute(code, ismeta=True, silent=True, user_expressions={'_res': '_res'})
-        reply = await self.get_reply(msg_id, 'shell')
+        outputs = self.router.subscribe('iopub', msg_id)
+        try:
+            reply = await self.get_reply(msg_id, 'shell')
 
-        # Get _res from user expression
-        res = reply.get('content', {}).get('user_expressions', {}) \
-                   .get('_res', {}).get('data', {}).get('text/plain', -1)
+            # Get _res from user expression
+            res = reply.get('content', {}).get('user_expressions', {}) \
+                       .get('_res', {}).get('data', {}).get('text/plain', -1)
 
-        # Try again parse messages
-        if res == -1:
-            line_number = reply.get('content', {}).get('execution_count', -1)
-            msgs = await self.get_pending_msgs()
-            res = parse_iopub_for_reply(msgs, line_number)
+            # Try again parse messages
+            if res == -1:
+                line_number = reply.get('content', {}).get('execution_count', -1)
+                msgs = await self.get_outputs(outputs)
+                res = parse_iopub_for_reply(msgs, line_number)
+        finally:
+            outputs.close()
 
         # Rest in peace
         return unquote_string(res)
 
+    async def evaluate(self, code, expression):
+        """Execute code, then evaluate an expression in the kernel (asyncio thread).
+
+        Parameters
+        ----------
+        code : str
+            The code, executed silently.
+        expression : str
+            The expression, a user_expression of the same request.
+
+        Returns
+        -------
+        str
+            The text of the value of the expression, unquoted if a string.
+
+        Raises
+        ------
+        RuntimeError
+            If the code or the expression failed in the kernel.
+        """
+        msg_id = self.execute(code, ismeta=True, silent=True,
+                              user_expressions={'_res': expression})
+        reply = await self.get_reply(msg_id, 'shell')
+        content = reply.get('content', {})
+        res = content.get('user_expressions', {}).get('_res', {})
+        for status in (content, res):
+            if status.get('status', 'ok') != 'ok':
+                raise RuntimeError(f"{status.get('ename', 'Error')}: {status.get('evalue', '')}")
+
+        text = res.get('data', {}).get('text/plain', '')
+        try:
+            return ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            return unquote_string(text)
+
+    async def fetch(self, expr, count):
+        """Get the first lines of the text of an expression (asyncio thread).
+
+        The kernel keeps an iterator on the lines under a new token, see
+        `Language.fetch`: the next ones are got by :meth:`fetch_page`. The
+        text is never sent whole.
+
+        Parameters
+        ----------
+        expr : str
+            The expression, in the language of the kernel.
+        count : int
+            Number of lines.
+
+        Returns
+        -------
+        (str, list of str, bool)
+            The token of the iterator, the lines, and whether they are the last.
+
+        Raises
+        ------
+        RuntimeError
+            If the expression failed in the kernel.
+        """
+        token = uuid.uuid4().hex
+        text = await self.evaluate(self.lang.fetch.format(expr=expr, token=token),
+                                   self.lang.fetch_page.format(token=token, count=count))
+        return (token, *parse_page(text))
+
+    async def fetch_page(self, token, count):
+        """Get the next lines of the expression of :meth:`fetch` (asyncio thread).
+
+        Parameters
+        ----------
+        token : str
+            The token of the iterator, returned by :meth:`fetch`.
+        count : int
+            Number of lines, 0 to release the iterator of the kernel.
+        """
+        text = await self.evaluate('', self.lang.fetch_page.format(token=token, count=count))
+        return parse_page(text)
+
+    async def share(self, expr):
+        """Have the kernel write the text of an expression to a file (asyncio thread).
+
+        Only the handle of the file comes back in the reply, see `Language.share`:
+        the text itself never goes through the sockets.
+
+        Parameters
+        ----------
+        expr : str
+            The expression, in the language of the kernel.
+
+        Returns
+        -------
+        (str, int)
+            The path of the file, on the host of the kernel, and its size in bytes.
+
+        Raises
+        ------
+        RuntimeError
+            If the expression or the snippet failed in the kernel.
+        """
+        text = await self.evaluate(self.lang.share.format(expr), '_res')
+        path, _, size = text.rpartition(';')
+        if not path or not size.isdigit():
+            raise RuntimeError(f'unexpected handle: {text!r}')
+        return path, int(size)
+
+    @staticmethod
+    async def get_outputs(outputs, timeout=5):
+        """Gather iopub messages of a request until the kernel is idle.
+
+        Parameters
+        ----------
+        outputs : :obj:`Subscription`
+            Subscription to the iopub messages of the request.
+        timeout : float, optional, default=5
+            Seconds to wait for the kernel to be idle before giving up.
+
+        Returns
+        -------
+        list of :obj:`msg`
+            The messages received before the idle status.
+        """
+        msgs = list()
+
+        async def gather():
+            while True:
+                msg = await outputs.get()
+                if msg['header']['msg_type'] == 'status' and \
+                        msg['content'].get('execution_state') == 'idle':
+                    return
+                msgs.append(msg)
+
+        try:
+            await asyncio.wait_for(gather(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return msgs
+
     async def get_kernel_info(self):
-        """Explicitly ask the jupyter kernel for its pid
+        """Explicitly ask the jupyter kernel for its language, pid, cwd and hostname
+
+        The native kernel_info_request and the language introspection snippet
+        are sent back-to-back then awaited together: one round trip. Only if
+        the kernel type is unknown is the snippet chosen from the language
+        the kernel reports, at the cost of a second round trip.
 
         .. note:: Thread: <- cfile
                           <- vim_pid
@@ -299,24 +1003,44 @@ class JupyterMessenger():
         Returns
         -------
         dict
-            dict with keys: {'kernel_type', 'pid', 'cwd', 'hostname'}
+            dict with keys: {'kernel_type', 'language', 'pid', 'cwd', 'hostname'}
         """
-        # Check in
-        if self.kernel_info['kernel_type'] not in list_languages():
+        # Send both requests before awaiting any reply
+        msg = self.km_client.session.msg('kernel_info_request')
+        self.send('shell', msg)
+        requests = [self.get_reply(msg['header']['msg_id'], 'shell')]
+        known = self.kernel_info['kernel_type'] in list_languages()
+        if known:
+            requests.append(self.execute_and_get_reply(self.lang.info))
+        replies = await asyncio.gather(*requests)
+
+        # Fall back on the language reported by the kernel
+        content = replies[0].get('content', {})
+        language = content.get('language_info', {}).get('name', '').lower()
+        if not known and language in list_languages():
+            self.lang = get_language(language)
+            replies.append(await self.execute_and_get_reply(self.lang.info))
+        elif not known:
             self.thread_echom(
                 ('I don''t know how to get infos for a Jupyter kernel of type '
                  f'"{self.kernel_info["kernel_type"]}"'),
                 style='WarningMsg'
             )
+            replies.append('-1')
+
+        # Split "pid;hostname;cwd"
+        pid, hostname, cwd = (replies[1].strip().split(';', 2) + ['-1'] * 3)[:3]
 
         # Fill kernel_info
         self.kernel_info.update({
             'connection_file': self.kernel_info['cfile_user'],
             'id': match_kernel_id(self.kernel_info['cfile_user']),
+            'language': language,
+            'implementation': content.get('implementation', ''),
             # Get from kernel info
-            'pid': await self.execute_and_get_reply(self.lang.pid),  # PID of kernel
-            'cwd': await self.execute_and_get_reply(self.lang.cwd),
-            'hostname': await self.execute_and_get_reply(self.lang.hostname),
+            'pid': pid,  # PID of kernel
+            'cwd': cwd,
+            'hostname': hostname,
         })
 
         # Return
@@ -324,23 +1048,311 @@ class JupyterMessenger():
 
     def thread_echom(self, arg, **args):
         """Schedule message for displaying with echom."""
-        self.echom_queue.put((arg, args))
+        self.echom_queue.put((time.monotonic(), arg, args))
+        self.waker.wake()
+
+    def drain_echom(self):
+        """Call echom sync on all messages in queue.
 
-    def timer_echom(self):
-        """Call echom sync on all messages in queue."""
-        empty = self.echom_queue.empty()
+        Returns
+        -------
+        float or None
+            Arrival time of the oldest message displayed, None if none.
+        """
+        oldest = None
         while not self.echom_queue.empty():
-            (arg, args) = self.echom_queue.get_nowait()
+            (arrival, arg, args) = self.echom_queue.get_nowait()
             echom(arg, **args)
-        if not empty:
-            vim.command('redraw')
-        timer_interval = get_vim('g:jupyter_timer_interval', 500)
-        vim.command(f'call timer_start({timer_interval}, "jupyter#UpdateEchom")')
+            oldest = arrival if oldest is None else oldest
+        return oldest
+
+
+class BridgeMessenger():
+    """Same interface as :obj:`JupyterMessenger`, out of vim's process.
+
+    The kernel client runs in the bridge process (see jupyter_bridge.py), a
+    vim job spoken to through a json channel: only requests and what is
+    displayed cross the pipe. Its echom messages are displayed by the channel
+    callback, without python.
+
+    .. note:: vim commands with `g:jupyter_bridge` set.
+
+    Parameters
+    ----------
+    name : str, optional, default=''
+        Name of the bridge job, one per kernel: the id of the kernel.
+
+    Attributes
+    ----------
+    kernel_info : dict
+        Information about the kernel itself, sent by the bridge once connected.
+    state : str
+        State of the connection, sent by the bridge when it changes, see
+        :obj:`JupyterMessenger`.
+    batches : dict
+        Future of each batch of cells running, by id.
+    """
+    out_of_process = True
+
+    def __init__(self, name=''):
+        self.name = name
+        self.kernel_info = dict()
+        self.lang = get_language('')
+        self.state = 'disconnected'
+        # Never started: the bridge wakes vim up by writing to its channel
+        self.waker = VimWaker()
+        self.batches = dict()
+        self.batch_count = 0
+
+    @property
+    def vim_name(self):
+        """The name of the bridge job, as a vim string."""
+        return "'{}'".format(self.name.replace("'", "''"))
+
+    def request(self, op, timeout=2000, **params):
+        """Send a request to the bridge and wait for its reply.
+
+        Parameters
+        ----------
+        op : str
+            The operation, see :meth:`Bridge.handle`.
+        timeout : int, optional, default=2000
+            Milliseconds to wait for the reply.
+        **params : dict
+            Parameters of the operation.
+
+        Returns
+        -------
+        dict
+            The reply, with key 'error' if the request failed.
+        """
+        params['op'] = op
+        request = json.dumps(params).replace("'", "''")
+        reply = json.loads(vim.eval(
+            f"jupyter#bridge#Request({self.vim_name}, '{request}', {timeout:d})"))
+        if not isinstance(reply, dict):
+            reply = {'error': f'no reply from the bridge to {op}'}
+        if 'error' in reply:
+            echom(f'Bridge: {reply["error"]}', style='Error')
+        return reply
+
+    def connect(self, kernel_type, filename='kernel-*.json', packer=''):
+        """Start the bridge and connect it to the kernel.
+
+        Parameters
+        ----------
+        kernel_type : str
+            The type of kernel, i.e. `python`.
+        filename : str
+            Filename of the kernel connection file.
+        packer : str, optional, default=''
+            Serializer of the messages, see :meth:`JupyterMessenger.connect`.
+        """
+        self.kernel_info['kernel_type'] = kernel_type
+        self.kernel_info['cfile_user'] = filename
+        self.lang = get_language(kernel_type)
+        self.state = 'connecting'
+
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jupyter_bridge.py')
+        if not int(vim.eval("jupyter#bridge#Start({}, '{}')".format(
+                self.vim_name, script.replace("'", "''")))):
+            echom('Bridge: could not start, see g:jupyter_bridge_python', style='Error')
+            return
+        self.request('connect', kernel_type=kernel_type, filename=filename, packer=packer)
+
+    def close(self):
+        """Disconnect the bridge from the kernel and stop it, silently."""
+        if int(vim.eval(f'jupyter#bridge#IsRunning({self.vim_name})')):
+            self.request('disconnect')
+            vim.command(f'call jupyter#bridge#Stop({self.vim_name})')
+        for batch in self.batches.values():
+            batch.cancel()
+        self.batches = dict()
+        self.state = 'disconnected'
+
+    def disconnect(self):
+        """Disconnect the bridge from the kernel and stop it."""
+        self.close()
+        self.kernel_info = dict()
+        self.lang = get_language('')
+        echom('Disconnected.', style='Directory')
+
+    def check_connection(self):
+        """Check that the bridge has a client connected to the kernel.
+
+        The state is sent by the bridge when it changes: no round trip.
+
+        Returns
+        -------
+        bool
+            True if client is connected, False if not.
+        """
+        return self.state in CONNECTED_STATES \
+            and bool(int(vim.eval(f'jupyter#bridge#IsRunning({self.vim_name})')))
+
+    def execute(self, code, ismeta=False, hooks=None, **kwargs):
+        """Execute some code on the kernel, see :meth:`JupyterMessenger.execute`."""
+        hooks = hooks or JupyterMessenger.get_exec_hooks()
+        reply = self.request('execute', code=code, ismeta=ismeta, hooks=hooks, kwargs=kwargs)
+        return reply.get('msg_id', -1)
+
+    def run_batch(self, batch, hooks=None):
+        """Execute a batch of code blocks, see :meth:`JupyterMessenger.run_batch`.
+
+        Returns
+        -------
+        :obj:`concurrent.futures.Future`
+            Resolves to the list of (msg_id, status) of each block, when the
+            bridge reports the end of the batch.
+        """
+        self.batch_count += 1
+        future = concurrent.futures.Future()
+        self.batches[self.batch_count] = future
+        hooks = hooks or JupyterMessenger.get_exec_hooks()
+        reply = self.request('run_batch', batch_id=self.batch_count, batch=batch, hooks=hooks)
+        if 'error' in reply:
+            self.batches.pop(self.batch_count).cancel()
+        return future
+
+    def on_event(self, event):
+        """Handle an event of the bridge that vim script does not.
+
+        .. note:: called by the channel callback `jupyter#bridge#OnEvent`.
+
+        Parameters
+        ----------
+        event : str
+            The json of the event.
+        """
+        event = json.loads(event)
+        if event['event'] == 'kernel_info':
+            self.kernel_info.update(event['kernel_info'])
+            # Same fallback as JupyterMessenger.get_kernel_info
+            language = self.kernel_info.get('language', '')
+            if self.kernel_info['kernel_type'] not in list_languages() \
+                    and language in list_languages():
+                self.lang = get_language(language)
+        elif event['event'] == 'state':
+            self.state = event['state']
+            vim.command('redrawstatus!')
+        elif event['event'] == 'batch':
+            future = self.batches.pop(event['batch_id'], None)
+            if future is None:
+                return
+            if event['result'] is None:
+                future.cancel()
+            else:
+                future.set_result([tuple(block) for block in event['result']])
+
+    @staticmethod
+    def drain_echom():
+        """Nothing to drain: the channel callback displays the echom events."""
+        return None
+
+
+# -----------------------------------------------------------------------------
+#        Several kernels
+# -----------------------------------------------------------------------------
+def fan_out(loop, clients, hooks, origin=None):
+    """Execute code on several kernels at once, without blocking vim.
+
+    Parameters
+    ----------
+    loop : :obj:`asyncio.AbstractEventLoop`
+        The loop shared by the clients, see :obj:`KernelThread`.
+    clients : list of (str, :obj:`JupyterMessenger`, str)
+        Name, client and code of each kernel.
+    hooks : tuple of str
+        The before/pre/post/after content.
+    origin : (str, float), optional, default=None
+        The vim command and when it was called, to time the requests.
+
+    Returns
+    -------
+    :obj:`concurrent.futures.Future`
+        Resolves to the (name, msg_id, status, seconds) of each kernel.
+    """
+    origin = origin or ('fan_out', time.monotonic())
+    return asyncio.run_coroutine_threadsafe(_fan_out(clients, hooks, origin), loop)
+
+
+async def _fan_out(clients, hooks, origin):
+    """Send one execute_request to each kernel, then gather their replies.
+
+    Each kernel is reported with echom, then the total, all in the queue of
+    the first client to keep them in order.
+    """
+    echo = clients[0][1].thread_echom
+    start = time.monotonic()
+    results = await asyncio.gather(
+        *(client.execute_timed(code, hooks, origin) for _, client, code in clients),
+        return_exceptions=True)
+
+    report = list()
+    for (name, _, _), result in zip(clients, results):
+        if isinstance(result, Exception):
+            result = (None, f'failed ({result.__class__.__name__}: {result})', 0)
+        msg_id, status, elapsed = result
+        report.append((name, msg_id, status, elapsed))
+        echo(f'Kernel {name}: {status} in {elapsed:.2f} s',
+             style={'ok': 'None', 'error': 'ErrorMsg'}.get(status, 'WarningMsg'))
+
+    n_ok = sum(1 for _, _, status, _ in report if status == 'ok')
+    echo(f'{n_ok}/{len(clients)} kernels ok in {time.monotonic() - start:.2f} s',
+         style='Question' if n_ok == len(clients) else 'WarningMsg')
+    return report
+
+
+async def start_kernel(kernel_name, context=None, timeout=60):
+    """Launch a local kernel and wait until it answers (asyncio thread).
+
+    Parameters
+    ----------
+    kernel_name : str
+        Name of the kernelspec, i.e. `python3`.
+    context : :obj:`zmq.asyncio.Context`, optional, default=None
+        Context of the sockets, see :obj:`KernelThread`.
+    timeout : float, optional, default=60
+        Seconds to wait for the kernel to answer.
+
+    Returns
+    -------
+    :obj:`AsyncKernelManager`
+        Manager of the kernel, with its `connection_file`.
+    """
+    # Slow to import: only when starting
+    from jupyter_client import AsyncKernelManager  # pylint: disable=import-outside-toplevel
+
+    kwargs = dict() if context is None else dict(context=context)
+    kernel_manager = AsyncKernelManager(kernel_name=kernel_name, **kwargs)
+    await kernel_manager.start_kernel()
+    client = kernel_manager.client(**kwargs)
+    client.start_channels()
+    try:
+        await client.wait_for_ready(timeout=timeout)
+    except BaseException:
+        await kernel_manager.shutdown_kernel(now=True)
+        raise
+    finally:
+        client.stop_channels()
+    return kernel_manager
 
 
 # -----------------------------------------------------------------------------
 #        Parsers
 # -----------------------------------------------------------------------------
+def parse_page(text):
+    """Split a page of :meth:`JupyterMessenger.fetch`: "last;count;lines".
+
+    Returns
+    -------
+    (list of str, bool)
+        The lines, and whether they are the last.
+    """
+    last, count, lines = text.split(';', 2)
+    return (lines.split('\n') if int(count) else []), last == '1'
+
+
 def parse_iopub_for_reply(msgs, line_number):
     """Get kernel response from message pool.
 
@@ -368,10 +1380,9 @@ def parse_iopub_for_reply(msgs, line_number):
         if not content:
             continue
 
+        # Only skip results of other executions (streams have no count)
         i_count = int(content.get('execution_count', 0))
-        if not i_count:
-            continue
-        if line_number not in (-1, i_count):
+        if i_count and line_number not in (-1, i_count):
             continue
 
         msg_type = msg.get('header', {}).get('msg_type', '')
@@ -0,0 +1,154 @@
+"""
+Route kernel messages to their consumers by parent msg_id.
+
+Every message read from a kernel channel is handed to :meth:`MessageRouter.dispatch`,
+which delivers it to the subscriptions waiting on its `parent_header.msg_id`
+(one dict lookup) and to every wildcard subscription of the channel (i.e. the
+Monitor).
+
+Each subscription owns a bounded queue, so a message that arrives while nobody
+is awaiting is kept until the consumer comes back for it rather than lost.
+
+.. note:: The router is not thread safe: subscribe, dispatch and get must all
+          be called from the thread running the asyncio loop.
+"""
+
+# Standard
+import collections
+
+# Export only
+__all__ = ['MessageRouter', 'Subscription']
+
+
+class Subscription():
+    """Bounded queue of the messages routed to one consumer.
+
+    Attributes
+    ----------
+    channel : 'shell' | 'iopub' | 'control'
+        The channel subscribed to.
+    msg_id : str or None
+        Parent msg_id of the messages to receive, None for all of them.
+    accept : callable or None
+        Predicate on each message: the ones it rejects are not queued.
+    dropped : int
+        Number of messages discarded because the queue was full.
+    """
+    def __init__(self, router, channel, msg_id=None, maxlen=None, accept=None):
+        self.router = router
+        self.channel = channel
+        self.msg_id = msg_id
+        self.accept = accept
+        self.queue = collections.deque(maxlen=maxlen)
+        self.dropped = 0
+        self._waiter = None
+
+    def put(self, msg):
+        """Queue `msg`, dropping the oldest message if the queue is full."""
+        if self.accept is not None and not self.accept(msg):
+            return
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(msg)
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def get(self):
+        """Get the next message, waiting for it if none is queued yet."""
+        while not self.queue:
+            self._waiter = self.router.loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self.queue.popleft()
+
+    async def get_once(self):
+        """Get the next message then close the subscription."""
+        try:
+            return await self.get()
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop receiving messages."""
+        self.router.unsubscribe(self)
+
+
+class MessageRouter():
+    """Deliver incoming messages to subscriptions keyed by parent msg_id.
+
+    Parameters
+    ----------
+    loop : asyncio.AbstractEventLoop
+        The loop on which the consumers await their messages.
+    maxlen : int, optional, default=1024
+        Default capacity of the queue of each subscription.
+    """
+    def __init__(self, loop, maxlen=1024):
+        self.loop = loop
+        self.maxlen = maxlen
+        # channel -> msg_id -> list of Subscription
+        self.routes = collections.defaultdict(dict)
+        # channel -> list of Subscription receiving all messages
+        self.wildcards = collections.defaultdict(list)
+
+    def subscribe(self, channel, msg_id=None, maxlen=None, accept=None):
+        """Start receiving the messages of `channel` whose parent is `msg_id`.
+
+        Subscribe before the reply can be dispatched, i.e. right after sending
+        the request and before awaiting anything, or it will not be received.
+
+        Parameters
+        ----------
+        channel : 'shell' | 'iopub' | 'control'
+            The channel to listen on.
+        msg_id : str, optional, default=None
+            The id of the request whose replies to receive. If None, receive
+            every message of the channel.
+        maxlen : int, optional, default=None
+            Capacity of the queue, defaults to the router's.
+        accept : callable, optional, default=None
+            Only queue the messages for which `accept(msg)` is true.
+
+        Returns
+        -------
+        :obj:`Subscription`
+            The subscription, to `get` the messages from and `close` when done.
+        """
+        sub = Subscription(self, channel, msg_id, maxlen or self.maxlen, accept)
+        if msg_id is None:
+            self.wildcards[channel].append(sub)
+        else:
+            self.routes[channel].setdefault(msg_id, []).append(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        """Stop routing messages to `sub`. Does nothing if already removed."""
+        if sub.msg_id is None:
+            waiting = self.wildcards[sub.channel]
+        else:
+            waiting = self.routes[sub.channel].get(sub.msg_id, [])
+        if sub in waiting:
+            waiting.remove(sub)
+        if sub.msg_id is not None and not waiting:
+            self.routes[sub.channel].pop(sub.msg_id, None)
+
+    def dispatch(self, channel, msg):
+        """Deliver `msg` received on `channel` to its subscribers.
+
+        Returns
+        -------
+        bool
+            True if a subscription was waiting for this very message.
+        """
+        for sub in self.wildcards[channel]:
+            sub.put(msg)
+
+        msg_id = msg.get('parent_header', {}).get('msg_id')
+        waiting = self.routes[channel].get(msg_id)
+        if not waiting:
+            return False
+        for sub in waiting:
+            sub.put(msg)
+        return True
@@ -2,13 +2,14 @@
 Utility functions for use with jupyter_vim module.
 """
 
-from pathlib import Path
 import re
 import signal
 
-from jupyter_core.paths import jupyter_runtime_dir
-
-import vim
+# Absent in the bridge process, see jupyter_bridge.py
+try:
+    import vim
+except ImportError:
+    vim = None
 
 
 def is_integer(s_in):
@@ -74,6 +75,49 @@ def get_vim(name, default=None):
         return default
 
 
+class ExecHooks():
+    """Snapshot of the `b:jupyter_exec_*` of each buffer.
+
+    The variables are read and decoded in one call to `jupyter#ExecHooks()`
+    the first time a buffer sends code. Then each send only compares their
+    raw values in `b:` to those of the snapshot, without calling vim
+    functions: read again when one differs, however it was set.
+
+    .. note:: vim thread only.
+
+    Attributes
+    ----------
+    snapshots : dict
+        The raw values and the before/pre/post/after content, by buffer
+        number.
+    """
+    names = tuple(f'jupyter_exec_{name}' for name in ('before', 'pre', 'post', 'after'))
+
+    def __init__(self):
+        self.snapshots = dict()
+
+    def get(self):
+        """Get the before/pre/post/after content of the current buffer."""
+        buf = vim.current.buffer
+        raw = tuple(buf.vars.get(name, b'') for name in self.names)
+        raw_snapshot, hooks = self.snapshots.get(buf.number, (None, None))
+        if raw != raw_snapshot:
+            hooks = tuple(vim.eval('jupyter#ExecHooks()'))
+            self.snapshots[buf.number] = (raw, hooks)
+        return hooks
+
+    def invalidate(self, bufnr=0):
+        """Drop the snapshot of buffer `bufnr`, of all buffers if 0."""
+        if bufnr:
+            self.snapshots.pop(bufnr, None)
+        else:
+            self.snapshots.clear()
+
+
+# The snapshots of all buffers, for all the sessions
+exec_hooks = ExecHooks()
+
+
 def str_to_py(obj):
     """Encode Python object `obj` as python string.
 
@@ -179,19 +223,19 @@ def match_kernel_id(fpath):
     return m_kernel[1] if m_kernel else None
 
 
-def find_jupyter_kernel_ids():
-    """Find opened kernel json files.
+def find_kernel_names():
+    """Find the installed kernelspecs.
 
     .. note:: called by vim command completion.
 
     Returns
     -------
     list(str)
-        List of strings of kernel ids.
+        Sorted names of the kernelspecs, i.e. python3.
     """
-    # TODO Get type of kernel (python, julia, etc.)
-    runtime_files = Path(jupyter_runtime_dir()).glob('kernel*.json')
-    return [match_kernel_id(fpath) for fpath in runtime_files]
+    # Slow to import: only when completing
+    from jupyter_client.kernelspec import find_kernel_specs  # pylint: disable=import-outside-toplevel
+    return sorted(find_kernel_specs())
 
 
 def find_signals():
@@ -46,16 +46,19 @@ except ImportError as e_import:
 
 # Standard
 import functools
-from os import kill, remove
-from os.path import splitext
+import mmap
+from queue import Queue
+from os import fstat, kill, remove
+from os.path import basename, splitext
 from platform import system
 import signal
-import re
+import socket
+import time
 
 # Local
-from jupyter_util import str_to_py, echom, is_integer, unquote_string, get_vim
-from jupyter_messenger import JupyterMessenger
-from monitor_console import Monitor
+from cell_index import CellIndex
+from jupyter_util import str_to_py, echom, is_integer, unquote_string, get_vim, \
+    match_kernel_id, exec_hooks
 
 
 class JupyterVimSession():
@@ -63,27 +66,80 @@ class JupyterVimSession():
 
     This object is created in lieu of individual functions so that a single vim
     session can connect to multiple Jupyter kernels at once. Each connection
-    gets a new JupyterVimSession object.
+    gets a new JupyterVimSession object, see :obj:`SessionRegistry`.
+
+    Parameters
+    ----------
+    kernel_id : str, optional, default=''
+        Id of the kernel, i.e. `24536` for `kernel-24536.json`.
+    kernel_thread : :obj:`KernelThread`, optional, default=None
+        Thread shared with the sessions of other kernels, a new one if None.
+    cell_indexes : dict, optional, default=None
+        Cell indexes shared with the other sessions, a new dict if None.
 
     Attributes
     ----------
-    kernel_client : :obj:`JupyterMessenger`
+    kernel_client : :obj:`JupyterMessenger` or :obj:`BridgeMessenger`
         Object to handle primitive messaging between vim and the jupyter kernel.
+        In a bridge process if `g:jupyter_bridge` is set when connecting.
+        Created on first use: the cell commands do not import jupyter_client.
+    cell_indexes : dict
+        Cell separators and :obj:`CellIndex` of each buffer number.
+    batch : :obj:`concurrent.futures.Future`
+        The last batch of cells run, resolves to the (msg_id, status) of each.
+    view : :obj:`ScratchView`
+        The buffer of `:JupyterShow` and `:JupyterFetch`, if showing a value
+        of this kernel.
+    variables : :obj:`VariableExplorer`
+        The sidebar of `:JupyterVariables`, if listing the variables of this
+        kernel.
     """
-    def __init__(self):
-        self.kernel_client = JupyterMessenger()
+    def __init__(self, kernel_id='', kernel_thread=None, cell_indexes=None):
+        self.kernel_id = kernel_id
+        self.kernel_thread = kernel_thread
+        self._kernel_client = None
         self.monitor = None
+        self.cell_indexes = dict() if cell_indexes is None else cell_indexes
+        self.batch = None
+        self.view = None
+        self.variables = None
+        self.shared = Queue()   # Sources of the view, to open from vim's thread
+
+    @property
+    def kernel_client(self):
+        """The kernel client, imported and created on first use."""
+        if self._kernel_client is None:
+            from jupyter_messenger import JupyterMessenger  # pylint: disable=import-outside-toplevel
+            self._kernel_client = JupyterMessenger(self.kernel_thread)
+        return self._kernel_client
+
+    @property
+    def connected(self):
+        """Whether the kernel client is connected, without creating it."""
+        return self._kernel_client is not None and self._kernel_client.check_connection()
+
+    @property
+    def bridged(self):
+        """Whether the kernel client runs in the bridge process."""
+        return self.kernel_client.out_of_process
 
     def if_connected(fct):
         """Decorator, fail if not connected."""
         # pylint: disable=no-self-argument, not-callable, no-member
         @functools.wraps(fct)
         def wrapper(self, *args, **kwargs):
-            if not self.kernel_client.check_connection():
-                echom(f'python3 _jupyter_session.{fct.__name__}() needs a connected client.',
-                      style='Error')
+            if not self.connected:
+                echom(f'python3 _jupyter_sessions.current().{fct.__name__}() '
+                      'needs a connected client.', style='Error')
                 return None
-            return fct(self, *args, **kwargs)
+            # Time the requests of the command, see RequestStats
+            stats = None if self.bridged else self.kernel_client.stats
+            outer = stats is not None and stats.begin(fct.__name__)
+            try:
+                return fct(self, *args, **kwargs)
+            finally:
+                if outer:
+                    stats.end()
         return wrapper
 
     def connect_to_kernel(self, kernel_type, filename='kernel-*.json'):
@@ -99,19 +155,32 @@ class JupyterVimSession():
             Specific kernel connection filename, i.e.
                 ``$(jupyter --runtime)/kernel-123.json``
         """
-        if self.kernel_client.check_connection():
+        if self.connected:
             echom('Already connected to a kernel. Use :JupyterDisconnect to disconnect.', style='Error')
             return
-        self.kernel_client.connect(kernel_type, filename)
+
+        # In-process or bridge client, as set now
+        # pylint: disable=import-outside-toplevel
+        from jupyter_messenger import JupyterMessenger, BridgeMessenger
+        bridge = bool(int(get_vim('g:jupyter_bridge', 0)))
+        if bridge != self.bridged:
+            self.kernel_client.close()
+            self._kernel_client = BridgeMessenger(self.kernel_id) if bridge \
+                else JupyterMessenger(self.kernel_thread)
+        self.kernel_client.connect(kernel_type, filename,
+                                   get_vim('g:jupyter_session_packer', ''))
 
     def disconnect_from_kernel(self):
         """Disconnect from the kernel client if connected.
 
         Even when not connected, this function ensures the background thread
-        and event loop are shut down.
+        and event loop are shut down, unless shared with other sessions.
 
         .. note:: vim command `:JupyterDisconnect`.
         """
+        self.stop_monitor(wipeout_buffer=False)
+        self.close_view()
+        self.stop_variables(wipeout_buffer=False)
         self.kernel_client.disconnect()
 
     @if_connected
@@ -172,16 +241,202 @@ class JupyterVimSession():
                 pass
 
     @if_connected
-    def start_monitor(self):
-        self.monitor = Monitor(self.kernel_client)
+    def start_monitor(self, args=()):
+        """Open the monitor buffer, showing the messages of the kernel.
+
+        .. note:: vim command `:JupyterStartMonitor`.
+
+        Parameters
+        ----------
+        args : list of str, optional, default=()
+            Filters, see :meth:`MonitorFilter.from_args`.
+        """
+        if self.bridged:
+            echom('The monitor is not available with g:jupyter_bridge.', style='Error')
+            return
+        from monitor_console import Monitor, MonitorFilter  # pylint: disable=import-outside-toplevel
+        try:
+            msg_filter = MonitorFilter.from_args(
+                args, self.kernel_client.km_client.session.session)
+        except ValueError as err:
+            echom(f'JupyterStartMonitor: {err}', style='Error')
+            return
+        self.stop_monitor(wipeout_buffer=False)
+        self.monitor = Monitor(self.kernel_client, msg_filter)
 
     def stop_monitor(self, wipeout_buffer=True):
         if not self.monitor:
             return
+        self.monitor.stop()
         self.monitor = None
         if wipeout_buffer:
             vim.command('bwipeout __jupyter_monitor__')
 
+    @if_connected
+    def start_variables(self):
+        """Open the sidebar listing the variables of the kernel.
+
+        Refreshed after each execution, from any client: the kernel only
+        returns the variables changed, see `Language.variables`, and only
+        their rows are rewritten, see :obj:`VariableExplorer`.
+
+        .. note:: vim command `:JupyterVariables`.
+        """
+        client = self.kernel_client
+        if self.bridged:
+            echom('JupyterVariables is not available with g:jupyter_bridge.', style='Error')
+            return
+        if client.lang.variables == '-1':
+            echom(f'JupyterVariables: not implemented for '
+                  f'{client.kernel_info["kernel_type"]} kernels.', style='Error')
+            return
+        from variable_explorer import VariableExplorer  # pylint: disable=import-outside-toplevel
+        self.stop_variables(wipeout_buffer=False)
+        self.variables = VariableExplorer(client)
+
+    def stop_variables(self, wipeout_buffer=True):
+        """Stop refreshing the sidebar of the variables, if any."""
+        if not self.variables:
+            return
+        self.variables.stop()
+        self.variables = None
+        if wipeout_buffer:
+            vim.command('silent! bwipeout __jupyter_variables__')
+
+    def show_variables(self):
+        """Write the rows of the sidebar that scrolled into view, if any."""
+        if self.variables:
+            self.variables.show_rows()
+
+    @if_connected
+    def show(self, expr):
+        """Show the value of an expression in a scratch buffer, without blocking vim.
+
+        The kernel writes its text to a file (in /dev/shm if possible) and
+        only replies the path: vim maps the file and shows it page by page,
+        see :obj:`ScratchView`. For a kernel of the same host.
+
+        .. note:: vim command `:JupyterShow`.
+
+        Parameters
+        ----------
+        expr : str
+            The expression, in the language of the kernel.
+        """
+        client = self.kernel_client
+        if self.bridged:
+            echom('JupyterShow is not available with g:jupyter_bridge.', style='Error')
+            return
+        if client.lang.share == '-1':
+            echom(f'JupyterShow: not implemented for {client.kernel_info["kernel_type"]} kernels.',
+                  style='Error')
+            return
+        hostname = client.kernel_info.get('hostname')
+        if hostname != socket.gethostname():
+            echom(f'JupyterShow: the kernel runs on {hostname}, not on this host.', style='Error')
+            return
+
+        # pylint: disable=import-outside-toplevel
+        from scratch_view import MappedText
+
+        async def share():
+            path, _ = await client.share(expr)
+            return MappedText(path)
+        self.open_view('JupyterShow', expr, share())
+
+    @if_connected
+    def fetch(self, expr):
+        """Show the value of an expression in a scratch buffer, a page at a time.
+
+        The kernel keeps an iterator on the lines of its text: the first page
+        is shown as soon as it arrives, the next ones are fetched through
+        user_expressions as the cursor gets near the end, see :obj:`KernelPages`.
+
+        .. note:: vim command `:JupyterFetch`.
+
+        Parameters
+        ----------
+        expr : str
+            The expression, in the language of the kernel.
+        """
+        client = self.kernel_client
+        if self.bridged:
+            echom('JupyterFetch is not available with g:jupyter_bridge.', style='Error')
+            return
+        if client.lang.fetch == '-1':
+            echom(f'JupyterFetch: not implemented for {client.kernel_info["kernel_type"]} kernels.',
+                  style='Error')
+            return
+        # pylint: disable=import-outside-toplevel
+        from scratch_view import KernelPages
+        page_lines = int(get_vim('g:jupyter_view_page_lines', 1000))
+
+        async def fetch():
+            return KernelPages(client, *await client.fetch(expr, page_lines))
+        self.open_view('JupyterFetch', expr, fetch())
+
+    def open_view(self, command, title, coroutine):
+        """Open the view on the source `coroutine` returns, once ready.
+
+        Parameters
+        ----------
+        command : str
+            The vim command, for the errors.
+        title : str
+            The title of the view.
+        coroutine : coroutine
+            Returns the source of the lines, see :obj:`ScratchView`.
+        """
+        from asyncio import run_coroutine_threadsafe  # pylint: disable=import-outside-toplevel
+        # Release the lines of the kernel before asking for others
+        self.close_view()
+
+        def ready(future):
+            self.shared.put((command, title, future))
+            self.kernel_client.waker.wake()
+        run_coroutine_threadsafe(coroutine, self.kernel_client.loop).add_done_callback(ready)
+
+    def open_shared(self):
+        """Show the values the kernel shared or paged, once ready."""
+        from scratch_view import ScratchView  # pylint: disable=import-outside-toplevel
+        while not self.shared.empty():
+            command, title, future = self.shared.get_nowait()
+            if future.cancelled() or future.exception() is not None:
+                echom(f'{command} {title}: '
+                      f'{"cancelled" if future.cancelled() else future.exception()}',
+                      style='Error')
+                continue
+            self.close_view()
+            self.view = ScratchView(future.result(), title)
+
+    def close_view(self):
+        """Release the text of the view, if any."""
+        if self.view:
+            self.view.close()
+            self.view = None
+
+    def drain(self):
+        """Display what the kernel thread queued: echom messages and monitor lines.
+
+        .. note:: called by :meth:`SessionRegistry.drain`.
+
+        Returns
+        -------
+        list of float
+            Arrival time of the oldest message displayed of each queue.
+        """
+        if self._kernel_client is None:
+            return []
+        arrivals = [self.kernel_client.drain_echom()]
+        self.open_shared()
+        if self.view:
+            self.view.drain()
+        if self.variables:
+            self.variables.write_rows()
+        if self.monitor:
+            arrivals.append(self.monitor.write_msgs())
+        return [arrival for arrival in arrivals if arrival is not None]
+
     # -----------------------------------------------------------------------------
     #        Communicate with Kernel
     # -----------------------------------------------------------------------------
@@ -248,6 +503,56 @@ class JupyterVimSession():
         msg_id = self.kernel_client.execute(cmd, allow_stdin=False)
         return (cmd, msg_id)
 
+    @if_connected
+    def send_buffer_as_variable(self, name, filename='', raw=False):
+        """Bind the current buffer or a file to a variable of the kernel, as is.
+
+        The content is sent as a binary buffer of a comm message, not as code:
+        a file is mapped and handed to zmq without copy.
+
+        .. note:: vim command `:JupyterSendBufferAsVariable`.
+
+        Parameters
+        ----------
+        name : str
+            The variable.
+        filename : str, optional, default=''
+            The file to send, the current buffer if empty.
+        raw : bool, optional, default=False
+            Bind bytes, instead of a str decoded from utf-8.
+
+        Returns
+        -------
+        :obj:`concurrent.futures.Future` or None
+            See :meth:`JupyterMessenger.send_variable`, None if not sent.
+        """
+        client = self.kernel_client
+        if self.bridged:
+            echom('JupyterSendBufferAsVariable is not available with g:jupyter_bridge.',
+                  style='Error')
+            return None
+        if client.lang.bind == '-1':
+            echom('JupyterSendBufferAsVariable: not implemented for '
+                  f'{client.kernel_info["kernel_type"]} kernels.', style='Error')
+            return None
+        if not name.isidentifier():
+            echom(f'JupyterSendBufferAsVariable: invalid variable name {name}', style='Error')
+            return None
+
+        if filename:
+            try:
+                with open(filename, 'rb') as f_data:
+                    # Kept alive by zmq until sent, an empty file cannot be mapped
+                    data = mmap.mmap(f_data.fileno(), 0, access=mmap.ACCESS_READ) \
+                        if fstat(f_data.fileno()).st_size else b''
+            except OSError as err:
+                echom(f'JupyterSendBufferAsVariable: {err}', style='Error')
+                return None
+        else:
+            data = ('\n'.join(vim.current.buffer[:]) + '\n').encode()
+        return client.send_variable(name, data, '' if raw else 'utf-8',
+                                    basename(filename) if filename else '')
+
     @if_connected
     def run_file_in_ipython(self, flags='', filename=''):
         """Run a given python file using ipython's %run magic.
@@ -291,49 +596,686 @@ class JupyterVimSession():
 
         .. note:: vim command `:JupyterSendCell`.
         """
-        # Get line and buffer and cellseparators
+        # Get line and buffer and cell bounds
         cur_buf = vim.current.buffer
         cur_line = vim.current.window.cursor[0] - 1
+        upper_bound, lower_bound = self.cell_index().cell_bounds(cur_line, len(cur_buf))
+
+        # Execute cell
+        lines = "\n".join(cur_buf[upper_bound:lower_bound+1])
+        msg_id = self.kernel_client.execute(lines, allow_stdin=False)
+        prompt = "execute lines {:d}-{:d} ".format(upper_bound+1, lower_bound+1)
+        return (prompt, msg_id)
+
+    @if_connected
+    def run_cells(self, above=False):
+        """Run the cells of the buffer as a batch, without blocking vim.
+
+        Each cell is its own execute_request, all are sent back-to-back. After
+        an error, the kernel aborts the cells below. Each cell is reported as
+        soon as it completes.
+
+        .. note:: vim commands `:JupyterSendAllCells`, `:JupyterSendCellsAbove`.
+
+        Parameters
+        ----------
+        above : bool, optional, default=False
+            Only run the cells above the current one.
+        """
+        cur_buf = vim.current.buffer
+        index = self.cell_index()
+        stop = None
+        if above:
+            cur_line = vim.current.window.cursor[0] - 1
+            stop = index.cell_bounds(cur_line, len(cur_buf))[0]
+
+        batch = list()
+        for upper_bound, lower_bound in index.cells(len(cur_buf), stop):
+            lines = "\n".join(cur_buf[upper_bound:lower_bound+1])
+            if not lines.strip():
+                continue
+            prompt = "lines {:d}-{:d} ".format(upper_bound+1, lower_bound+1)
+            batch.append((prompt, lines))
+
+        if not batch:
+            echom('No cell to run.', style='WarningMsg')
+            return None
+        self.batch = self.kernel_client.run_batch(batch)
+        return self.batch
+
+    # -----------------------------------------------------------------------------
+    #        Cells
+    # -----------------------------------------------------------------------------
+    def cell_index(self, buf=None):
+        """Get the cell index of a buffer, up to date with its changes.
+
+        Parameters
+        ----------
+        buf : :obj:`vim.Buffer`, optional, default=None
+            The buffer, by default the current one.
 
-        cell_separators = get_vim('g:jupyter_cell_separators', '')
-        cell_separators = [unquote_string(x) for x in cell_separators]
+        Returns
+        -------
+        :obj:`CellIndex`
+            The line numbers of the cell separators of the buffer.
+        """
+        buf = buf or vim.current.buffer
+        state = vim.eval(f'jupyter#cell#Changes({buf.number})')
+        separators = get_vim('g:jupyter_cell_separators', [])
+        source, index = self.cell_indexes.get(buf.number, (None, None))
+
+        # Compile the separators only when they change
+        if index is None or source != separators:
+            index = CellIndex([unquote_string(x) for x in separators])
+            index.rebuild(buf[:])
+        # Only look at the changed lines
+        elif isinstance(state['changes'], list):
+            index.update(buf, [tuple(map(int, change)) for change in state['changes']])
+        # Changes unknown (vim without listener_add())
+        elif int(state['tick']) != index.changedtick:
+            index.rebuild(buf[:])
+
+        index.changedtick = int(state['tick'])
+        self.cell_indexes[buf.number] = (separators, index)
+        return index
 
-        def is_cell_separator(line):
-            """Check if given line is a cell separator."""
-            for separation in cell_separators:
-                if re.match(separation, line):
-                    return True
-            return False
+    def cell_bounds(self, inner=True):
+        """Get the first and last lines (0-based) of the current cell.
 
-        # Search upwards for cell separator
-        upper_bound = cur_line
-        while upper_bound > 0 and not is_cell_separator(cur_buf[upper_bound]):
+        .. note:: vim text objects `ij` and `aj`.
+
+        Parameters
+        ----------
+        inner : bool, optional, default=True
+            Whether to exclude the separator line above the cell.
+        """
+        cur_buf = vim.current.buffer
+        cur_line = vim.current.window.cursor[0] - 1
+        index = self.cell_index()
+        upper_bound, lower_bound = index.cell_bounds(cur_line, len(cur_buf))
+        if not inner and upper_bound > 0 and index.is_separator(cur_buf[upper_bound-1]):
             upper_bound -= 1
+        return (upper_bound, lower_bound)
 
-        # Skip past the first cell separator if it exists
-        if is_cell_separator(cur_buf[upper_bound]):
-            upper_bound += 1
+    def jump_cell(self, count=1):
+        """Move the cursor to the first line of the `count`-th next cell.
 
-        # Search downwards for cell separator
-        lower_bound = min(upper_bound+1, len(cur_buf)-1)
+        .. note:: vim commands `:JupyterNextCell`, `:JupyterPrevCell`.
 
-        while lower_bound < len(cur_buf)-1 and \
-                not is_cell_separator(cur_buf[lower_bound]):
-            lower_bound += 1
+        Parameters
+        ----------
+        count : int, optional, default=1
+            Number of cells to move down, up if negative.
+        """
+        cur_line = vim.current.window.cursor[0] - 1
+        target = self.cell_index().next_cell(cur_line, count, len(vim.current.buffer))
+        vim.command("normal! m'")
+        vim.current.window.cursor = (target + 1, 0)
 
-        # Move before the last cell separator if it exists
-        if is_cell_separator(cur_buf[lower_bound]):
-            lower_bound -= 1
 
-        # Make sure bounds are within buffer limits
-        upper_bound = max(0, min(upper_bound, len(cur_buf)-1))
-        lower_bound = max(0, min(lower_bound, len(cur_buf)-1))
+class SessionRegistry():
+    """The sessions of the kernels vim is connected to, by kernel id.
 
-        # Make sure of proper ordering of bounds
-        lower_bound = max(upper_bound, lower_bound)
+    Each buffer is bound to a session by `b:jupyter_session`, the id of its
+    kernel, set by `:JupyterConnect`. The buffers not bound go to the last
+    kernel connected. All sessions share one background thread, its zmq
+    context and its :obj:`VimWaker`.
 
-        # Execute cell
-        lines = "\n".join(cur_buf[upper_bound:lower_bound+1])
-        msg_id = self.kernel_client.execute(lines, allow_stdin=False)
-        prompt = "execute lines {:d}-{:d} ".format(upper_bound+1, lower_bound+1)
-        return (prompt, msg_id)
+    .. note:: vim global `_jupyter_sessions`.
+
+    Attributes
+    ----------
+    sessions : dict
+        :obj:`JupyterVimSession` of each kernel id.
+    default : str or None
+        Id of the kernel of the buffers not bound, the last connected.
+    cell_indexes : dict
+        Cell indexes of the buffers, shared by the sessions.
+    fanout : :obj:`concurrent.futures.Future`
+        The last code run on several kernels, resolves to the
+        (kernel_id, msg_id, status, seconds) of each.
+    pool : :obj:`KernelPool`
+        Kernels started ahead of time for `:JupyterStart`, created on first use.
+    owned : dict
+        :obj:`AsyncKernelManager` of the kernels started by `:JupyterStart`,
+        by kernel id: they are shut down with their session.
+    discovery : :obj:`KernelDiscovery`
+        The live kernels of the runtime directory, created on first use.
+    """
+    def __init__(self):
+        self.sessions = dict()
+        self.default = None
+        self.cell_indexes = dict()
+        self.fanout = None
+        self.owned = dict()
+        self.started = Queue()  # Kernels started, to connect from vim's thread
+        self._kernel_thread = None
+        self._pool = None
+        self._discovery = None
+        # For the buffers without kernel, i.e. the cell commands
+        self.unbound = JupyterVimSession(cell_indexes=self.cell_indexes)
+
+    @property
+    def kernel_thread(self):
+        """The background thread shared by the sessions, created on first use."""
+        if self._kernel_thread is None:
+            from jupyter_messenger import KernelThread  # pylint: disable=import-outside-toplevel
+            self._kernel_thread = KernelThread()
+        return self._kernel_thread
+
+    @property
+    def pool(self):
+        """The pool of kernels, started on first use, see :meth:`start_pool`."""
+        if self._pool is None:
+            self.start_pool()
+        return self._pool
+
+    def start_pool(self):
+        """Start the kernels of the pool to `g:jupyter_pool` sizes, if not done yet.
+
+        .. note:: called by `jupyter#StartPool()`.
+        """
+        if self._pool is not None:
+            return
+        from kernel_pool import KernelPool  # pylint: disable=import-outside-toplevel
+        self._pool = KernelPool(self.kernel_thread, get_vim('g:jupyter_pool', {}))
+        self._pool.fill()
+        # Kernels started here die with vim
+        vim.command('augroup JupyterPool')
+        vim.command('autocmd!')
+        vim.command('autocmd VimLeavePre * python3 _jupyter_sessions.shutdown_kernels()')
+        vim.command('augroup END')
+
+    @property
+    def discovery(self):
+        """The cache of the live kernels, created on first use."""
+        if self._discovery is None:
+            from kernel_discovery import KernelDiscovery  # pylint: disable=import-outside-toplevel
+            self._discovery = KernelDiscovery()
+        return self._discovery
+
+    def list_kernels(self):
+        """Echo the live kernels: id, kernelspec, pid, age, and if connected.
+
+        .. note:: vim command `:JupyterKernels`.
+        """
+        from kernel_discovery import format_age  # pylint: disable=import-outside-toplevel
+        kernels = self.discovery.kernels(refresh=True)
+        if not kernels:
+            echom(f'No kernel running in {self.discovery.runtime_dir}', style='WarningMsg')
+            return
+        now = time.time()
+        for kernel_file in kernels:
+            session = self.sessions.get(kernel_file.kernel_id)
+            echom('{:>3s} {:<40s} {:<12s} pid {:<8s} up {}'.format(
+                '*' if session is not None and session.connected else '',
+                kernel_file.kernel_id, kernel_file.kernel_name or '?',
+                str(kernel_file.pid or '?'), format_age(now - kernel_file.mtime)))
+
+    def current(self):
+        """Get the session of the current buffer.
+
+        Returns
+        -------
+        :obj:`JupyterVimSession`
+            The session of `b:jupyter_session`, or of the last kernel connected
+            if not set. Not connected if that kernel was disconnected.
+        """
+        kernel_id = vim.current.buffer.vars.get('jupyter_session', self.default)
+        return self.sessions.get(str_to_py(kernel_id), self.unbound)
+
+    @staticmethod
+    def invalidate_exec_hooks(bufnr=0):
+        """Drop the snapshot of the `b:jupyter_exec_*` of a buffer, all if 0.
+
+        .. note:: called by `jupyter#ExecHooksChanged()`.
+        """
+        exec_hooks.invalidate(bufnr)
+
+    def status(self):
+        """Get the kernel and connection state of the current buffer.
+
+        .. note:: called by `jupyter#Status()`, in the statusline.
+
+        Returns
+        -------
+        str
+            i.e. `24536 idle`, '' if not connected.
+        """
+        kernel_id = vim.current.buffer.vars.get('jupyter_session', self.default)
+        session = self.sessions.get(str_to_py(kernel_id))
+        if session is None:
+            return ''
+        return f'{str_to_py(kernel_id)} {session.kernel_client.state}'
+
+    def connect(self, kernel_type, filename='kernel-*.json', buf=None):
+        """Connect to a kernel and bind the current buffer to its session.
+
+        .. note:: vim command `:JupyterConnect`
+
+        Parameters
+        ----------
+        kernel_type : str
+            Type of kernel, i.e. `python3` with which to connect.
+        filename : str, optional, default='kernel-*.json'
+            Connection filename or kernel id, with wildcards.
+        buf : :obj:`vim.Buffer`, optional, default=None
+            The buffer to bind, by default the current one.
+
+        Returns
+        -------
+        str or None
+            Id of the kernel, None if not found.
+        """
+        # Slow to import: only when connecting
+        from jupyter_client import find_connection_file  # pylint: disable=import-outside-toplevel
+        try:
+            filename = find_connection_file(filename)
+        except OSError as err:
+            echom(f'Cannot connect to {filename}: {err}', style='Error')
+            return None
+        kernel_id = match_kernel_id(filename) or splitext(basename(filename))[0]
+
+        # Reconnect from scratch to a kernel lost
+        session = self.sessions.get(kernel_id)
+        if session is not None and not session.connected:
+            session.kernel_client.close()
+            session = None
+        if session is None:
+            session = JupyterVimSession(kernel_id, self.kernel_thread, self.cell_indexes)
+            session.connect_to_kernel(kernel_type, filename)
+            self.sessions[kernel_id] = session
+        else:
+            echom(f'Already connected to kernel {kernel_id}.', style='WarningMsg')
+
+        (buf or vim.current.buffer).vars['jupyter_session'] = kernel_id
+        self.default = kernel_id
+        return kernel_id
+
+    def start_kernel(self, kernel_type, kernel_name=''):
+        """Start a local kernel and bind the current buffer to it.
+
+        An idle kernel of the pool is connected at once. If none, a kernel is
+        started in the background and connected once ready.
+
+        .. note:: vim command `:JupyterStart`
+
+        Parameters
+        ----------
+        kernel_type : str
+            Type of kernel, i.e. `python`.
+        kernel_name : str, optional, default=''
+            Name of the kernelspec, guessed from `kernel_type` if empty.
+        """
+        # pylint: disable=import-outside-toplevel
+        from kernel_pool import kernel_name_of
+        kernel_name = kernel_name or kernel_name_of(kernel_type)
+        kernel_manager = self.pool.take(kernel_name)
+        if kernel_manager is not None:
+            self._connect_started(kernel_type, kernel_manager, vim.current.buffer)
+            return
+
+        echom(f'Starting a {kernel_name} kernel...', style='Question')
+        for error in self.pool.errors:
+            echom(f'Kernel pool: {error}', style='WarningMsg')
+        self.pool.errors.clear()
+        buf_number = vim.current.buffer.number
+        waker = self.kernel_thread.waker
+        waker.start()
+
+        def ready(future):
+            self.started.put((buf_number, kernel_type, kernel_name, future))
+            waker.wake()
+        self.pool.start(kernel_name).add_done_callback(ready)
+
+    def _connect_started(self, kernel_type, kernel_manager, buf):
+        """Connect `buf` to a kernel started here, owned by its session."""
+        kernel_id = self.connect(kernel_type, kernel_manager.connection_file, buf)
+        if kernel_id is None:
+            self.pool.shutdown([kernel_manager], wait=False)
+        else:
+            self.owned[kernel_id] = kernel_manager
+
+    def connect_started(self):
+        """Connect the kernels started in the background, once ready."""
+        while not self.started.empty():
+            buf_number, kernel_type, kernel_name, future = self.started.get_nowait()
+            if future.cancelled() or future.exception() is not None:
+                echom(f'Cannot start a {kernel_name} kernel: '
+                      f'{None if future.cancelled() else future.exception()}', style='Error')
+                continue
+            buf = vim.buffers[buf_number] if buf_number in vim.buffers else vim.current.buffer
+            self._connect_started(kernel_type, future.result(), buf)
+
+    def shutdown_kernels(self):
+        """Shut down the kernels started here, idle or connected.
+
+        .. note:: called when vim exits.
+        """
+        if self._pool is None:
+            return
+        self._pool.shutdown()
+        self._pool.shutdown(list(self.owned.values()))
+        self.owned = dict()
+
+    def disconnect(self):
+        """Disconnect the kernel of the current buffer.
+
+        The background thread stops with the last session, unless there
+        is a pool of kernels. A kernel started by `:JupyterStart` is shut down.
+
+        .. note:: vim command `:JupyterDisconnect`.
+        """
+        session = self.current()
+        session.disconnect_from_kernel()
+        self.sessions.pop(session.kernel_id, None)
+        if session.kernel_id in self.owned:
+            # Not waiting for it: vim would freeze meanwhile
+            self.pool.shutdown([self.owned.pop(session.kernel_id)], wait=False)
+        if self.default == session.kernel_id:
+            self.default = next(reversed(self.sessions), None)
+        # The pool lives in the thread
+        if not self.sessions and self._kernel_thread is not None and self._pool is None:
+            self._kernel_thread.stop()
+
+    def start_monitor(self, args=()):
+        """Open the monitor buffer on the kernel of the current buffer.
+
+        There is one monitor buffer: the monitors of the other kernels stop.
+
+        .. note:: vim command `:JupyterStartMonitor`.
+        """
+        session = self.current()
+        for other in self.sessions.values():
+            if other is not session:
+                other.stop_monitor(wipeout_buffer=False)
+        session.start_monitor(args)
+
+    def stop_monitor(self, wipeout_buffer=True):
+        """Stop the monitor, whatever its kernel.
+
+        .. note:: vim command `:JupyterStopMonitor`.
+        """
+        monitors = [session for session in self.sessions.values() if session.monitor]
+        for session in monitors:
+            session.stop_monitor(wipeout_buffer=False)
+        if monitors and wipeout_buffer:
+            vim.command('bwipeout __jupyter_monitor__')
+
+    def show(self, expr):
+        """Show a value of the kernel of the current buffer in the view buffer.
+
+        There is one view buffer: it shows the last value asked, whatever its
+        kernel.
+
+        .. note:: vim command `:JupyterShow`.
+        """
+        session = self.current()
+        for other in self.sessions.values():
+            if other is not session:
+                other.close_view()
+        session.show(expr)
+
+    def fetch(self, expr):
+        """Page a value of the kernel of the current buffer in the view buffer.
+
+        .. note:: vim command `:JupyterFetch`.
+        """
+        session = self.current()
+        for other in self.sessions.values():
+            if other is not session:
+                other.close_view()
+        session.fetch(expr)
+
+    def view_more(self):
+        """Append the next page to the view buffer.
+
+        .. note:: called by `jupyter#view#More()`.
+        """
+        for session in self.sessions.values():
+            if session.view:
+                session.view.more()
+
+    def view_close(self):
+        """Release the text of the view buffer, wiped out."""
+        for session in self.sessions.values():
+            session.close_view()
+
+    def start_variables(self):
+        """List the variables of the kernel of the current buffer in the sidebar.
+
+        There is one sidebar: the variables of the other kernels are no longer
+        refreshed.
+
+        .. note:: vim command `:JupyterVariables`.
+        """
+        session = self.current()
+        for other in self.sessions.values():
+            if other is not session:
+                other.stop_variables(wipeout_buffer=False)
+        session.start_variables()
+
+    def stop_variables(self):
+        """Stop refreshing the sidebar of the variables, wiped out."""
+        for session in self.sessions.values():
+            session.stop_variables(wipeout_buffer=False)
+
+    def show_variables(self):
+        """Write the rows of the sidebar that scrolled into view.
+
+        .. note:: called by the autocmds of `jupyter#variables#Open()`, while
+                  some rows are dirty.
+        """
+        for session in self.sessions.values():
+            session.show_variables()
+
+    def fan_out(self, code, kernel_ids=(), shard=False, command='fan_out'):
+        """Execute `code` on several kernels at once, without blocking vim.
+
+        The execute_requests are sent together from the shared thread and the
+        replies gathered: each kernel is reported with its status and time.
+
+        Parameters
+        ----------
+        code : str
+            The code to execute.
+        kernel_ids : list of str, optional, default=()
+            The kernels, all those connected if empty.
+        shard : bool, optional, default=False
+            Replace `{shard}` in the code by the index of each kernel, from 0
+            in the order of `kernel_ids` (or of connection), and `{nshards}`
+            by their number.
+        command : str, optional, default='fan_out'
+            Name of the requests in the statistics, see :meth:`show_stats`.
+
+        Returns
+        -------
+        :obj:`concurrent.futures.Future` or None
+            See :attr:`fanout`, None if no kernel to run on.
+        """
+        origin = (command, time.monotonic())
+        unknown = [kernel_id for kernel_id in kernel_ids if kernel_id not in self.sessions]
+        if unknown:
+            echom(f'Unknown kernels: {", ".join(unknown)}', style='Error')
+            return None
+        sessions = [self.sessions[kernel_id] for kernel_id in kernel_ids] \
+            if kernel_ids else list(self.sessions.values())
+        sessions = [session for session in sessions if session.connected]
+
+        # The bridges run their own loop
+        bridged = [session.kernel_id for session in sessions if session.bridged]
+        if bridged:
+            echom(f'Skipped with g:jupyter_bridge: {", ".join(bridged)}', style='WarningMsg')
+            sessions = [session for session in sessions if not session.bridged]
+        if not sessions:
+            echom('No kernel connected.', style='Error')
+            return None
+
+        clients = list()
+        for i_shard, session in enumerate(sessions):
+            session_code = code
+            if shard:
+                session_code = code.replace('{shard}', str(i_shard)) \
+                                   .replace('{nshards}', str(len(sessions)))
+            clients.append((session.kernel_id, session.kernel_client, session_code))
+
+        from jupyter_messenger import fan_out  # pylint: disable=import-outside-toplevel
+        self.fanout = fan_out(self.kernel_thread.loop, clients,
+                              sessions[0].kernel_client.get_exec_hooks(), origin)
+        return self.fanout
+
+    def send_cell_all(self, kernel_ids=(), shard=False):
+        """Run the current cell on several kernels, see :meth:`fan_out`.
+
+        .. note:: vim command `:JupyterSendCellAll`.
+        """
+        cur_buf = vim.current.buffer
+        cur_line = vim.current.window.cursor[0] - 1
+        upper_bound, lower_bound = self.current().cell_index().cell_bounds(cur_line, len(cur_buf))
+        return self.fan_out("\n".join(cur_buf[upper_bound:lower_bound+1]), kernel_ids, shard,
+                            command='send_cell_all')
+
+    def send_range_all(self, kernel_ids=(), shard=False):
+        """Run a range of lines on several kernels, see :meth:`fan_out`.
+
+        .. note:: vim command `:JupyterSendRangeAll`.
+        """
+        rang = vim.current.range
+        return self.fan_out("\n".join(vim.current.buffer[rang.start:rang.end+1]),
+                            kernel_ids, shard, command='send_range_all')
+
+    def stats(self):
+        """Summarize the timings of the requests, per command and phase.
+
+        .. note:: for `py3eval('_jupyter_sessions.stats()')`
+
+        Returns
+        -------
+        dict
+            {command: {phase: summary}}, see :meth:`RequestStats.summary`.
+        """
+        return self.kernel_thread.stats.summary()
+
+    def show_stats(self, filename='', reset=False):
+        """Display the timings of the requests, optionally export them.
+
+        .. note:: vim command `:JupyterStats`.
+
+        Parameters
+        ----------
+        filename : str, optional, default=''
+            Write all the histograms in this json file.
+        reset : bool, optional, default=False
+            Forget the histograms after.
+        """
+        stats = self.kernel_thread.stats
+        if not stats.histograms:
+            echom('No request timed yet.', style='WarningMsg')
+        else:
+            for line in stats.format():
+                echom(line)
+        if filename:
+            stats.export(filename)
+            echom(f'Stats written to {filename}', style='Question')
+        if reset:
+            stats.reset()
+
+    def trace_start(self, size=0, keep=False):
+        """Record the messages received from the kernels, see :obj:`TraceRecorder`.
+
+        .. note:: vim command `:JupyterTraceStart`.
+
+        Parameters
+        ----------
+        size : int, optional, default=0
+            Messages kept at most, the last ones. As the last recording if 0.
+        keep : bool, optional, default=False
+            Keep the messages themselves too, for :meth:`trace_save`.
+        """
+        trace = self.kernel_thread.trace
+        try:
+            trace.start(int(size), keep)
+        except ValueError as err:
+            echom(f'JupyterTraceStart: {err}', style='Error')
+            return
+        echom(f'Tracing the kernel messages, the last {trace.size:d} kept.', style='Question')
+        if any(session.bridged for session in self.sessions.values()):
+            echom('Not traced with g:jupyter_bridge.', style='WarningMsg')
+
+    def trace_stop(self, filename=''):
+        """Stop recording and write the trace, for https://ui.perfetto.dev.
+
+        .. note:: vim command `:JupyterTraceStop`.
+
+        Parameters
+        ----------
+        filename : str, optional, default=''
+            The json file, `jupyter-trace-<date>.json` if empty.
+        """
+        trace = self.kernel_thread.trace
+        if not trace.active:
+            echom('Not tracing, see :JupyterTraceStart.', style='WarningMsg')
+            return
+        trace.stop()
+        filename = filename or time.strftime('jupyter-trace-%Y%m%d-%H%M%S.json')
+        names = {session.kernel_client: session.kernel_id
+                 for session in self.sessions.values() if not session.bridged}
+        count = trace.export(filename, lambda client: names.get(client, '?'))
+        dropped = f', {trace.count - count:d} older dropped' if trace.count > count else ''
+        echom(f'{count:d} messages traced to {filename}{dropped}', style='Question')
+
+    def trace_save(self, filename):
+        """Save the messages of the last recording, for replay_kernel.py.
+
+        .. note:: vim command `:JupyterTraceSave`.
+
+        Parameters
+        ----------
+        filename : str
+            The recording, gzipped json lines, i.e. `session.jsonl.gz`.
+        """
+        trace = self.kernel_thread.trace
+        if not trace.keep:
+            echom('No message kept, see :JupyterTraceStart!', style='WarningMsg')
+            return
+        count = trace.save(filename)
+        echom(f'{count:d} requests saved to {filename}', style='Question')
+
+    def on_bridge_event(self, kernel_id, event):
+        """Pass an event of the bridge of `kernel_id` to its client.
+
+        .. note:: called by the channel callback `jupyter#bridge#OnEvent`.
+        """
+        session = self.sessions.get(kernel_id)
+        if session is not None and session.bridged:
+            session.kernel_client.on_event(event)
+
+    def drain(self):
+        """Display what the kernel thread queued, for all sessions.
+
+        .. note:: called by vim when the kernel thread wakes it up, see
+                  :obj:`VimWaker`, or by its polling timer.
+        """
+        waker = self.kernel_thread.waker
+        waker.begin_drain()
+
+        self.connect_started()
+        arrivals = [arrival for session in self.sessions.values()
+                    for arrival in session.drain()]
+
+        # The statusline shows the connection state
+        changed = False
+        for session in self.sessions.values():
+            client = session.kernel_client
+            if getattr(client, 'state_changed', False):
+                client.state_changed = False
+                changed = True
+        if changed:
+            vim.command('redrawstatus!')
+
+        # Latency of the oldest message, once on screen
+        if arrivals:
+            vim.command('redraw')
+            waker.record(min(arrivals))
+        self.kernel_thread.stats.render()
+        waker.rearm()
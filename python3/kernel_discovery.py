@@ -0,0 +1,249 @@
+"""
+Find the kernels running on this machine, for `:JupyterConnect` completion.
+
+The connection files of the jupyter runtime directory are parsed once, then
+again only if their mtime changes, those that fail to parse too. Kernels
+that died leave their file behind: every kernel is sent a heartbeat ping,
+all at once, and only those answering within `timeout` are kept. A kernel
+that did not answer is not probed again, unless its file is younger than
+`boot_time` (it may still be starting). The result is reused for `ttl`
+seconds unless the directory changes, so that completing is instant while
+typing.
+
+.. note:: vim thread only.
+"""
+
+# Standard
+import json
+import os
+import sys
+import time
+
+# Local
+from jupyter_util import match_kernel_id
+
+# Export only
+__all__ = ['KernelDiscovery', 'KernelFile', 'format_age']
+
+
+class KernelFile():
+    """A kernel connection file of the runtime directory.
+
+    Attributes
+    ----------
+    path : str
+        Full path of the file.
+    kernel_id : str
+        i.e. `24536` for `kernel-24536.json`.
+    mtime : float
+        Modification time of the file, when the kernel started.
+    info : dict
+        The content of the file: ports, ip, transport, kernel_name...
+    pid : int or None
+        The process of the kernel if found (Linux).
+    alive : bool
+        Whether the kernel answered the last heartbeat ping.
+    probed : bool
+        Whether the kernel was sent a heartbeat ping yet.
+    """
+    def __init__(self, path, mtime, info):
+        self.path = path
+        self.kernel_id = match_kernel_id(path) or os.path.splitext(os.path.basename(path))[0]
+        self.mtime = mtime
+        self.info = info
+        self.pid = None
+        self.alive = False
+        self.probed = False
+
+    @property
+    def kernel_name(self):
+        """The kernelspec name, i.e. `python3`, '' if unknown."""
+        return self.info.get('kernel_name', '')
+
+    @property
+    def hb_address(self):
+        """The zmq address of the heartbeat channel."""
+        transport = self.info.get('transport', 'tcp')
+        if transport == 'ipc':
+            return f'ipc://{self.info["ip"]}-{self.info["hb_port"]}'
+        return f'{transport}://{self.info["ip"]}:{self.info["hb_port"]}'
+
+
+def format_age(seconds):
+    """Format a duration shortly: 42s, 5m, 3h, 2d."""
+    for unit, length in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= length:
+            return f'{int(seconds // length)}{unit}'
+    return f'{int(seconds)}s'
+
+
+def find_pids(kernel_files):
+    """Set the pid of the kernels whose command line names their file (Linux)."""
+    if not sys.platform.startswith('linux'):
+        return
+    by_name = {os.path.basename(kernel_file.path): kernel_file for kernel_file in kernel_files}
+    for entry in os.scandir('/proc'):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry.name}/cmdline', 'rb') as f_cmd:
+                args = f_cmd.read().decode(errors='replace').split('\0')
+        except OSError:
+            continue
+        for arg in args:
+            kernel_file = by_name.get(os.path.basename(arg))
+            if kernel_file is not None and kernel_file.pid is None:
+                kernel_file.pid = int(entry.name)
+
+
+class KernelDiscovery():
+    """Cache of the live kernels of the runtime directory.
+
+    Parameters
+    ----------
+    runtime_dir : str, optional, default=None
+        Directory of the connection files, `jupyter --runtime-dir` if None.
+    ttl : float, optional, default=5
+        Seconds the kernels found are reused, if the directory did not change.
+    timeout : float, optional, default=0.2
+        Seconds a kernel has to answer the heartbeat ping.
+    boot_time : float, optional, default=60
+        Seconds after which a kernel that did not answer is deemed dead.
+
+    Attributes
+    ----------
+    files : dict
+        :obj:`KernelFile` of each connection file, by path.
+    failed : dict
+        Modification time of each file that is not a connection file, by
+        path: not parsed again until it changes.
+    """
+    def __init__(self, runtime_dir=None, ttl=5, timeout=0.2, boot_time=60):
+        self._runtime_dir = runtime_dir
+        self.ttl = ttl
+        self.timeout = timeout
+        self.boot_time = boot_time
+        self.files = dict()
+        self.failed = dict()
+        self.checked = None     # Time of the last probe
+        self.dir_mtime = None
+
+    @property
+    def runtime_dir(self):
+        """The directory of the connection files."""
+        if self._runtime_dir is None:
+            # Slow to import: only when completing
+            from jupyter_core.paths import jupyter_runtime_dir  # pylint: disable=import-outside-toplevel
+            self._runtime_dir = jupyter_runtime_dir()
+        return self._runtime_dir
+
+    def scan(self):
+        """Update the connection files, only parsing the new or changed ones."""
+        found = dict()
+        failed = dict()
+        try:
+            entries = list(os.scandir(self.runtime_dir))
+        except OSError:
+            entries = list()
+        for entry in entries:
+            if not (entry.name.startswith('kernel') and entry.name.endswith('.json')):
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+            except OSError:
+                continue
+            if self.failed.get(entry.path) == mtime:
+                failed[entry.path] = mtime
+                continue
+            kernel_file = self.files.get(entry.path)
+            if kernel_file is None or kernel_file.mtime != mtime:
+                try:
+                    with open(entry.path, encoding='utf-8') as f_json:
+                        info = json.load(f_json)
+                except (OSError, ValueError):
+                    info = dict()
+                if not isinstance(info, dict) or 'hb_port' not in info or 'ip' not in info:
+                    failed[entry.path] = mtime
+                    continue
+                kernel_file = KernelFile(entry.path, mtime, info)
+            found[entry.path] = kernel_file
+        self.files = found
+        self.failed = failed
+
+    def probe(self, kernel_files):
+        """Send a heartbeat ping to all kernels at once, set their `alive`."""
+        if not kernel_files:
+            return
+        # Slow to import: only when completing
+        import zmq  # pylint: disable=import-outside-toplevel
+
+        context = zmq.Context.instance()
+        poller = zmq.Poller()
+        sockets = dict()
+        for kernel_file in kernel_files:
+            kernel_file.alive = False
+            kernel_file.probed = True
+            sock = context.socket(zmq.REQ)
+            sock.setsockopt(zmq.LINGER, 0)
+            try:
+                sock.connect(kernel_file.hb_address)
+                sock.send(b'ping', zmq.NOBLOCK)
+            except zmq.ZMQError:
+                sock.close()
+                continue
+            poller.register(sock, zmq.POLLIN)
+            sockets[sock] = kernel_file
+
+        try:
+            deadline = time.monotonic() + self.timeout
+            waiting = len(sockets)
+            while waiting:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                for sock, _ in poller.poll(1000 * remaining):
+                    sock.recv()
+                    poller.unregister(sock)
+                    sockets[sock].alive = True
+                    waiting -= 1
+        finally:
+            for sock in sockets:
+                sock.close()
+
+    def kernels(self, refresh=False):
+        """Get the live kernels, newest first.
+
+        Parameters
+        ----------
+        refresh : bool, optional, default=False
+            Probe again even if the last probe is recent.
+
+        Returns
+        -------
+        list of :obj:`KernelFile`
+        """
+        try:
+            dir_mtime = os.stat(self.runtime_dir).st_mtime
+        except OSError:
+            dir_mtime = None
+        now = time.monotonic()
+        if refresh or self.checked is None or dir_mtime != self.dir_mtime \
+                or now - self.checked > self.ttl:
+            self.scan()
+            wall = time.time()
+            self.probe([kernel_file for kernel_file in self.files.values()
+                        if kernel_file.alive or not kernel_file.probed
+                        or wall - kernel_file.mtime < self.boot_time])
+            find_pids([kernel_file for kernel_file in self.files.values()
+                       if kernel_file.alive and kernel_file.pid is None])
+            self.checked = time.monotonic()
+            self.dir_mtime = dir_mtime
+        alive = [kernel_file for kernel_file in self.files.values() if kernel_file.alive]
+        return sorted(alive, key=lambda kernel_file: -kernel_file.mtime)
+
+    def kernel_ids(self):
+        """Get the ids of the live kernels, newest first.
+
+        .. note:: called by vim command completion.
+        """
+        return [kernel_file.kernel_id for kernel_file in self.kernels()]
@@ -0,0 +1,138 @@
+"""
+Local kernels started by jupyter-vim, ahead of time.
+
+`:JupyterStart` launches a kernel instead of connecting to one started by
+hand. A kernel takes seconds to boot: :obj:`KernelPool` keeps some started and
+ready for each kernelspec (`g:jupyter_pool`), so that one is taken at once
+and a new one is started in the background to replace it.
+
+.. note:: The kernels start in the loop of :obj:`KernelThread`, the pool is
+          used from vim's thread.
+"""
+
+# Standard
+import asyncio
+import collections
+from threading import Lock
+
+# Local
+from jupyter_messenger import start_kernel
+
+# Export only
+__all__ = ['KernelPool', 'kernel_name_of']
+
+
+def kernel_name_of(kernel_type):
+    """Get the default kernelspec name of a kernel type: 'python' -> 'python3'."""
+    return {'python': 'python3'}.get(kernel_type, kernel_type)
+
+
+class KernelPool():
+    """Kernels started and idle, by kernelspec name.
+
+    Parameters
+    ----------
+    kernel_thread : :obj:`KernelThread`
+        The thread starting the kernels.
+    sizes : dict, optional, default=None
+        Number of idle kernels to keep for each kernelspec name.
+    timeout : float, optional, default=60
+        Seconds to wait for a kernel to answer once started.
+
+    Attributes
+    ----------
+    idle : dict
+        :obj:`collections.deque` of the :obj:`AsyncKernelManager` of the idle
+        kernels, by kernelspec name.
+    errors : list of str
+        Why the last kernels could not be started in the background.
+    """
+    def __init__(self, kernel_thread, sizes=None, timeout=60):
+        self.kernel_thread = kernel_thread
+        self.sizes = {name: int(size) for name, size in (sizes or {}).items()}
+        self.timeout = timeout
+        self.idle = collections.defaultdict(collections.deque)
+        self.starting = collections.Counter()
+        self.errors = list()
+        self.lock = Lock()
+
+    def start(self, kernel_name):
+        """Start a kernel now, not from the pool.
+
+        Returns
+        -------
+        :obj:`concurrent.futures.Future`
+            Resolves to the :obj:`AsyncKernelManager` of the kernel, ready.
+        """
+        self.kernel_thread.start()
+        return asyncio.run_coroutine_threadsafe(
+            start_kernel(kernel_name, self.kernel_thread.context, self.timeout),
+            self.kernel_thread.loop)
+
+    def take(self, kernel_name):
+        """Take an idle kernel, then refill the pool in the background.
+
+        Returns
+        -------
+        :obj:`AsyncKernelManager` or None
+            Manager of the kernel, None if none is idle.
+        """
+        with self.lock:
+            idle = self.idle[kernel_name]
+            kernel_manager = idle.popleft() if idle else None
+        self.fill()
+        return kernel_manager
+
+    def fill(self):
+        """Start kernels in the background up to the size of each pool."""
+        for name, size in self.sizes.items():
+            with self.lock:
+                missing = size - len(self.idle[name]) - self.starting[name]
+                self.starting[name] += max(0, missing)
+            for _ in range(missing):
+                self.start(name).add_done_callback(
+                    lambda future, name=name: self._started(name, future))
+
+    def _started(self, name, future):
+        """Put a kernel started in the background in the pool (any thread)."""
+        with self.lock:
+            self.starting[name] -= 1
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self.errors.append(f'{name}: {future.exception()}')
+                return
+            if self.sizes.get(name, 0) > 0:
+                self.idle[name].append(future.result())
+                return
+        # Pool closed meanwhile
+        self.shutdown([future.result()], wait=False)
+
+    def shutdown(self, kernel_managers=None, wait=True):
+        """Shut kernels down: the idle ones if None, and stop refilling.
+
+        Parameters
+        ----------
+        kernel_managers : list of :obj:`AsyncKernelManager`, optional, default=None
+            The kernels to shut down.
+        wait : bool, optional, default=True
+            Wait for the kernels to exit (vim thread).
+        """
+        if kernel_managers is None:
+            with self.lock:
+                self.sizes = dict()
+                kernel_managers = [km for idle in self.idle.values() for km in idle]
+                self.idle.clear()
+        if not kernel_managers or not self.kernel_thread.running():
+            return
+
+        async def shutdown_all():
+            await asyncio.gather(*(km.shutdown_kernel() for km in kernel_managers),
+                                 return_exceptions=True)
+
+        future = asyncio.run_coroutine_threadsafe(shutdown_all(), self.kernel_thread.loop)
+        if wait:
+            try:
+                future.result(10)
+            except Exception:  # pylint: disable=broad-except
+                pass
@@ -4,6 +4,35 @@ Jupyter language interface for vim client:
 To add a language, please fill all the field.
 If it is hard, just put '-1', it will never complain.
 See cpp's way to run a file (defer work to python)
+
+`info` is sent once at connection: it must set `_res` to the string
+"pid;hostname;cwd" (the cwd last as it may contain a ';').
+
+`fold_before` joins `b:jupyter_exec_before` and the code in one request,
+if statements can simply follow each other. Not for code starting with
+`cell_magic`, the prefix of the magics that must be on the first line of the
+cell (`%%time`): `before` is then sent apart.
+
+`share` writes the text of the expression `{}` to a file of the kernel's
+host, in /dev/shm if possible, and sets `_res` to the string "path;size"
+(the path first, see `:JupyterShow`). The file then belongs to vim.
+
+`fetch` keeps an iterator on the lines of the text of the expression `{expr}`
+in the kernel, under the key `{token}`: `fetch_page` is the expression of its
+next `{count}` lines, the string "last;count;lines", `last` 1 if none left,
+the lines joined by newlines (see `:JupyterFetch`). The iterator is released
+after the last line, or by a count of 0. Several fetches can be open at once.
+
+`variables` defines the snapshot hook of `:JupyterVariables`, and
+`variables_diff` calls it: the json of {'changed': [[name, type, shape,
+size], ...], 'deleted': [name, ...]}, the variables changed since the last
+call, all of them the first time. Not a format string.
+
+`bind` registers the comm target `jupyter_vim` (not a format string): the
+`comm_open` of `:JupyterSendBufferAsVariable` carries the bytes to bind in its
+first buffer and {'name', 'encoding'} in its data, the target sets the
+variable, decoded if an encoding is given, and replies a `comm_msg`
+{'status': 'ok', 'size'} or {'status': 'error', 'ename', 'evalue'}.
 """
 # pylint: disable=too-few-public-methods
 
@@ -18,9 +47,15 @@ class Language:
     print_string = 'print("{}")'
     run_file = '-1'
     cd = 'cd "{}"'
-    pid = '-1'
-    cwd = '-1'
-    hostname = '-1'
+    info = '-1'
+    fold_before = '-1'
+    cell_magic = '-1'
+    share = '-1'
+    fetch = '-1'
+    fetch_page = '-1'
+    variables = '-1'
+    variables_diff = '-1'
+    bind = '-1'
 
 
 class Bash(Language):
@@ -29,13 +64,11 @@ class Bash(Language):
     print_string = 'echo -e "{}"'
     run_file = 'source "{}"'
     cd = 'cd "{}"'
-    pid = '_res=$$; echo $_res;'
-    cwd = '_res=$(pwd); echo $_res;'
-    hostname = '_res=$(hostname); echo $_res;'
+    info = '_res="$$;$(hostname);$(pwd)"; echo $_res;'
 
 
 class Cpp(Language):
-    """ Note :Pid is the first to run, so make import there
+    """ Note :Info is the first to run, so make import there
     I don't want to implement include so let it to -1,
         then python send file content
     """
@@ -44,17 +77,14 @@ class Cpp(Language):
     print_string = 'printf("%s", "{}");'
     run_file = '-1'
     cd = 'chdir("{}");'
-    pid = """
+    info = """
         #include <unistd.h>
         #include <stdio.h>
         #include <limits.h>
-        int _res_pid = getpid();
-        printf("%d", _res_pid);
+        char _res_hostname[HOST_NAME_MAX];
+        gethostname(_res_hostname, HOST_NAME_MAX);
+        printf("%d;%s;%s", getpid(), _res_hostname, get_current_dir_name());
         """
-    cwd = 'printf("%s", get_current_dir_name();'
-    hostname = ('char _res_hostname[HOST_NAME_MAX];'
-                ' gethostname(_res_hostname, HOST_NAME_MAX);'
-                ' printf("%s", _res_hostname);')
 
 
 class Java(Language):
@@ -79,10 +109,10 @@ class Java(Language):
             "------------------------------------------------------------");
     """
     cd = 'System.setProperty("user.dir", "{}");'
-    pid = 'String _res = String.valueOf(ProcessHandle.current().pid()); _res;'
-    cwd = ('String _res = new File(System.getProperty("user.dir"))'
-           '.getAbsoluteFile().getPath(); _res;')
-    hostname = 'String _res = InetAddress.getLocalHost().getHostName(); _res;'
+    info = ('String _res = ProcessHandle.current().pid()'
+            ' + ";" + InetAddress.getLocalHost().getHostName()'
+            ' + ";" + new File(System.getProperty("user.dir"))'
+            '.getAbsoluteFile().getPath(); _res;')
 
 
 class Javascript(Language):
@@ -91,9 +121,8 @@ class Javascript(Language):
     print_string = 'console.log("{}");'
     run_file = 'eval("" + require("fs").readFileSync("{}"));'
     cd = 'require("process").chdir("{}");'
-    pid = '_res = require("process").pid;'
-    cwd = '_res = require("process").cwd();'
-    hostname = '_res = require("os").userInfo().username;'
+    info = ('_res = [require("process").pid, require("os").hostname(),'
+            ' require("process").cwd()].join(";");')
 
 
 class Julia(Language):
@@ -102,9 +131,8 @@ class Julia(Language):
     print_string = 'println("{}")'
     run_file = 'include("{}")'
     cd = 'cd "{}"'
-    pid = '_res = getpid()'
-    cwd = '_res = pwd()'
-    hostname = '_res = gethostname()'
+    info = '_res = "$(getpid());$(gethostname());$(pwd())"'
+    fold_before = '{}\n{}'
 
 
 class Perl(Language):
@@ -113,9 +141,8 @@ class Perl(Language):
     print_string = 'print("{}")'
     run_file = 'my $_res = "{}"; $_res =~ s/\\.[^.]+$//; do $_res;'
     cd = 'chdir("{}")'
-    pid = '$_res = $$'
-    cwd = 'use Cwd; $_res = getcwd();'
-    hostname = 'use Sys::Hostname qw/hostname/; $_res = hostname();'
+    info = ('use Cwd; use Sys::Hostname qw/hostname/;'
+            ' $_res = "$$;" . hostname() . ";" . getcwd();')
 
 
 class Python(Language):
@@ -124,9 +151,131 @@ class Python(Language):
     print_string = 'print("{}")'
     run_file = '%run "{}"'
     cd = '%cd "{}"'
-    pid = 'import os; _res = os.getpid()'
-    cwd = 'import os; _res = os.getcwd()'
-    hostname = 'import socket; _res = socket.gethostname()'
+    info = ('import os, socket;'
+            ' _res = "%d;%s;%s" % (os.getpid(), socket.gethostname(), os.getcwd())')
+    fold_before = '{}\n{}'
+    cell_magic = '%%'
+    share = """
+        def _res_share(value):
+            import os, tempfile
+            if isinstance(value, str):
+                text = value
+            elif hasattr(value, 'to_string'):
+                text = value.to_string()
+            elif type(value).__module__ == 'numpy':
+                import numpy
+                text = numpy.array2string(value, threshold=value.size + 1)
+            else:
+                text = repr(value)
+            data = text.encode('utf-8', 'replace')
+            shm = '/dev/shm' if os.access('/dev/shm', os.W_OK) else None
+            fd, path = tempfile.mkstemp(prefix='jupyter-vim-', suffix='.txt', dir=shm)
+            with os.fdopen(fd, 'wb') as f_share:
+                f_share.write(data)
+            return '%s;%d' % (path, len(data))
+        _res = _res_share({})
+        del _res_share
+        """
+    fetch = """
+        def _jupyter_vim_lines(value):
+            if isinstance(value, str):
+                start = 0
+                while start < len(value):
+                    end = value.find('\\n', start)
+                    end = len(value) if end < 0 else end
+                    yield value[start:end]
+                    start = end + 1
+            elif hasattr(value, 'iloc') and hasattr(value, 'to_string'):
+                for start in range(0, len(value), 1000):
+                    yield from value.iloc[start:start + 1000].to_string(
+                        header=start == 0).split('\\n')
+            elif type(value).__module__ == 'numpy' and getattr(value, 'ndim', 0):
+                import numpy
+                for row in value:
+                    row = numpy.asarray(row)
+                    yield from numpy.array2string(
+                        row, threshold=row.size + 1, max_line_width=2**31).split('\\n')
+            elif isinstance(value, dict):
+                for key, item in value.items():
+                    yield '%r: %r' % (key, item)
+            elif isinstance(value, (list, tuple, set, frozenset, range)):
+                for item in value:
+                    yield repr(item)
+            else:
+                yield from repr(value).split('\\n')
+        # The iterators of the other fetches still open, by token
+        _jupyter_vim_pages = getattr(globals().get('_jupyter_vim_page'), 'lines', {{}})
+        def _jupyter_vim_page(token, count):
+            import itertools
+            pages = _jupyter_vim_page.lines
+            lines = list(itertools.islice(pages[token], count)) if count else []
+            if len(lines) < count or not count:
+                pages.pop(token, None)
+            return '%d;%d;%s' % (len(lines) < count or not count, len(lines),
+                                 '\\n'.join(lines))
+        _jupyter_vim_page.lines = _jupyter_vim_pages
+        _jupyter_vim_page.lines['{token}'] = _jupyter_vim_lines({expr})
+        del _jupyter_vim_lines, _jupyter_vim_pages
+        """
+    fetch_page = "_jupyter_vim_page('{token}', {count})"
+    variables = """
+        def _jupyter_vim_variables():
+            import json, sys, types
+            shell = get_ipython()
+            hidden = shell.user_ns_hidden
+            seen = _jupyter_vim_variables.seen
+            current = dict()
+            changed = list()
+            for name, value in list(shell.user_ns.items()):
+                if name.startswith('_') or name in hidden or isinstance(
+                        value, (types.ModuleType, types.FunctionType, type)):
+                    continue
+                shape = getattr(value, 'shape', None)
+                if not isinstance(shape, tuple):
+                    try:
+                        shape = (len(value),)
+                    except Exception:
+                        shape = ()
+                if hasattr(value, 'nbytes') and isinstance(value.nbytes, int):
+                    size = value.nbytes
+                elif hasattr(value, 'memory_usage'):
+                    size = int(value.memory_usage(index=True).sum())
+                else:
+                    size = sys.getsizeof(value)
+                # The row only changes with the object, its shape or its size:
+                # the size tells the changes in place, i.e. a column replaced
+                key = (id(value), shape, size)
+                current[name] = key
+                if seen.get(name) == key:
+                    continue
+                changed.append([name, type(value).__name__,
+                                'x'.join(str(n) for n in shape), size])
+            deleted = [name for name in seen if name not in current]
+            _jupyter_vim_variables.seen = current
+            return json.dumps(dict(changed=changed, deleted=deleted))
+        _jupyter_vim_variables.seen = dict()
+        """
+    variables_diff = '_jupyter_vim_variables()'
+    bind = """
+        def _jupyter_vim_bind(comm, msg):
+            import codecs
+            data = msg['content']['data']
+            try:
+                value = msg['buffers'][0]
+                value = codecs.decode(value, data['encoding']) if data['encoding'] \\
+                    else value.tobytes()
+                get_ipython().user_ns[data['name']] = value
+                comm.send({'status': 'ok', 'size': len(value)})
+            except Exception as err:
+                comm.send({'status': 'error', 'ename': type(err).__name__, 'evalue': str(err)})
+            comm.close()
+        try:
+            from comm import get_comm_manager
+        except ImportError:
+            get_comm_manager = lambda: get_ipython().kernel.comm_manager
+        get_comm_manager().register_target('jupyter_vim', _jupyter_vim_bind)
+        del _jupyter_vim_bind, get_comm_manager
+        """
 
 
 class Coconut(Language):
@@ -138,9 +287,16 @@ class Coconut(Language):
     print_string = 'print("{}")'
     run_file = '%run "{}"'
     cd = '%cd "{}"'
-    pid = 'import os; _res = os.getpid()'
-    cwd = 'import os; _res = os.getcwd()'
-    hostname = 'import socket; _res = socket.gethostname()'
+    info = ('import os, socket;'
+            ' _res = "%d;%s;%s" % (os.getpid(), socket.gethostname(), os.getcwd())')
+    fold_before = '{}\n{}'
+    cell_magic = '%%'
+    share = Python.share
+    fetch = Python.fetch
+    fetch_page = Python.fetch_page
+    variables = Python.variables
+    variables_diff = Python.variables_diff
+    bind = Python.bind
 
 
 # pylint: disable=C0103  # Class name "R" no PascalCase naming style
@@ -150,9 +306,8 @@ class R(Language):
     print_string = 'print("{}")'
     run_file = 'source("{}")'
     cd = 'setwd("{}")'
-    pid = 'Sys.getpid()'
-    cwd = 'getwd()'
-    hostname = 'Sys.info()[["nodename"]]'
+    info = 'cat(paste(Sys.getpid(), Sys.info()[["nodename"]], getwd(), sep = ";"))'
+    fold_before = '{}\n{}'
 
 
 class Raku(Language):
@@ -161,9 +316,7 @@ class Raku(Language):
     print_string = 'say("{}");'
     run_file = '#% run {}'
     cd = 'chdir("{}");'
-    pid = 'my $_res = $*PID;'
-    cwd = 'my $_res = $*CWD.Str;'
-    hostname = 'my $_res = $*KERNEL.hostname();'
+    info = 'my $_res = "$*PID;{$*KERNEL.hostname()};{$*CWD.Str}";'
 
 
 class Ruby(Language):
@@ -172,9 +325,7 @@ class Ruby(Language):
     print_string = 'print("{}")'
     run_file = 'load "{}"'
     cd = '_res = Dir.chdir "{}"'
-    pid = '_res = Process.pid'
-    cwd = '_res = Dir.pwd'
-    hostname = '_res = Socket.gethostname'
+    info = 'require "socket"; _res = "#{Process.pid};#{Socket.gethostname};#{Dir.pwd}"'
 
 
 class Rust(Language):
@@ -183,20 +334,22 @@ class Rust(Language):
     print_string = 'println!("{}");'
     run_file = '-1'
     cd = 'env::set_current_dir("{}");'
-    pid = 'use std::process; use std::env; let mut _res = process::id(); _res'
-    cwd = 'let mut _res = env::current_dir().unwrap(); _res'
-    hostname = (
+    info = (
         # Import
-        "use std::process::Command;\n"
+        "use std::process; use std::env; use std::process::Command;\n"
         # Get shell output (as vector)
         "let mut _res_status = Command::new(\"hostname\").output().expect(\"unknown\");\n"
         # Stringify
-        "let mut _res = match String::from_utf8(_res_status.stdout){\n"
+        "let mut _res_hostname = match String::from_utf8(_res_status.stdout){\n"
         "    Ok(f) => f,\n"
         "    Err(e) => String::from(\"unknown\")\n"
         "};\n"
         # Remove trailing newline
-        "while _res.ends_with('\\n') || _res.ends_with('\\r') { _res.pop(); };\n"
+        "while _res_hostname.ends_with('\\n') || _res_hostname.ends_with('\\r') "
+        "{ _res_hostname.pop(); };\n"
+        # Join
+        "let mut _res = format!(\"{};{};{}\", process::id(), _res_hostname,\n"
+        "    env::current_dir().unwrap().display());\n"
         # Send to stdout
         '_res'
         )
@@ -4,35 +4,136 @@ Feature to get a buffer with jupyter output
 
 # Standard
 import asyncio
-from queue import Queue
+import reprlib
+import time
 
 # Local
-from jupyter_util import echom, unquote_string, str_to_vim, get_vim
+from jupyter_util import echom, get_vim
+from stream_coalescer import StreamCoalescer
 
 # Process local
 import vim
 
+CHANNELS = ('shell', 'iopub', 'control')
+
+
+class MonitorFilter():
+    """Messages to monitor, checked in the asyncio thread before formatting.
+
+    Parameters
+    ----------
+    channels : list of str, optional, default=None
+        Channels to subscribe to, all if None.
+    types : list of str, optional, default=None
+        msg_types to keep, all if None.
+    exclude : list of str, optional, default=None
+        msg_types to drop, i.e. `status`.
+    session : str, optional, default=None
+        Only keep the replies to the requests of this client session.
+    maxlen : int, optional, default=None
+        Maximum length of a line, the content is cut past it.
+    """
+    def __init__(self, channels=None, types=None, exclude=None, session=None, maxlen=None):
+        self.channels = list(channels or CHANNELS)
+        self.types = set(types) if types else None
+        self.exclude = set(exclude or ())
+        self.session = session
+        self.maxlen = maxlen
+        self.repr = reprlib.Repr()
+        if maxlen:
+            self.repr.maxstring = self.repr.maxother = maxlen
+            self.repr.maxlevel = 3
+
+    @classmethod
+    def from_args(cls, args, session):
+        """Parse the arguments of `:JupyterStartMonitor`.
+
+        Parameters
+        ----------
+        args : list of str
+            i.e. ['channels=iopub', 'types=-status,-execute_input', 'mine', 'maxlen=200']
+        session : str
+            The session of the client, for `mine`.
+
+        Returns
+        -------
+        :obj:`MonitorFilter`
+
+        Raises
+        ------
+        ValueError
+            If an argument is unknown or invalid.
+        """
+        kwargs = dict()
+        for arg in args:
+            key, _, value = arg.partition('=')
+            values = [x for x in value.split(',') if x]
+            if key == 'channels':
+                unknown = set(values) - set(CHANNELS)
+                if unknown:
+                    raise ValueError(f'unknown channels: {", ".join(sorted(unknown))}')
+                kwargs['channels'] = values
+            elif key == 'types':
+                kwargs['types'] = [x for x in values if not x.startswith('-')]
+                kwargs['exclude'] = [x[1:] for x in values if x.startswith('-')]
+            elif key == 'mine' and not value:
+                kwargs['session'] = session
+            elif key == 'maxlen' and value.isdigit():
+                kwargs['maxlen'] = int(value)
+            else:
+                raise ValueError(f'invalid argument: {arg}')
+        return cls(**kwargs)
+
+    def accept(self, msg):
+        """Check if `msg` is to be monitored (asyncio thread)."""
+        msg_type = msg['header']['msg_type']
+        if msg_type in self.exclude or (self.types is not None and msg_type not in self.types):
+            return False
+        return self.session is None or msg['parent_header'].get('session') == self.session
+
+    def format(self, channel, msg):
+        """Format a message to one line, only as long as `maxlen`."""
+        content = self.repr.repr(msg['content']) if self.maxlen else msg['content']
+        return self.cut(f'[{channel}] {msg["header"]["msg_type"]}: {content}')
+
+    def cut(self, line):
+        """Cut `line` to `maxlen`."""
+        if self.maxlen and len(line) > self.maxlen:
+            return line[:self.maxlen] + '...'
+        return line
+
 
 class Monitor():
-    """Jupyter kernel monitor buffer and message line"""
-    def __init__(self, kernel_client):
+    """Jupyter kernel monitor buffer and message line
+
+    Attributes
+    ----------
+    coalescer : :obj:`StreamCoalescer`
+        Lines to write, with the stream output merged and rate limited to
+        `g:jupyter_monitor_max_rate` lines per second.
+    max_lines : int
+        Capacity of the buffer: the oldest lines are deleted past it.
+    msg_filter : :obj:`MonitorFilter`
+        The messages to monitor.
+    """
+    def __init__(self, kernel_client, msg_filter=None):
         self.kernel_client = kernel_client
+        self.msg_filter = msg_filter or MonitorFilter()
         self.cmd = None
         self.cmd_id = None
         self.cmd_count = 0
-        self.line_queue = Queue()
+        self.max_lines = max(1, int(get_vim('g:jupyter_monitor_max_lines', 10000)))
+        self.coalescer = StreamCoalescer(get_vim('g:jupyter_monitor_max_rate', 500),
+                                         max_pending=self.max_lines)
 
         ## Open the Jupyter terminal in vim, and move cursor to it
         if -1 == vim.eval('jupyter#monitor_console#OpenJupyterMonitor()'):
             echom('__jupyter_monitor__ failed to open!', 'Error')
             return
 
-        # Launch timer that will update the buffer
-        timer_interval = get_vim('g:jupyter_timer_interval', 500)
-        vim.command(f'call timer_start({timer_interval}, "jupyter#monitor_console#UpdateConsoleBuffer")')
-
-        for channel in ['shell', 'iopub', 'control']:
+        self.tasks = [
             asyncio.run_coroutine_threadsafe(self.monitor(channel), kernel_client.loop)
+            for channel in self.msg_filter.channels]
 
     async def monitor(self, channel):
         """Start monitoring a channel.
@@ -42,35 +143,63 @@ class Monitor():
         channel : 'shell' | 'iopub' | 'control'
             The channel to monitor.
         """
-        while not self.kernel_client.loop.is_closed():
-            msg = await self.kernel_client.get_next_msg(channel)
-            self.line_queue.put(f'[{channel}] {msg["header"]["msg_type"]}: {msg["content"]}')
-
-    def timer_write_msgs(self):
-        """Write kernel <-> vim messages to monitor buffer"""
-        timer_interval = get_vim('g:jupyter_timer_interval', 500)
-        vim.command(f'call timer_start({timer_interval}, "jupyter#monitor_console#UpdateConsoleBuffer")')
-
+        # Filtered out messages are not even queued
+        sub = self.kernel_client.router.subscribe(channel, accept=self.msg_filter.accept)
+        try:
+            while not self.kernel_client.loop.is_closed():
+                msg = await sub.get()
+                arrival = time.monotonic()
+                # Merge the output streams, format the other messages
+                if channel != 'iopub' or not self.coalescer.feed(msg, arrival):
+                    self.coalescer.add_line(self.msg_filter.format(channel, msg), arrival)
+                self.kernel_client.waker.wake()
+        finally:
+            sub.close()
+
+    def stop(self):
+        """Stop monitoring, releasing the channel subscriptions."""
+        for task in self.tasks:
+            task.cancel()
+
+    def write_msgs(self):
+        """Write kernel <-> vim messages to monitor buffer
+
+        The new lines are written at once, without entering the monitor
+        window, then the oldest ones are deleted to keep `max_lines`.
+
+        Returns
+        -------
+        float or None
+            Arrival time of the oldest message written, None if none.
+        """
         # Check in
-        if self.line_queue.empty():
-            return
-
-        # Get buffer (same indexes as vim)
+        n_erase, msgs, oldest = self.coalescer.flush(time.monotonic())
+        if not n_erase and not msgs:
+            return None
         b_nb = int(vim.eval('bufnr("__jupyter_monitor__")'))
+        if b_nb < 0:
+            return None
         buf = vim.buffers[b_nb]
 
-        cur_win = vim.eval('win_getid()')
-        term_win = vim.eval('bufwinid({})'.format(str(b_nb)))
-        vim.command('call win_gotoid({})'.format(term_win))
-        vim.command('set modifiable')
-
-        # Append mesage to jupyter terminal buffer
-        while not self.line_queue.empty():
-            msg = self.line_queue.get_nowait()
-            for line in msg.splitlines():
-                line = unquote_string(str_to_vim(line))
-                buf.append(line)
-
-        vim.command('normal! G')
-        vim.command('set nomodifiable')
-        vim.command('call win_gotoid({})'.format(cur_win))
+        # Vim cannot deal with zero bytes, nor newlines in a line
+        cut = self.msg_filter.cut
+        lines = [cut(line.replace('\0', '\\0')) for msg in msgs for line in msg.splitlines()]
+        lines = lines[-self.max_lines:]
+
+        # Read-only for the user, modifiable for the batch only
+        buf.options['modifiable'] = True
+        try:
+            # Erase the output cleared or rewritten (\r), append the new one
+            if n_erase:
+                del buf[max(0, len(buf) - n_erase):]
+            buf.append(lines)
+
+            # Trim the head, as a ring
+            excess = len(buf) - self.max_lines
+            if excess > 0:
+                del buf[:excess]
+        finally:
+            buf.options['modifiable'] = False
+
+        vim.command(f'call jupyter#monitor_console#ScrollToEnd({b_nb:d})')
+        return oldest
@@ -0,0 +1,272 @@
+"""
+Stand-in kernel replaying a recording, for tests and benchmarks.
+
+Speaks the Jupyter protocol on local zmq sockets, without ipykernel: it
+answers each request with the messages recorded for a request of the same
+type (same code first, else the next one, in a loop), at their recorded
+delays divided by `--speed`. The infos snippet of `:JupyterConnect` is
+answered with the pid, hostname and cwd of this process. Requests never
+recorded are answered as an empty cell would be.
+
+A recording is saved by `:JupyterTraceSave` (see trace_recorder.py), or
+made up for a load test:
+    flood:N    N stream messages of one line, at once
+    payload:M  one stream message of M MB
+    slow:S     a cell running S seconds
+
+Usage, then `:JupyterConnect /tmp/replay.json`:
+    $ python3 python3/replay_kernel.py session.jsonl.gz -f /tmp/replay.json --speed 10
+    $ python3 python3/replay_kernel.py flood:100000 -f /tmp/replay.json
+
+.. note:: This is a standalone script: it does not need vim.
+"""
+
+# Standard
+import argparse
+import heapq
+import json
+import os
+import socket
+import time
+import uuid
+
+# Py module
+from jupyter_client.session import Session
+import zmq
+
+# Local
+from session_packer import set_packer
+from trace_recorder import load_recording
+
+# Export only
+__all__ = ['ReplayKernel', 'make_recording']
+
+KERNEL_INFO = {
+    'status': 'ok', 'protocol_version': '5.3', 'implementation': 'replay',
+    'implementation_version': '1', 'banner': 'jupyter-vim replay kernel',
+    'language_info': {'name': 'python', 'version': '', 'mimetype': 'text/x-python',
+                      'file_extension': '.py'},
+}
+
+
+def make_recording(spec):
+    """Make up a recording for a load test.
+
+    Parameters
+    ----------
+    spec : str
+        `flood:N`, `payload:M` or `slow:S`, see the module doc.
+
+    Returns
+    -------
+    (dict, list of dict)
+        As :func:`load_recording`.
+    """
+    kind, _, value = spec.partition(':')
+    outputs = list()
+    running = 0
+    if kind == 'flood':
+        outputs = [[0, 'iopub', 'stream', {'name': 'stdout', 'text': f'{i}\n'}, {}]
+                   for i in range(int(value or 100000))]
+    elif kind == 'payload':
+        outputs = [[0, 'iopub', 'stream',
+                    {'name': 'stdout', 'text': 'x' * int(float(value or 100) * 2**20)}, {}]]
+    elif kind == 'slow':
+        running = float(value or 5)
+    else:
+        raise ValueError(f'Unknown recording: {spec}, expected flood:N, payload:M or slow:S')
+    replies = [[0, 'iopub', 'status', {'execution_state': 'busy'}, {}],
+               [0, 'iopub', 'execute_input', {'code': spec, 'execution_count': 1}, {}],
+               *outputs,
+               [running, 'shell', 'execute_reply',
+                {'status': 'ok', 'execution_count': 1, 'user_expressions': {}}, {}],
+               [running, 'iopub', 'status', {'execution_state': 'idle'}, {}]]
+    return None, [{'msg_type': 'execute_request', 'channel': 'shell', 'code': None,
+                   'replies': replies}]
+
+
+def empty_replies(msg_type, kernel_info):
+    """The messages of a request not recorded, as for an empty cell."""
+    replies = [[0, 'iopub', 'status', {'execution_state': 'busy'}, {}]]
+    reply_type = msg_type.replace('_request', '_reply')
+    if msg_type == 'kernel_info_request':
+        replies.append([0, 'shell', reply_type, kernel_info, {}])
+    elif msg_type == 'execute_request':
+        replies.append([0, 'shell', reply_type,
+                        {'status': 'ok', 'execution_count': 0, 'user_expressions': {}}, {}])
+    else:
+        replies.append([0, 'shell', reply_type, {'status': 'ok'}, {}])
+    replies.append([0, 'iopub', 'status', {'execution_state': 'idle'}, {}])
+    return replies
+
+
+class ReplayKernel():
+    """Answer the requests of a client with the messages of a recording.
+
+    Parameters
+    ----------
+    kernel_info : dict or None
+        Content of the kernel_info_reply, a python kernel's if None.
+    requests : list of dict
+        The requests recorded and their replies, see :func:`load_recording`.
+    speed : float, optional, default=1
+        Divide the delays of the replies, 0 to send them at once.
+    ip : str, optional, default='127.0.0.1'
+        Interface of the sockets.
+    packer : str, optional, default=''
+        Serializer of the messages, the client's: see `session_packer.py`.
+
+    Attributes
+    ----------
+    connection_info : dict
+        Ports, key and transport, as written in the connection file.
+    """
+    def __init__(self, kernel_info, requests, speed=1, ip='127.0.0.1', packer=''):
+        self.kernel_info = kernel_info or KERNEL_INFO
+        self.requests = requests
+        self.speed = speed
+        self.used = set()           # Indexes of the requests replayed
+        self.cursors = dict()       # msg_type -> next index to replay
+        self.pending = list()       # Heap of (time, order, channel, msg_type, content, ...)
+        self.order = 0
+        self.running = True
+
+        key = str(uuid.uuid4())
+        self.session = Session(key=key.encode(), username='replay')
+        set_packer(self.session, packer)
+        self.context = zmq.Context()
+        self.sockets = dict()
+        ports = dict()
+        for channel, kind in (('shell', zmq.ROUTER), ('control', zmq.ROUTER),
+                              ('stdin', zmq.ROUTER), ('iopub', zmq.PUB), ('hb', zmq.REP)):
+            sock = self.context.socket(kind)
+            sock.setsockopt(zmq.LINGER, 0)
+            # A flood is queued at once: drop none of it, as a kernel does not
+            sock.setsockopt(zmq.SNDHWM, 0)
+            ports[f'{channel}_port'] = sock.bind_to_random_port(f'tcp://{ip}')
+            self.sockets[channel] = sock
+        self.connection_info = dict(ports, ip=ip, key=key, transport='tcp',
+                                    signature_scheme='hmac-sha256', kernel_name='replay')
+
+    def write_connection_file(self, filename):
+        """Write the connection file for the clients."""
+        with open(filename, 'w', encoding='utf-8') as f_json:
+            json.dump(self.connection_info, f_json, indent=1)
+
+    def find(self, msg_type, code):
+        """Index of the recorded request to replay for a new one, None if none."""
+        candidates = [i_req for i_req, request in enumerate(self.requests)
+                      if request['msg_type'] == msg_type]
+        if not candidates:
+            return None
+        for i_req in candidates:
+            if i_req not in self.used and code is not None and self.requests[i_req]['code'] == code:
+                return i_req
+        # Next in order, looping
+        cursor = self.cursors.get(msg_type, 0)
+        self.cursors[msg_type] = cursor + 1
+        return candidates[cursor % len(candidates)]
+
+    def on_request(self, channel, idents, request):
+        """Schedule the replies of a request just received."""
+        msg_type = request['header']['msg_type']
+        content = request['content']
+        now = time.monotonic()
+
+        if msg_type == 'execute_request' and '_res' in content.get('user_expressions', {}):
+            # The infos snippet of jupyter-vim: this process
+            res = repr(f'{os.getpid()};{socket.gethostname()};{os.getcwd()}')
+            replies = empty_replies(msg_type, self.kernel_info)
+            replies[1][3] = dict(replies[1][3], user_expressions={
+                '_res': {'status': 'ok', 'data': {'text/plain': res}, 'metadata': {}}})
+        else:
+            i_req = self.find(msg_type, content.get('code'))
+            if i_req is None:
+                replies = empty_replies(msg_type, self.kernel_info)
+            else:
+                self.used.add(i_req)
+                replies = self.requests[i_req]['replies']
+
+        for delay, reply_channel, reply_type, reply_content, metadata in replies:
+            # Replies go back on the channel of the request
+            if reply_channel in ('shell', 'control'):
+                reply_channel = channel
+            when = now + (delay / self.speed if self.speed else 0)
+            heapq.heappush(self.pending, (when, self.order, reply_channel, idents, reply_type,
+                                          reply_content, metadata, request['header']))
+            self.order += 1
+
+        if msg_type == 'shutdown_request':
+            self.running = False
+
+    def send_due(self):
+        """Send the replies whose time came, return the seconds until the next one."""
+        while self.pending:
+            when = self.pending[0][0]
+            delay = when - time.monotonic()
+            if delay > 0:
+                return delay
+            _, _, channel, idents, msg_type, content, metadata, parent = \
+                heapq.heappop(self.pending)
+            self.session.send(self.sockets[channel], msg_type, content, parent=parent,
+                              ident=idents if channel != 'iopub' else None,
+                              metadata=metadata)
+        return None
+
+    def serve(self):
+        """Answer the requests until a shutdown_request."""
+        poller = zmq.Poller()
+        for channel in ('shell', 'control', 'stdin', 'hb'):
+            poller.register(self.sockets[channel], zmq.POLLIN)
+        self.session.send(self.sockets['iopub'], 'status', {'execution_state': 'starting'})
+
+        while self.running or self.pending:
+            delay = self.send_due()
+            timeout = None if delay is None else 1000 * delay
+            for sock, _ in poller.poll(timeout):
+                frames = sock.recv_multipart()
+                if sock is self.sockets['hb']:
+                    sock.send_multipart(frames)
+                elif sock is not self.sockets['stdin']:
+                    channel = 'shell' if sock is self.sockets['shell'] else 'control'
+                    idents, msg_frames = self.session.feed_identities(frames)
+                    self.on_request(channel, idents, self.session.deserialize(msg_frames))
+
+    def close(self):
+        """Close the sockets."""
+        self.context.destroy(linger=0)
+
+
+def main():
+    """Parse arguments, write the connection file and serve."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('recording', help='file saved by :JupyterTraceSave, or flood:N, '
+                                          'payload:M, slow:S')
+    parser.add_argument('-f', dest='connection_file', required=True, help='connection file')
+    parser.add_argument('--speed', type=float, default=1,
+                        help='divide the recorded delays, 0 for no delay')
+    parser.add_argument('--packer', default='',
+                        help='serializer of the messages: json, orjson or msgpack, '
+                             'as g:jupyter_session_packer')
+    args = parser.parse_args()
+
+    if os.path.exists(args.recording):
+        kernel_info, requests = load_recording(args.recording)
+    else:
+        kernel_info, requests = make_recording(args.recording)
+    kernel = ReplayKernel(kernel_info, requests, speed=args.speed, packer=args.packer)
+    kernel.write_connection_file(args.connection_file)
+    try:
+        kernel.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        kernel.close()
+        try:
+            os.remove(args.connection_file)
+        except OSError:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""
+Where the time goes between a command and its result, per command.
+
+Each execute_request sent by a vim command is timestamped:
+    vim: the command is called
+    sent: the request is handed to the socket
+    busy: the kernel publishes `busy` for it (iopub)
+    reply: its execute_reply arrives (shell)
+    idle: the kernel publishes `idle` for it (iopub)
+    render: vim drains the display queues after it completed
+The time between two consecutive points is a phase: prepare, queue, execute,
+finish and render, plus the total. Each phase of each command (`run_cell`,
+`send_range`...) is recorded in a :obj:`Histogram`.
+
+.. note:: Thread safe: requests are sent from vim's thread or the asyncio one,
+          their messages are seen from the asyncio thread, and they are
+          rendered and summarized from vim's.
+"""
+
+# Standard
+import collections
+import json
+from threading import Lock
+import time
+
+# Export only
+__all__ = ['Histogram', 'RequestStats', 'PHASES']
+
+# Phase: (from, to) points of a request
+PHASES = collections.OrderedDict((
+    ('prepare', ('vim', 'sent')),
+    ('queue', ('sent', 'busy')),
+    ('execute', ('busy', 'reply')),
+    ('finish', ('reply', 'idle')),
+    ('render', ('idle', 'render')),
+    ('total', ('vim', 'render')),
+))
+
+
+class Histogram():
+    """Log-linear histogram of durations in microseconds, as HdrHistogram.
+
+    Values below `2**precision` have their own bucket, each power of two
+    above is split in `2**(precision - 1)` buckets: the relative error is
+    under `2**(1 - precision)`, whatever the magnitude, in little memory.
+
+    Parameters
+    ----------
+    precision : int, optional, default=8
+        Bits of the buckets, 8 is below 1% of error.
+
+    Attributes
+    ----------
+    counts : dict
+        Number of values, by (shift, sub-bucket): values in
+        `[sub << shift, (sub + 1) << shift)`.
+    count : int
+        Number of values recorded.
+    total : int
+        Sum of the values recorded, for the mean.
+    min, max : int
+        Exact extrema of the values recorded.
+    """
+    def __init__(self, precision=8):
+        self.precision = precision
+        self.counts = dict()
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def record(self, value):
+        """Add a duration in microseconds."""
+        value = max(int(value), 0)
+        shift = max(value.bit_length() - self.precision, 0)
+        key = (shift, value >> shift)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.min = value if not self.count else min(self.min, value)
+        self.max = max(self.max, value)
+        self.count += 1
+        self.total += value
+
+    def merge(self, other):
+        """Add the values of histogram `other`, of the same precision."""
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        if other.count:
+            self.min = other.min if not self.count else min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def percentile(self, percent):
+        """Get the value under which `percent` % of the values are (us).
+
+        The highest value of the bucket, as HdrHistogram: never under the
+        true percentile.
+        """
+        if not self.count:
+            return 0
+        rank = max(1, percent / 100 * self.count)
+        seen = 0
+        for shift, sub in sorted(self.counts):
+            seen += self.counts[shift, sub]
+            if seen >= rank:
+                return min(((sub + 1) << shift) - 1, self.max)
+        return self.max
+
+    def summary(self):
+        """Summarize in milliseconds.
+
+        Returns
+        -------
+        dict
+            dict with keys: {'count', 'min_ms', 'mean_ms', 'p50_ms', 'p90_ms',
+            'p99_ms', 'max_ms'}
+        """
+        summary = {'count': self.count, 'min_ms': self.min / 1000,
+                   'mean_ms': self.total / max(self.count, 1) / 1000}
+        for percent in (50, 90, 99):
+            summary[f'p{percent}_ms'] = self.percentile(percent) / 1000
+        summary['max_ms'] = self.max / 1000
+        return summary
+
+    def to_dict(self):
+        """Get the buckets and summary, as json."""
+        return dict(self.summary(), precision=self.precision, total_us=self.total,
+                    min_us=self.min, max_us=self.max,
+                    counts=[[shift, sub, count]
+                            for (shift, sub), count in sorted(self.counts.items())])
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a histogram from :meth:`to_dict`, i.e. from an export."""
+        histogram = cls(data['precision'])
+        for shift, sub, count in data['counts']:
+            histogram.counts[shift, sub] = count
+        histogram.count = data['count']
+        histogram.total = data['total_us']
+        histogram.min = data['min_us']
+        histogram.max = data['max_us']
+        return histogram
+
+
+class RequestStats():
+    """Timestamps of the requests in flight, and histograms of the done ones.
+
+    Parameters
+    ----------
+    max_pending : int, optional, default=10000
+        Requests in flight kept at most: the oldest are forgotten, i.e. the
+        requests of a kernel that died.
+
+    Attributes
+    ----------
+    histograms : dict
+        :obj:`Histogram` of each phase, by command then phase.
+    current : (str, float) or None
+        The vim command running and when it was called.
+    """
+    def __init__(self, max_pending=10000):
+        self.max_pending = max_pending
+        self.histograms = dict()
+        self.current = None
+        self.pending = collections.OrderedDict()   # msg_id -> (command, points)
+        self.done = collections.deque()            # Waiting for vim to render
+        self.lock = Lock()
+
+    def begin(self, command):
+        """A vim command is called: its requests are timed from now (vim thread).
+
+        Returns
+        -------
+        bool
+            Whether this command is the outer one, which must call :meth:`end`.
+        """
+        if self.current is not None:
+            return False
+        self.current = (command, time.monotonic())
+        return True
+
+    def end(self):
+        """The vim command returned: requests sent from now are not its."""
+        self.current = None
+
+    def track(self, msg_id, origin):
+        """Time request `msg_id`, just sent by `origin` (any thread).
+
+        Parameters
+        ----------
+        msg_id : str
+            Id of the execute_request.
+        origin : (str, float) or None
+            Command and time of the call, see :attr:`current`. Not timed if
+            None.
+        """
+        if origin is None:
+            return
+        command, called = origin
+        with self.lock:
+            self.pending[msg_id] = (command, {'vim': called, 'sent': time.monotonic()})
+            while len(self.pending) > self.max_pending:
+                self.pending.popitem(last=False)
+
+    def on_message(self, channel, msg):
+        """Timestamp the request a kernel message is about (asyncio thread)."""
+        if not self.pending:
+            return
+        msg_type = msg['header']['msg_type']
+        if channel == 'iopub' and msg_type == 'status':
+            point = {'busy': 'busy', 'idle': 'idle'}.get(
+                msg['content'].get('execution_state'))
+        elif channel == 'shell' and msg_type == 'execute_reply':
+            point = 'reply'
+        else:
+            return
+        if point is None:
+            return
+        with self.lock:
+            request = self.pending.get(msg['parent_header'].get('msg_id'))
+            if request is None:
+                return
+            points = request[1]
+            points.setdefault(point, time.monotonic())
+            # Replies and status come on two sockets: done with both
+            if 'reply' in points and 'idle' in points:
+                del self.pending[msg['parent_header']['msg_id']]
+                self.done.append(request)
+
+    def render(self):
+        """Record the requests completed, displayed now (vim thread).
+
+        .. note:: called after vim drained the display queues.
+        """
+        if not self.done:
+            return
+        now = time.monotonic()
+        with self.lock:
+            done, self.done = self.done, collections.deque()
+        for command, points in done:
+            points['render'] = now
+            histograms = self.histograms.setdefault(command, dict())
+            for phase, (start, stop) in PHASES.items():
+                if start in points and stop in points:
+                    if phase not in histograms:
+                        histograms[phase] = Histogram()
+                    histograms[phase].record(1e6 * (points[stop] - points[start]))
+
+    def reset(self):
+        """Forget the histograms."""
+        self.histograms = dict()
+
+    def summary(self):
+        """Summarize each phase of each command, in milliseconds.
+
+        Returns
+        -------
+        dict
+            {command: {phase: summary}}, see :meth:`Histogram.summary`.
+        """
+        return {command: {phase: histograms[phase].summary()
+                          for phase in PHASES if phase in histograms}
+                for command, histograms in self.histograms.items()}
+
+    def to_dict(self):
+        """Get all the histograms, as json."""
+        return {'version': 1, 'unit': 'us', 'time': time.time(),
+                'phases': {phase: list(points) for phase, points in PHASES.items()},
+                'commands': {command: {phase: histogram.to_dict()
+                                       for phase, histogram in histograms.items()}
+                             for command, histograms in self.histograms.items()}}
+
+    def export(self, filename):
+        """Write all the histograms in `filename`, as json."""
+        with open(filename, 'w', encoding='utf-8') as f_json:
+            json.dump(self.to_dict(), f_json, indent=1)
+
+    @staticmethod
+    def load(filename):
+        """Read the histograms of an export, for offline comparison.
+
+        Returns
+        -------
+        dict
+            :obj:`Histogram` of each phase, by command then phase.
+        """
+        with open(filename, encoding='utf-8') as f_json:
+            data = json.load(f_json)
+        return {command: {phase: Histogram.from_dict(histogram)
+                          for phase, histogram in histograms.items()}
+                for command, histograms in data['commands'].items()}
+
+    def format(self):
+        """Format the summary as a table, one line per command and phase."""
+        lines = [f'{"command":<20s} {"phase":<8s} {"count":>6s} {"p50":>9s} '
+                 f'{"p90":>9s} {"p99":>9s} {"max":>9s}  ms']
+        for command, phases in sorted(self.summary().items()):
+            for phase, summary in phases.items():
+                lines.append(
+                    f'{command:<20s} {phase:<8s} {summary["count"]:6d} '
+                    f'{summary["p50_ms"]:9.2f} {summary["p90_ms"]:9.2f} '
+                    f'{summary["p99_ms"]:9.2f} {summary["max_ms"]:9.2f}')
+        return lines
@@ -0,0 +1,239 @@
+"""
+Scratch buffer showing a large text page by page, see `:JupyterShow`.
+
+The lines come from a source, read a page at a time when the cursor gets
+near the end of the buffer:
+    MappedText: the kernel writes the text to a file of its host
+                (`Language.share`), vim maps it and only decodes the lines
+                it shows. Nothing goes through the sockets.
+    KernelPages: the kernel keeps an iterator on the lines (`Language.fetch`),
+                 vim gets them a page ahead through user_expressions.
+                 Nothing is computed or sent whole.
+"""
+
+# Standard
+import asyncio
+import mmap
+import os
+
+# Local
+from jupyter_util import get_vim
+
+# Process local (only the view needs it, see test/benchmark/show_shared.py)
+try:
+    import vim
+except ImportError:
+    vim = None
+
+# Export only
+__all__ = ['MappedText', 'KernelPages', 'ScratchView']
+
+# Longest line read at once: the text of a large str may have no newline
+MAX_LINE_BYTES = 2**20
+
+
+class MappedText():
+    """Lines of a text file, mapped in memory and read on demand.
+
+    The file is removed as soon as mapped: it lives as long as the mapping,
+    and is not left behind if vim exits.
+
+    Parameters
+    ----------
+    path : str
+        The file, utf-8.
+
+    Attributes
+    ----------
+    size : int
+        Size of the text in bytes.
+    offset : int
+        Bytes read so far.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f_text:
+            self.size = os.fstat(f_text.fileno()).st_size
+            # An empty file cannot be mapped
+            self.data = mmap.mmap(f_text.fileno(), 0, access=mmap.ACCESS_READ) \
+                if self.size else b''
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        self.offset = 0
+
+    @property
+    def done(self):
+        """Whether all the text was read."""
+        return self.offset >= self.size
+
+    def read_lines(self, count):
+        """Read the next lines.
+
+        Parameters
+        ----------
+        count : int
+            Number of lines. A line longer than `MAX_LINE_BYTES` is cut in
+            lines of that length.
+
+        Returns
+        -------
+        list of str
+            The lines, without newline and NUL (shown as `\\0`), empty at the end.
+        """
+        lines = list()
+        start = end = self.offset
+        for _ in range(count):
+            if end >= self.size:
+                break
+            newline = self.data.find(b'\n', end, end + MAX_LINE_BYTES)
+            if newline >= 0:
+                end = newline + 1
+                continue
+            # Do not cut a character in two
+            cut = min(end + MAX_LINE_BYTES, self.size)
+            while self.size > cut > end and self.data[cut] & 0xC0 == 0x80:
+                cut -= 1
+            end = cut if cut > end else min(end + MAX_LINE_BYTES, self.size)
+            # The lines so far, decoded at once
+            lines.extend(self.decode(start, end))
+            start = end
+        lines.extend(self.decode(start, end))
+        self.offset = end
+        return lines
+
+    def decode(self, start, end):
+        """Split the bytes from `start` to `end` in lines, a last newline ignored."""
+        if end <= start:
+            return []
+        text = self.data[start:end].decode('utf-8', 'replace').replace('\0', '\\0')
+        return text[:-1].split('\n') if text.endswith('\n') else text.split('\n')
+
+    def close(self):
+        """Unmap the text."""
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = b''
+        self.size = self.offset = 0
+
+
+class KernelPages():
+    """Lines of a value of the kernel, fetched a page ahead.
+
+    Reading never waits for the kernel: when the next page has not arrived,
+    no line is read and vim is woken up once it does.
+
+    Parameters
+    ----------
+    client : :obj:`JupyterMessenger`
+        The client of the kernel.
+    token : str
+        The key of the iterator in the kernel, see :meth:`JupyterMessenger.fetch`.
+    lines : list of str
+        The first page.
+    last : bool
+        Whether it is the last.
+    """
+    def __init__(self, client, token, lines, last):
+        self.client = client
+        self.token = token
+        self.lines = lines
+        self.last = last
+        self.ahead = None   # Future of the next page
+
+    @property
+    def done(self):
+        """Whether all the lines were read."""
+        return self.last and not self.lines and self.ahead is None
+
+    def read_lines(self, count):
+        """Read the next lines, and fetch the page after them.
+
+        Returns
+        -------
+        list of str
+            At most `count` lines, none if the next page is still on its way.
+        """
+        if self.ahead is not None:
+            if not self.ahead.done():
+                return []
+            if not self.ahead.cancelled() and self.ahead.exception() is None:
+                lines, self.last = self.ahead.result()
+                self.lines.extend(lines)
+            else:
+                self.last = True
+            self.ahead = None
+        lines, self.lines = self.lines[:count], self.lines[count:]
+        if not self.last and not self.lines:
+            self.ahead = asyncio.run_coroutine_threadsafe(
+                self.client.fetch_page(self.token, count), self.client.loop)
+            self.ahead.add_done_callback(lambda _: self.client.waker.wake())
+        return lines
+
+    def close(self):
+        """Forget the lines, release the iterator of the kernel."""
+        if self.ahead is not None:
+            self.ahead.cancel()
+        if not self.last:
+            asyncio.run_coroutine_threadsafe(self.client.fetch_page(self.token, 0),
+                                             self.client.loop)
+        self.lines = []
+        self.last = True
+        self.ahead = None
+
+
+class ScratchView():
+    """The `__jupyter_view__` buffer, filled page by page from a source.
+
+    Parameters
+    ----------
+    source : :obj:`MappedText` or :obj:`KernelPages`
+        Where to read the lines, closed with the view.
+    title : str
+        What is shown, i.e. the expression, kept in `b:jupyter_view_title`.
+    page_lines : int, optional, default=None
+        Lines read at once, `g:jupyter_view_page_lines` if None.
+
+    Attributes
+    ----------
+    bufnr : int
+        Number of the buffer.
+    wanted : bool
+        Whether a page was asked before the source had it, see :meth:`drain`.
+    """
+    def __init__(self, source, title, page_lines=None):
+        self.source = source
+        self.title = title
+        self.wanted = False
+        self.page_lines = page_lines or int(get_vim('g:jupyter_view_page_lines', 1000))
+        self.bufnr = int(vim.eval('jupyter#view#Open()'))
+        buf = vim.buffers[self.bufnr]
+        buf.vars['jupyter_view_title'] = title
+        buf[:] = self.source.read_lines(self.page_lines) or ['']
+        buf.vars['jupyter_view_done'] = int(self.source.done)
+
+    def more(self):
+        """Append the next page to the buffer.
+
+        .. note:: called when the cursor nears its end, see `jupyter#view#More()`.
+        """
+        if self.source.done or self.bufnr not in vim.buffers:
+            return
+        lines = self.source.read_lines(self.page_lines)
+        self.wanted = not lines and not self.source.done
+        buf = vim.buffers[self.bufnr]
+        buf.append(lines)
+        buf.vars['jupyter_view_done'] = int(self.source.done)
+
+    def drain(self):
+        """Append the page asked by :meth:`more`, if it arrived since.
+
+        .. note:: called by :meth:`JupyterVimSession.drain`.
+        """
+        if self.wanted:
+            self.more()
+
+    def close(self):
+        """Release the text, the buffer stays."""
+        self.source.close()
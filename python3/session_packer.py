@@ -0,0 +1,112 @@
+"""
+Serializers of the messages of the Jupyter session, see `g:jupyter_session_packer`.
+
+Every message from the kernel is decoded in vim's process: for the large
+outputs (a DataFrame repr, an image in a `display_data`), decoding dominates.
+    json: the standard library, as jupyter_client before version 8
+    orjson: the same json, decoded several times faster (`pip install orjson`)
+    msgpack: binary, smaller, for kernels started with the same packer, i.e.
+             `python -m ipykernel_launcher -f kernel.json --Session.packer=msgpack`
+             (`pip install msgpack`)
+By default, orjson if installed, else json: both speak to any kernel.
+
+.. note:: No vim here: the bridge process uses it too.
+"""
+
+# Py module
+from jupyter_client.jsonutil import json_default
+from jupyter_client.session import json_packer, json_unpacker
+
+# Optional, see list_packers
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Export only
+__all__ = ['get_packer', 'set_packer', 'list_packers']
+
+
+def orjson_packer(obj):
+    """Encode `obj` with orjson, with json for what orjson does not support."""
+    try:
+        return orjson.dumps(obj, default=json_default,
+                            option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z)
+    except (TypeError, orjson.JSONEncodeError):
+        return json_packer(obj)
+
+
+def orjson_unpacker(data):
+    """Decode `data` with orjson, with json for what orjson rejects."""
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return json_unpacker(data)
+
+
+def msgpack_packer(obj):
+    """Encode `obj` with msgpack, the dates as in json."""
+    return msgpack.packb(obj, default=json_default)
+
+
+def msgpack_unpacker(data):
+    """Decode `data` with msgpack."""
+    return msgpack.unpackb(data)
+
+
+# Name: (installed, packer, unpacker)
+PACKERS = {
+    'json': (True, json_packer, json_unpacker),
+    'orjson': (orjson is not None, orjson_packer, orjson_unpacker),
+    'msgpack': (msgpack is not None, msgpack_packer, msgpack_unpacker),
+}
+
+
+def list_packers():
+    """Get the names of the packers whose module is installed."""
+    return [name for name, (ok, _, _) in PACKERS.items() if ok]
+
+
+def get_packer(name=''):
+    """Get the functions of a packer.
+
+    Parameters
+    ----------
+    name : str, optional, default=''
+        'json', 'orjson' or 'msgpack'. The fastest of json if empty: orjson
+        if installed, else json.
+
+    Returns
+    -------
+    (str, callable, callable)
+        The name, the packer (object -> bytes) and the unpacker.
+
+    Raises
+    ------
+    ValueError
+        If the packer is unknown or its module is not installed.
+    """
+    if not name:
+        name = 'orjson' if orjson is not None else 'json'
+    if name not in PACKERS:
+        raise ValueError(f'unknown packer {name}, expected one of {", ".join(PACKERS)}')
+    ok, pack, unpack = PACKERS[name]
+    if not ok:
+        raise ValueError(f'packer {name} needs its module: pip install {name}')
+    return name, pack, unpack
+
+
+def set_packer(session, name=''):
+    """Encode and decode the messages of a :obj:`Session` with a packer.
+
+    Returns
+    -------
+    str
+        The name of the packer, see :func:`get_packer`.
+    """
+    name, session.pack, session.unpack = get_packer(name)
+    return name
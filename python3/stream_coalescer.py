@@ -0,0 +1,231 @@
+"""
+Merge the stream output of the kernel into lines, displayed at a bounded rate.
+
+A loop printing a million numbers sends up to a million `stream` messages. They
+are not displayed one by one: consecutive chunks of the same stream (parent
+msg_id and name, i.e. stdout) are merged into lines until vim comes to display
+them. As in a terminal, `\\r` goes back to the beginning of the line and
+`clear_output` erases what the request displayed, so progress bars end on one
+line. At most `max_rate` lines are displayed per second: the others are
+dropped, and the display says how many.
+
+.. note:: The coalescer is thread safe: fed from the asyncio thread, flushed
+          from vim's.
+"""
+
+# Standard
+import collections
+from threading import Lock
+
+# Export only
+__all__ = ['StreamCoalescer']
+
+
+class _Block():
+    """Lines of consecutive chunks of one stream."""
+    def __init__(self, key, maxlen):
+        self.key = key
+        self.lines = collections.deque(maxlen=maxlen)
+        self.overflow = 0     # Complete lines pushed out of `lines`
+        self.current = ''     # Line being written, not complete yet
+        self.cr = False       # `\r` seen: the next text rewrites `current`
+        self.shown = 0        # Lines of this block at the end of the display
+        self.current_shown = False  # The last of them is `current`
+        self.replace = 0      # Lines to erase from the display at next flush
+
+    def write(self, text):
+        """Append a chunk of text, as a terminal would display it."""
+        pieces = text.split('\n')
+        for i_piece, piece in enumerate(pieces):
+            for i_seg, segment in enumerate(piece.split('\r')):
+                if i_seg:
+                    self.cr = True
+                if segment:
+                    self.current = segment if self.cr else self.current + segment
+                    self.cr = False
+            # A newline follows: the line is complete
+            if i_piece < len(pieces) - 1:
+                if len(self.lines) == self.lines.maxlen:
+                    self.overflow += 1
+                self.lines.append(self.current)
+                self.current = ''
+                self.cr = False
+
+    def clear(self):
+        """Erase the lines of the block, displayed or not."""
+        self.lines.clear()
+        self.overflow = 0
+        self.current = ''
+        self.cr = False
+        self.replace = self.shown
+
+
+class StreamCoalescer():
+    """Lines to display: formatted messages and merged stream output.
+
+    Parameters
+    ----------
+    max_rate : int, optional, default=500
+        Maximum number of stream lines displayed per second.
+    max_pending : int, optional, default=None
+        Maximum number of entries waiting for the next flush, the oldest are
+        dropped, and counted. Unbounded if None.
+
+    Attributes
+    ----------
+    dropped : int
+        Number of lines not displayed: stream lines beyond `max_rate`, and
+        the lines of the entries beyond `max_pending`.
+    """
+    def __init__(self, max_rate=500, max_pending=None):
+        self.max_rate = max(1, int(max_rate))
+        self.max_pending = None if max_pending is None else max(1, int(max_pending))
+        self.lock = Lock()
+        self.pending = collections.deque()  # str or _Block, in order
+        self.overflow = 0       # Lines of the entries dropped from `pending`
+        self.tail = None        # _Block at the end of the display
+        self.oldest = None      # Arrival time of the oldest pending entry
+        self.budget = self.max_rate
+        self.last_flush = None
+        self.dropped = 0
+
+    def add_line(self, line, arrival):
+        """Queue a line to display as is, i.e. a formatted message."""
+        with self.lock:
+            self.pending.append(line)
+            self._trim()
+            self.oldest = arrival if self.oldest is None else self.oldest
+
+    def feed(self, msg, arrival):
+        """Merge an iopub `stream` or `clear_output` message.
+
+        Returns
+        -------
+        bool
+            False if the message is of another type, not consumed.
+        """
+        msg_type = msg['header']['msg_type']
+        if msg_type not in ('stream', 'clear_output'):
+            return False
+        parent = msg.get('parent_header', {}).get('msg_id')
+
+        with self.lock:
+            self.oldest = arrival if self.oldest is None else self.oldest
+            if msg_type == 'clear_output':
+                self._clear(parent)
+            else:
+                self._block((parent, msg['content'].get('name', 'stdout'))) \
+                    .write(msg['content'].get('text', ''))
+        return True
+
+    def _block(self, key):
+        """Get the block to append to: the last one, if of the same stream."""
+        last = self.pending[-1] if self.pending else self.tail
+        if isinstance(last, _Block) and last.key == key:
+            if not self.pending:
+                self.pending.append(last)
+            return last
+        block = _Block(key, self.max_rate)
+        self.pending.append(block)
+        self._trim()
+        return block
+
+    def _trim(self):
+        """Drop the oldest entries beyond `max_pending`, counting their lines."""
+        if self.max_pending is None:
+            return
+        while len(self.pending) > self.max_pending:
+            entry = self.pending.popleft()
+            if isinstance(entry, _Block):
+                self.overflow += entry.overflow + len(entry.lines) + int(bool(entry.current))
+            else:
+                self.overflow += 1
+
+    def _clear(self, parent):
+        """Erase the stream output of request `parent`."""
+        for entry in self.pending:
+            if isinstance(entry, _Block) and entry.key[0] == parent:
+                entry.clear()
+        # Displayed lines can only be erased at the end of the display
+        tail = self.tail
+        if tail is not None and tail.key[0] == parent and \
+                all(entry is tail for entry in self.pending):
+            tail.clear()
+            self.pending.clear()
+            self.pending.append(tail)
+
+    def flush(self, now):
+        """Get what to display since the last flush.
+
+        Parameters
+        ----------
+        now : float
+            Current time, as `time.monotonic()`.
+
+        Returns
+        -------
+        (int, list of str, float or None)
+            The number of lines to erase at the end of the display first, the
+            lines to append and the arrival time of the oldest of them.
+        """
+        with self.lock:
+            pending = list(self.pending)
+            self.pending.clear()
+            oldest, self.oldest = self.oldest, None
+
+            # Refill the budget of lines, up to one second worth
+            if self.last_flush is not None:
+                self.budget = min(self.max_rate,
+                                  self.budget + self.max_rate * (now - self.last_flush))
+            self.last_flush = now
+
+            n_erase = 0
+            out = list()
+            if self.overflow:
+                self.dropped += self.overflow
+                out.append(f'... {self.overflow} lines dropped')
+                self.overflow = 0
+            for entry in pending:
+                if isinstance(entry, _Block):
+                    n_erase += self._render_block(entry, out, continued=entry is self.tail)
+                else:
+                    out.append(entry)
+
+            # Only the last block displayed can be continued or erased
+            if pending:
+                self.tail = pending[-1] if isinstance(pending[-1], _Block) else None
+            return n_erase, out, oldest
+
+    def _render_block(self, block, out, continued):
+        """Append the lines of `block` to `out`, within the budget of lines.
+
+        Returns
+        -------
+        int
+            The number of lines of the block to erase from the display.
+        """
+        # Erased lines, or the partial line shown before, are rewritten
+        n_erase = 0
+        if continued:
+            n_erase = block.replace or int(block.current_shown)
+            block.shown -= n_erase
+        block.replace = 0
+
+        # Keep the last lines within budget
+        lines = list(block.lines)
+        allowed = int(self.budget)
+        n_drop = block.overflow + max(0, len(lines) - allowed)
+        lines = lines[max(0, len(lines) - allowed):]
+        self.budget -= len(lines)
+        block.lines.clear()
+        block.overflow = 0
+        if n_drop:
+            self.dropped += n_drop
+            lines.insert(0, f'... {n_drop} lines dropped')
+
+        block.current_shown = bool(block.current)
+        if block.current_shown:
+            lines.append(block.current)
+        block.shown += len(lines)
+        out.extend(f'[{block.key[1]}] {line}' for line in lines)
+        return n_erase
@@ -0,0 +1,285 @@
+"""
+Record the kernel messages of a session, for Perfetto or chrome://tracing.
+
+Every message received from a kernel is recorded with its channel, msg_type,
+parent msg_id, size on the wire and arrival time, in buffers allocated once:
+recording stores references and numbers, nothing is formatted until the
+trace is written. When the buffers are full, the oldest messages are
+overwritten.
+
+The trace is in the Chrome Trace Event format (json), open it in
+<https://ui.perfetto.dev>: one process per kernel, one track per channel with
+each message as an instant event, and a `busy` track with one slice per
+execution, from the `busy` to the `idle` status of its request.
+
+If asked, the messages themselves are kept too, to be saved as a recording:
+gzipped json lines, the kernel_info_reply then one line per request with
+the messages it caused and their delays. `replay_kernel.py` plays it back.
+
+.. note:: Messages are recorded from the asyncio thread only, the trace is
+          written from vim's after the recording stopped.
+"""
+
+# Standard
+from array import array
+import gzip
+import json
+import os
+import time
+
+# Export only
+__all__ = ['TraceRecorder', 'load_recording', 'save_recording']
+
+CHANNELS = ('shell', 'iopub', 'control')
+
+
+class TraceRecorder():
+    """Ring buffer of the messages received from the kernels.
+
+    Parameters
+    ----------
+    size : int, optional, default=100000
+        Messages kept at most, the last ones.
+
+    Attributes
+    ----------
+    active : bool
+        Whether messages are recorded, see :meth:`start` and :meth:`stop`.
+    keep : bool
+        Whether the messages themselves are kept, for :meth:`save`.
+    count : int
+        Messages recorded since the start, including those overwritten.
+    """
+    def __init__(self, size=100000):
+        self.active = False
+        self.keep = False
+        self.size = 0
+        self.count = 0
+        self.started = 0
+        self.allocate(size)
+
+    def allocate(self, size):
+        """Allocate the buffers for `size` messages, forgetting the recorded ones.
+
+        Raises ValueError if `size` is not positive.
+        """
+        if size <= 0:
+            raise ValueError(f'Trace size must be positive, not {size:d}')
+        if size != self.size:
+            self.size = size
+            self.times = array('d', [0.0]) * size
+            self.sizes = array('q', [0]) * size
+            self.channels = array('b', [0]) * size
+            self.sources = [None] * size
+            self.msg_types = [None] * size
+            self.parents = [None] * size
+            self.msgs = [None] * size
+        elif self.count:
+            self.msgs[:] = [None] * size
+        self.count = 0
+
+    def start(self, size=0, keep=False):
+        """Start recording, from an empty buffer of `size` messages (the same if 0).
+
+        With `keep`, the messages are kept too, to :meth:`save` them.
+        """
+        # No message recorded in the buffers while they are replaced
+        self.active = False
+        self.allocate(size or self.size)
+        self.keep = keep
+        self.started = time.monotonic()
+        self.active = True
+
+    def stop(self):
+        """Stop recording, the messages recorded are kept until the next start."""
+        self.active = False
+
+    def record(self, source, channel, msg, size):
+        """Record one message, just received (asyncio thread).
+
+        Parameters
+        ----------
+        source : :obj:`JupyterMessenger`
+            The client which received it, named in the trace.
+        channel : int
+            Index of the channel in :data:`CHANNELS`.
+        msg : dict
+            The message, deserialized.
+        size : int
+            Bytes of its frames on the wire.
+        """
+        msg_type = msg['header']['msg_type']
+        if msg_type == 'status':
+            # The state, not the type, tells a slice starts or ends
+            msg_type = msg['content'].get('execution_state', msg_type)
+        i_msg = self.count % self.size
+        self.times[i_msg] = time.monotonic()
+        self.sizes[i_msg] = size
+        self.channels[i_msg] = channel
+        self.sources[i_msg] = source
+        self.msg_types[i_msg] = msg_type
+        self.parents[i_msg] = msg['parent_header'].get('msg_id')
+        if self.keep:
+            self.msgs[i_msg] = msg
+        self.count += 1
+
+    def messages(self):
+        """Iterate over the messages kept, oldest first.
+
+        Yields
+        ------
+        (float, int, int, :obj:`JupyterMessenger`, str, str)
+            Time, size, channel, source, msg_type (or execution state) and
+            parent msg_id.
+        """
+        first = max(0, self.count - self.size)
+        for i_count in range(first, self.count):
+            i_msg = i_count % self.size
+            yield (self.times[i_msg], self.sizes[i_msg], self.channels[i_msg],
+                   self.sources[i_msg], self.msg_types[i_msg], self.parents[i_msg])
+
+    def to_events(self, name_of):
+        """Convert the messages kept to trace events.
+
+        Parameters
+        ----------
+        name_of : callable
+            Name of a source in the trace, i.e. the kernel id of a client.
+
+        Returns
+        -------
+        list of dict
+            Chrome Trace Events, times in microseconds since the start.
+        """
+        events = list()
+        pids = dict()
+        busy = dict()   # (pid, parent) -> start of the execution, us
+        for when, size, channel, source, msg_type, parent in self.messages():
+            if source not in pids:
+                pid = pids[source] = len(pids) + 1
+                events.append({'name': 'process_name', 'ph': 'M', 'pid': pid,
+                               'args': {'name': f'kernel {name_of(source)}'}})
+                events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+                               'args': {'name': 'busy'}})
+                for tid, channel_name in enumerate(CHANNELS, 1):
+                    events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                                   'tid': tid, 'args': {'name': channel_name}})
+            pid = pids[source]
+            ts_us = 1e6 * (when - self.started)
+            events.append({'name': msg_type, 'cat': CHANNELS[channel], 'ph': 'i', 's': 't',
+                           'ts': ts_us, 'pid': pid, 'tid': channel + 1,
+                           'args': {'parent': parent, 'size': size}})
+            if msg_type == 'busy':
+                busy[pid, parent] = ts_us
+            elif msg_type == 'idle' and (pid, parent) in busy:
+                start = busy.pop((pid, parent))
+                events.append({'name': 'execute', 'ph': 'X', 'ts': start, 'dur': ts_us - start,
+                               'pid': pid, 'tid': 0, 'args': {'parent': parent}})
+        return events
+
+    def export(self, filename, name_of=str):
+        """Write the messages kept in `filename`, as Chrome Trace Event json.
+
+        Returns
+        -------
+        int
+            Number of messages written.
+        """
+        events = self.to_events(name_of)
+        with open(filename, 'w', encoding='utf-8') as f_json:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms',
+                       'otherData': {'recorded': self.count, 'kept': min(self.count, self.size),
+                                     'pid': os.getpid()}}, f_json)
+        return min(self.count, self.size)
+
+    def to_requests(self):
+        """Group the messages kept by the request which caused them.
+
+        The requests of the kernel infos (with `user_expressions`), which the
+        replay kernel answers itself, are left out.
+
+        Returns
+        -------
+        (dict, list of dict)
+            Content of the last kernel_info_reply (None if none), and each
+            request: `msg_type`, `channel`, `code` (from its `execute_input`,
+            None if silent) and `replies`, the [delay, channel, msg_type,
+            content, metadata] of each message it caused, the delay in seconds
+            since the request.
+        """
+        kernel_info = None
+        requests = dict()   # parent msg_id -> request, in order
+        first = max(0, self.count - self.size)
+        for i_count in range(first, self.count):
+            i_msg = i_count % self.size
+            msg = self.msgs[i_msg]
+            parent = msg['parent_header'] if msg is not None else {}
+            if not parent.get('msg_id'):
+                continue
+            channel = CHANNELS[self.channels[i_msg]]
+            request = requests.setdefault(parent['msg_id'], {
+                'msg_type': parent.get('msg_type', ''), 'channel': 'shell', 'code': None,
+                'replies': [], 'first': self.times[i_msg], 'date': parent.get('date')})
+
+            # Delay from the dates of the headers, or from the first reply
+            delay = self.times[i_msg] - request['first']
+            date = msg['header'].get('date')
+            if hasattr(date, 'timestamp') and hasattr(request['date'], 'timestamp'):
+                delay = max(0, date.timestamp() - request['date'].timestamp())
+
+            msg_type = msg['header']['msg_type']
+            if msg_type.endswith('_reply'):
+                request['channel'] = channel
+            if msg_type == 'kernel_info_reply':
+                kernel_info = msg['content']
+            if msg_type == 'execute_input':
+                request['code'] = msg['content'].get('code')
+            request['replies'].append(
+                [delay, channel, msg_type, msg['content'], msg.get('metadata', {})])
+
+        kept = list()
+        for request in requests.values():
+            del request['first'], request['date']
+            user_expressions = [reply[3].get('user_expressions') for reply in request['replies']
+                                if reply[2] == 'execute_reply']
+            if any(user_expressions):
+                continue
+            request['replies'].sort(key=lambda reply: reply[0])
+            kept.append(request)
+        return kernel_info, kept
+
+    def save(self, filename):
+        """Save the messages kept as a recording, see :func:`save_recording`.
+
+        Returns
+        -------
+        int
+            Number of requests saved.
+        """
+        kernel_info, requests = self.to_requests()
+        save_recording(filename, kernel_info, requests)
+        return len(requests)
+
+
+def save_recording(filename, kernel_info, requests):
+    """Write a recording: gzipped json lines, see :meth:`TraceRecorder.to_requests`."""
+    with gzip.open(filename, 'wt', encoding='utf-8') as f_rec:
+        f_rec.write(json.dumps({'format': 'jupyter-vim-recording', 'version': 1,
+                                'kernel_info': kernel_info}, default=str) + '\n')
+        for request in requests:
+            f_rec.write(json.dumps(request, separators=(',', ':'), default=str) + '\n')
+
+
+def load_recording(filename):
+    """Read a recording written by :func:`save_recording`.
+
+    Returns
+    -------
+    (dict, list of dict)
+        The kernel_info_reply content (None if not recorded) and the requests.
+    """
+    with gzip.open(filename, 'rt', encoding='utf-8') as f_rec:
+        header = json.loads(f_rec.readline())
+        if header.get('format') != 'jupyter-vim-recording':
+            raise ValueError(f'{filename} is not a jupyter-vim recording')
+        return header['kernel_info'], [json.loads(line) for line in f_rec if line.strip()]
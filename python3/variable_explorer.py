@@ -0,0 +1,195 @@
+"""
+Sidebar listing the variables of the kernel, see `:JupyterVariables`.
+
+After each execution (its `execute_input` then `idle` on iopub, from any
+client), the snapshot hook of the language (`Language.variables`) returns
+the variables changed since the last call only. Their rows are edited in
+place in the buffer, sorted by name: the other rows are left untouched.
+A changed row is only written once it is shown in a window of the buffer,
+until then it is dirty: scrolling writes the dirty rows that come into view.
+"""
+
+# Standard
+import asyncio
+import bisect
+import json
+from queue import Queue
+
+# Process local (only the sidebar needs it, see test/benchmark/variables.py)
+try:
+    import vim
+except ImportError:
+    vim = None
+
+# Export only
+__all__ = ['VariableExplorer', 'format_row']
+
+HEADER = '{:<24s} {:<16s} {:>14s} {:>10s}'.format('Name', 'Type', 'Shape', 'Size')
+
+
+def format_size(n_bytes):
+    """Format a size in bytes: `512 B`, `1.5 kB`, `12.0 MB`."""
+    for unit in ('B', 'kB', 'MB', 'GB'):
+        if n_bytes < 1024 or unit == 'GB':
+            return f'{n_bytes:d} B' if unit == 'B' else f'{n_bytes:.1f} {unit}'
+        n_bytes /= 1024
+    return ''
+
+
+def format_row(name, type_name, shape, size):
+    """Format the row of a variable, as the columns of `HEADER`."""
+    return f'{name:<24s} {type_name:<16s} {shape:>14s} {format_size(size):>10s}'
+
+
+class VariableExplorer():
+    """The `__jupyter_variables__` sidebar of a kernel.
+
+    Parameters
+    ----------
+    kernel_client : :obj:`JupyterMessenger`
+        The client of the kernel.
+
+    Attributes
+    ----------
+    names : list of str
+        The names of the variables, sorted as the rows of the buffer.
+    diffs : :obj:`Queue`
+        The (full, diff) of the snapshot hook, to write from vim's thread.
+    dirty : dict
+        The rows changed but not written yet, by name: not shown.
+    """
+    def __init__(self, kernel_client):
+        self.kernel_client = kernel_client
+        self.names = list()
+        self.diffs = Queue()
+        self.dirty = dict()
+        self.bufnr = int(vim.eval('jupyter#variables#Open()'))
+        vim.buffers[self.bufnr][:] = [HEADER]
+        vim.buffers[self.bufnr].vars['jupyter_variables_dirty'] = 0
+        self.task = asyncio.run_coroutine_threadsafe(self.watch(), kernel_client.loop)
+
+    @staticmethod
+    def accept(msg):
+        """Keep the messages marking an execution (asyncio thread)."""
+        msg_type = msg['header']['msg_type']
+        return msg_type == 'execute_input' or (
+            msg_type == 'status' and msg['content'].get('execution_state') == 'idle')
+
+    async def watch(self):
+        """Refresh after each execution, until stopped."""
+        # Only two messages per execution are queued, even under a flood
+        sub = self.kernel_client.router.subscribe('iopub', accept=self.accept)
+        running = set()
+        try:
+            await self.refresh(full=True)
+            while True:
+                msg = await sub.get()
+                parent = msg['parent_header'].get('msg_id')
+                if msg['header']['msg_type'] == 'execute_input':
+                    running.add(parent)
+                    continue
+                if parent not in running:
+                    continue
+                running.discard(parent)
+                # Once for the executions that ended meanwhile
+                if not any(queued['header']['msg_type'] == 'status' and
+                           queued['parent_header'].get('msg_id') in running
+                           for queued in sub.queue):
+                    await self.refresh()
+        finally:
+            sub.close()
+
+    async def refresh(self, full=False):
+        """Get the variables changed from the snapshot hook (asyncio thread).
+
+        Parameters
+        ----------
+        full : bool, optional, default=False
+            Define the hook first: all the variables are then changed. Done
+            again if the hook is missing, i.e. after a restart of the kernel.
+        """
+        lang = self.kernel_client.lang
+        try:
+            text = await self.kernel_client.evaluate(lang.variables if full else '',
+                                                     lang.variables_diff)
+        except RuntimeError as err:
+            if not full:
+                await self.refresh(full=True)
+                return
+            self.kernel_client.thread_echom(f'JupyterVariables: {err}', style='Error')
+            return
+        self.diffs.put((full, json.loads(text)))
+        self.kernel_client.waker.wake()
+
+    def stop(self):
+        """Stop refreshing."""
+        self.task.cancel()
+
+    def write_rows(self):
+        """Apply the diffs of the snapshot hook to the buffer.
+
+        The rows of the new variables are inserted, those of the deleted ones
+        removed, the changed ones only marked dirty: see :meth:`show_rows`.
+
+        .. note:: called by :meth:`JupyterVimSession.drain`.
+        """
+        if self.diffs.empty():
+            return
+        if self.bufnr not in vim.buffers:
+            return
+        buf = vim.buffers[self.bufnr]
+        while not self.diffs.empty():
+            full, diff = self.diffs.get_nowait()
+            if full:
+                self.names = list()
+                self.dirty = dict()
+                del buf[1:]
+            for name in diff['deleted']:
+                i_name = bisect.bisect_left(self.names, name)
+                if i_name < len(self.names) and self.names[i_name] == name:
+                    del self.names[i_name]
+                    del buf[i_name + 1]
+                    self.dirty.pop(name, None)
+            added = list()
+            for name, *fields in diff['changed']:
+                row = format_row(name, *fields)
+                i_name = bisect.bisect_left(self.names, name)
+                if i_name < len(self.names) and self.names[i_name] == name:
+                    self.dirty[name] = row
+                else:
+                    added.append((name, row))
+            # Many rows: write them at once, the dirty ones too
+            if len(added) > max(100, len(self.names) // 2):
+                rows = dict(zip(self.names, buf[1:]))
+                rows.update(self.dirty)
+                rows.update(added)
+                self.dirty = dict()
+                self.names = sorted(rows)
+                buf[1:] = [rows[name] for name in self.names]
+                continue
+            for name, row in added:
+                i_name = bisect.bisect_left(self.names, name)
+                self.names.insert(i_name, name)
+                buf[i_name + 1:i_name + 1] = [row]
+        buf.vars['jupyter_variables_count'] = len(self.names)
+        self.show_rows()
+
+    def show_rows(self):
+        """Write the dirty rows shown in the windows of the buffer.
+
+        .. note:: called by :meth:`write_rows`, and by
+                  :meth:`JupyterVimSession.show_variables` when the sidebar
+                  scrolled.
+        """
+        if self.bufnr not in vim.buffers:
+            return
+        buf = vim.buffers[self.bufnr]
+        if self.dirty:
+            # The first and last lines of each window, 1-based: rows from the 2nd
+            for first, last in vim.eval(f'jupyter#variables#Visible({self.bufnr:d})'):
+                for i_name in range(max(0, int(first) - 2),
+                                    min(len(self.names), int(last) - 1)):
+                    row = self.dirty.pop(self.names[i_name], None)
+                    if row is not None:
+                        buf[i_name + 1] = row
+        buf.vars['jupyter_variables_dirty'] = int(bool(self.dirty))
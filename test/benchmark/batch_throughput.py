@@ -0,0 +1,108 @@
+"""
+Throughput of running a batch of cells against a local kernel.
+
+Runs N cells sequentially (send one, await its reply, send the next, as
+`:JupyterSendCell` repeated N times would) then pipelined (send them all
+back-to-back, await the replies after, as `:JupyterSendAllCells` does) and
+reports the cells per second of each. The last run checks that the cells after
+a failing one are aborted, as `stop_on_error` requires.
+
+Needs `jupyter_client` and `ipykernel` (no vim):
+    $ python3 test/benchmark/batch_throughput.py -n 10 100 1000
+"""
+
+# Standard
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Py module
+from jupyter_client import AsyncKernelManager
+
+sys.path.insert(0, os.path.dirname(__file__))
+from kernel_throughput import listen  # noqa: E402  pylint: disable=wrong-import-position
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'python3'))
+from jupyter_router import MessageRouter  # noqa: E402  pylint: disable=wrong-import-position
+
+
+def cell_code(i_cell):
+    """A small cell, with an output like most cells have."""
+    return f'x_{i_cell} = {i_cell} * 2\nx_{i_cell}'
+
+
+async def sequential(client, router, cells):
+    """Await the reply of each cell before sending the next one."""
+    statuses = []
+    for code in cells:
+        msg_id = client.execute(code, allow_stdin=False, stop_on_error=True)
+        reply = await router.subscribe('shell', msg_id).get_once()
+        statuses.append(reply['content']['status'])
+    return statuses
+
+
+async def pipelined(client, router, cells):
+    """Same as JupyterMessenger._run_batch: send all the cells, then await."""
+    replies = []
+    for code in cells:
+        msg_id = client.execute(code, allow_stdin=False, stop_on_error=True)
+        replies.append(router.subscribe('shell', msg_id).get_once())
+        await asyncio.sleep(0)
+    return [reply['content']['status'] for reply in await asyncio.gather(*replies)]
+
+
+async def run(n_cells_list, kernel_name):
+    """Start a kernel and time both ways of running each batch of cells."""
+    kernel_manager = AsyncKernelManager(kernel_name=kernel_name)
+    await kernel_manager.start_kernel()
+    client = kernel_manager.client()
+    client.start_channels()
+    await client.wait_for_ready(timeout=60)
+
+    router = MessageRouter(asyncio.get_running_loop())
+    listeners = [asyncio.create_task(listen(client, router, channel))
+                 for channel in ('shell', 'iopub')]
+
+    try:
+        for n_cells in n_cells_list:
+            cells = [cell_code(i) for i in range(n_cells)]
+            rates = {}
+            for send in (sequential, pipelined):
+                start = time.perf_counter()
+                statuses = await send(client, router, cells)
+                elapsed = time.perf_counter() - start
+                assert statuses == ['ok'] * n_cells, statuses
+                rates[send.__name__] = n_cells / elapsed
+            print(f'{n_cells:>6d} cells: '
+                  f'sequential {rates["sequential"]:8.1f} cells/s, '
+                  f'pipelined {rates["pipelined"]:8.1f} cells/s '
+                  f'(x{rates["pipelined"] / rates["sequential"]:.1f})')
+
+        # Stop on error: the cells after the failing one must not run
+        cells = ['1', 'raise ValueError', '2', '3']
+        statuses = await pipelined(client, router, cells)
+        assert statuses == ['ok', 'error', 'aborted', 'aborted'], statuses
+        assert not router.routes['shell'], 'unclaimed subscriptions'
+        print(f'stop on error: {statuses}')
+    finally:
+        for task in listeners:
+            task.cancel()
+        client.stop_channels()
+        await kernel_manager.shutdown_kernel(now=True)
+
+
+def main():
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', dest='n_cells', type=int, nargs='+',
+                        default=[10, 100, 1000],
+                        help='number of cells in the batch')
+    parser.add_argument('--kernel', default='python3', help='kernel name')
+    args = parser.parse_args()
+    asyncio.run(run(args.n_cells, args.kernel))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Stalls of vim's python while the kernel floods its output, in-process vs bridge.
+
+The main thread stands for vim: every frame (`--frame` ms) it runs a short
+python step, as vim does when a command or callback calls into python, and
+records how late the step completes. Meanwhile the kernel prints `--mb` MB,
+flushed every `--chunk` kB:
+    in-process: the kernel client decodes every message in a thread of this
+                process, competing for the GIL with the frames (`g:jupyter_bridge=0`)
+    bridge: it does in python3/jupyter_bridge.py, this process only reads the
+            events vim would display (`g:jupyter_bridge=1`)
+
+Needs `jupyter_client` and `ipykernel` (no vim):
+    $ python3 test/benchmark/bridge_stalls.py --mb 100
+"""
+
+# Standard
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+# Py module
+from jupyter_client import KernelManager
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'python3'))
+from jupyter_bridge import Bridge  # noqa: E402  pylint: disable=wrong-import-position
+
+HOOKS = ('', '', '', '')
+
+
+def flood_code(n_mb, chunk_kb):
+    """Code printing `n_mb` MB in lines of 1 kB, flushed every `chunk_kb` kB."""
+    return ("import sys\n"
+            f"chunk = ('x' * 1023 + '\\n') * {chunk_kb}\n"
+            f"for _ in range({n_mb} * 1024 // {chunk_kb}):\n"
+            "    sys.stdout.write(chunk)\n"
+            "    sys.stdout.flush()")
+
+
+def measure_frames(done, frame, duration=0):
+    """Run frames until `done` is set and for `duration` s at least.
+
+    Returns
+    -------
+    list of float
+        How late each frame completed (s).
+    """
+    late = []
+    stop = time.perf_counter() + duration
+    while not done.is_set() or time.perf_counter() < stop:
+        start = time.perf_counter()
+        time.sleep(frame)
+        sum(range(1000))  # The python step of the frame
+        late.append(time.perf_counter() - start - frame)
+    return late
+
+
+def run_in_process(connection_file, code, frame, duration):
+    """Kernel client in a thread of this process, as without bridge.
+
+    Done when the kernel is idle again, after the client decoded all output.
+    """
+    bridge = Bridge(stdin=io.StringIO(), stdout=io.StringIO())
+    kernel = bridge.kernel
+    kernel.connect('python', connection_file)
+    while not kernel.kernel_info.get('pid'):
+        time.sleep(0.05)
+
+    done = threading.Event()
+
+    async def subscribe():
+        return kernel.router.subscribe('iopub')
+
+    async def wait_idle(outputs, future):
+        msg_id = (await asyncio.wrap_future(future))[0][0]
+        while True:
+            msg = await outputs.get()
+            if msg['parent_header'].get('msg_id') == msg_id \
+                    and msg['header']['msg_type'] == 'status' \
+                    and msg['content']['execution_state'] == 'idle':
+                break
+        outputs.close()
+        done.set()
+
+    outputs = asyncio.run_coroutine_threadsafe(subscribe(), kernel.loop).result()
+    future = kernel.run_batch([('flood', code)], HOOKS)
+    asyncio.run_coroutine_threadsafe(wait_idle(outputs, future), kernel.loop)
+    late = measure_frames(done, frame, duration)
+    kernel.close()
+    return late, future.result()
+
+
+def run_bridge(connection_file, code, frame, duration):
+    """Kernel client in the bridge process, this process reads its events."""
+    script = os.path.join(os.path.dirname(__file__), '..', '..', 'python3', 'jupyter_bridge.py')
+    proc = subprocess.Popen([sys.executable, script], text=True,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    connected = threading.Event()
+    done = threading.Event()
+    result = []
+
+    def read_events():
+        """As the channel callback of vim: decode what the bridge sends."""
+        for line in proc.stdout:
+            msg_id, msg = json.loads(line)
+            if msg_id or msg['event'] == 'echom':
+                continue
+            if msg['event'] == 'kernel_info':
+                connected.set()
+            elif msg['event'] == 'batch':
+                result.extend(msg['result'])
+                done.set()
+    threading.Thread(target=read_events, daemon=True).start()
+
+    def request(msg_id, **params):
+        proc.stdin.write(json.dumps([msg_id, params]) + '\n')
+        proc.stdin.flush()
+
+    request(1, op='connect', kernel_type='python', filename=connection_file)
+    connected.wait(30)
+    request(2, op='run_batch', batch_id=1, batch=[('flood', code)], hooks=HOOKS)
+    late = measure_frames(done, frame, duration)
+    request(3, op='disconnect')
+    proc.wait(10)
+    return late, [tuple(block) for block in result]
+
+
+def report(mode, late, result, frame):
+    """Print the lateness of the frames."""
+    assert result and result[0][1] == 'ok', result
+    late_ms = sorted(1000 * x for x in late)
+    p99 = late_ms[int(0.99 * (len(late_ms) - 1))]
+    stalls = sum(1 for x in late_ms if x > 16)
+    print(f'{mode:>10s}: {len(late_ms):6d} frames of {1000 * frame:.0f} ms, '
+          f'late by median {statistics.median(late_ms):6.2f} ms, '
+          f'p99 {p99:7.2f} ms, max {late_ms[-1]:7.2f} ms, '
+          f'{stalls:d} stalls > 16 ms')
+
+
+def main():
+    """Parse arguments, start a kernel and run the benchmark in both modes."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mb', type=int, default=100, help='MB printed by the kernel')
+    parser.add_argument('--chunk', type=int, default=16, help='kB printed per flush')
+    parser.add_argument('--frame', type=float, default=5, help='ms between two frames')
+    parser.add_argument('--kernel', default='python3', help='kernel name')
+    args = parser.parse_args()
+
+    code = flood_code(args.mb, args.chunk)
+    frame = args.frame / 1000
+
+    kernel_manager = KernelManager(kernel_name=args.kernel)
+    kernel_manager.start_kernel()
+    try:
+        late, result = run_in_process(kernel_manager.connection_file, code, frame, 0)
+        report('in-process', late, result, frame)
+        # Same window for the bridge, which does not forward the output
+        duration = len(late) * frame + sum(late)
+        late, result = run_bridge(kernel_manager.connection_file, code, frame, duration)
+        report('bridge', late, result, frame)
+    finally:
+        kernel_manager.shutdown_kernel(now=True)
+
+
+if __name__ == '__main__':
+    main()
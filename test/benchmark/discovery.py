@@ -0,0 +1,84 @@
+"""
+Latency of the `:JupyterConnect` completion, and the dead kernels it offers.
+
+Fills a temporary runtime directory with `--dead` connection files of kernels
+that are gone (their ports closed) and one of a live kernel, then completes
+`--keys` times as while typing:
+    glob: glob and list every `kernel*.json`, as before the discovery cache
+    discovery: :obj:`KernelDiscovery`, probing the kernels with a heartbeat
+and reports the first and the median completion time, and the ids offered.
+
+Needs `jupyter_client` and `ipykernel` (no vim):
+    $ python3 test/benchmark/discovery.py --dead 100
+"""
+
+# Standard
+import argparse
+import json
+import os
+from pathlib import Path
+import statistics
+import sys
+import tempfile
+import time
+
+# Py module
+from jupyter_client import KernelManager
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'python3'))
+# pylint: disable=wrong-import-position
+from jupyter_util import match_kernel_id  # noqa: E402
+from kernel_discovery import KernelDiscovery  # noqa: E402
+
+
+def glob_ids(runtime_dir):
+    """The completion before the cache: every file, dead or alive."""
+    return [match_kernel_id(fpath) for fpath in Path(runtime_dir).glob('kernel*.json')]
+
+
+def measure(complete, n_keys):
+    """Complete `n_keys` times, return the ids and the time of each (s)."""
+    times = list()
+    for _ in range(n_keys):
+        start = time.perf_counter()
+        ids = complete()
+        times.append(time.perf_counter() - start)
+    return ids, times
+
+
+def main():
+    """Parse arguments, fill the runtime directory and complete with both."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--dead', type=int, default=100, help='connection files of dead kernels')
+    parser.add_argument('--keys', type=int, default=20, help='completions, as keystrokes')
+    parser.add_argument('--kernel', default='python3', help='kernelspec name')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as runtime_dir:
+        kernel_manager = KernelManager(
+            kernel_name=args.kernel, connection_file=os.path.join(runtime_dir, 'kernel-live.json'))
+        kernel_manager.start_kernel()
+        try:
+            kernel_manager.client().wait_for_ready(timeout=60)
+            with open(kernel_manager.connection_file, encoding='utf-8') as f_json:
+                info = json.load(f_json)
+            # Ports nobody listens on anymore, files of the last hour
+            for i_dead in range(args.dead):
+                path = os.path.join(runtime_dir, f'kernel-dead{i_dead}.json')
+                with open(path, 'w', encoding='utf-8') as f_json:
+                    json.dump(dict(info, hb_port=kernel_manager.hb_port + 1000 + i_dead), f_json)
+                os.utime(path, (time.time() - 3600,) * 2)
+
+            discovery = KernelDiscovery(runtime_dir)
+            for mode, complete in (('glob', lambda: glob_ids(runtime_dir)),
+                                   ('discovery', discovery.kernel_ids)):
+                ids, times = measure(complete, args.keys)
+                print(f'{mode:>9s}: first {1000 * times[0]:7.2f} ms, '
+                      f'median {1000 * statistics.median(times):7.3f} ms, '
+                      f'{len(ids):d} kernels offered ({ids.count("live"):d} live)')
+        finally:
+            kernel_manager.shutdown_kernel(now=True)
+
+
+if __name__ == '__main__':
+    main()
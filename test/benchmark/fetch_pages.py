@@ -0,0 +1,69 @@
+"""
+Large values printed vs paged by `:JupyterFetch`.
+
+For each size, the kernel holds a list of `-n` numbers, then:
+    print: prints it, the client receives the stream messages until idle
+    fetch: gets its first page of `g:jupyter_view_page_lines` lines, then
+           the next pages, as `:JupyterFetch` does while scrolling
+and reports the seconds of each and the bytes received through the sockets.
+The time of a page should not grow with the size of the value.
+
+Needs `jupyter_client` and `ipykernel` (no vim):
+    $ python3 test/benchmark/fetch_pages.py -n 1000 1000000 10000000
+"""
+
+# Standard
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', '..', 'python3'))
+# pylint: disable=wrong-import-position
+from replay import kernel_messenger, run, run_cell  # noqa: E402
+
+
+def through_print(messenger):
+    """Print the value, receive it. Return the seconds and bytes received."""
+    _, n_bytes, seconds = run(messenger, run_cell(messenger, 'print(data)'))
+    return seconds, n_bytes
+
+
+def through_fetch(messenger, page_lines, pages):
+    """Fetch the first page then `pages` more. Return the seconds of the first and of each next."""
+    start = time.perf_counter()
+    token, _, last = run(messenger, messenger.fetch('data', page_lines))
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    n_pages = 0
+    while not last and n_pages < pages:
+        _, last = run(messenger, messenger.fetch_page(token, page_lines))
+        n_pages += 1
+    run(messenger, messenger.fetch_page(token, 0))
+    return first, (time.perf_counter() - start) / max(n_pages, 1)
+
+
+def main():
+    """Parse arguments, start a kernel and compare both paths for each size."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', dest='sizes', type=int, nargs='+',
+                        default=[1000, 1000000, 10000000], help='numbers in the list')
+    parser.add_argument('--page-lines', type=int, default=1000,
+                        help='lines of a page, as g:jupyter_view_page_lines')
+    parser.add_argument('--pages', type=int, default=20, help='pages fetched after the first')
+    args = parser.parse_args()
+
+    with kernel_messenger() as messenger:
+        for size in args.sizes:
+            run(messenger, messenger.execute_timed(f'data = list(range({size}))',
+                                                   ('', '', '', '')))
+            printed, n_bytes = through_print(messenger)
+            first, page = through_fetch(messenger, args.page_lines, args.pages)
+            print(f'{size:>10d} items: print {1e3 * printed:9.1f} ms ({n_bytes / 2**20:6.1f} MB '
+                  f'received), fetch: first page {1e3 * first:6.1f} ms, '
+                  f'next {1e3 * page:6.1f} ms per page')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Time to first execute of `:JupyterStart`, with and without the kernel pool.
+
+Measures `-n` times the seconds from asking for a kernel to the reply of its
+first execute_request:
+    cold: the kernel is started then awaited, as without `g:jupyter_pool`
+    pool: an idle kernel is taken from a pool of one, refilled in the
+          background between two runs
+and reports the median and max of each.
+
+Needs `jupyter_client` and `ipykernel` (no vim):
+    $ python3 test/benchmark/kernel_pool.py -n 5
+"""
+
+# Standard
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'python3'))
+# pylint: disable=wrong-import-position
+from jupyter_messenger import KernelThread  # noqa: E402
+from kernel_pool import KernelPool  # noqa: E402
+
+
+async def first_execute(kernel_manager):
+    """Connect to a kernel started and await the reply of one execute_request."""
+    client = kernel_manager.client()
+    client.start_channels()
+    try:
+        msg_id = client.execute('1 + 1', allow_stdin=False)
+        while True:
+            reply = await client.get_shell_msg(timeout=30)
+            if reply['parent_header'].get('msg_id') == msg_id:
+                return reply['content']['status']
+    finally:
+        client.stop_channels()
+
+
+def run(pool, kernel_name, from_pool):
+    """Get a kernel and execute on it, return the seconds elapsed."""
+    start = time.perf_counter()
+    kernel_manager = pool.take(kernel_name) if from_pool else None
+    if kernel_manager is None:
+        kernel_manager = pool.start(kernel_name).result(60)
+    status = asyncio.run_coroutine_threadsafe(
+        first_execute(kernel_manager), pool.kernel_thread.loop).result(60)
+    elapsed = time.perf_counter() - start
+    assert status == 'ok', status
+    pool.shutdown([kernel_manager])
+    return elapsed
+
+
+def main():
+    """Parse arguments and measure without then with the pool."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', type=int, default=5, help='kernels per mode')
+    parser.add_argument('--kernel', default='python3', help='kernelspec name')
+    args = parser.parse_args()
+
+    kernel_thread = KernelThread()
+    kernel_thread.start()
+    pool = KernelPool(kernel_thread, {args.kernel: 1})
+    try:
+        for mode, from_pool in (('cold', False), ('pool', True)):
+            times = list()
+            for _ in range(args.n):
+                # Let the pool refill, as between two :JupyterStart
+                if from_pool:
+                    pool.fill()
+                    while not pool.idle[args.kernel]:
+                        time.sleep(0.05)
+                times.append(run(pool, args.kernel, from_pool))
+            print(f'{mode:>5s}: first execute after median {statistics.median(times):6.3f} s, '
+                  f'max {max(times):6.3f} s over {args.n:d} kernels')
+    finally:
+        # The last refill, started by the last take
+        while sum(pool.starting.values()):
+            time.sleep(0.05)
+        pool.shutdown()
+        kernel_thread.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Throughput of the reply router against a local kernel.
+
+Sends N execute_requests back-to-back, with up to `--window` of them in flight,
+awaits all their replies concurrently through a :obj:`MessageRouter` and reports
+the requests per second. Every reply must be delivered: the script fails if one
+is missing.
+
+Needs `jupyter_client` and `ipykernel` (no vim):
+    $ python3 test/benchmark/kernel_throughput.py -n 1000 5000
+"""
+
+# Standard
+import argparse
+import asyncio
+import os
+from queue import Empty
+import sys
+import time
+
+# Py module
+from jupyter_client import AsyncKernelManager
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'python3'))
+from jupyter_router import MessageRouter  # noqa: E402  pylint: disable=wrong-import-position
+
+
+async def listen(client, router, channel):
+    """Same as JupyterMessenger._listen_to_channel."""
+    get_msg = getattr(client, f'{channel}_channel').get_msg
+    while True:
+        try:
+            router.dispatch(channel, await get_msg(timeout=0.5))
+        except Empty:
+            continue
+
+
+async def run(n_requests_list, window, kernel_name):
+    """Start a kernel and time the round trip of each batch of requests."""
+    kernel_manager = AsyncKernelManager(kernel_name=kernel_name)
+    await kernel_manager.start_kernel()
+    client = kernel_manager.client()
+    client.start_channels()
+    await client.wait_for_ready(timeout=60)
+
+    router = MessageRouter(asyncio.get_running_loop())
+    listeners = [asyncio.create_task(listen(client, router, channel))
+                 for channel in ('shell', 'iopub')]
+    in_flight = asyncio.Semaphore(window)
+
+    async def request():
+        async with in_flight:
+            msg_id = client.execute('pass', silent=True, store_history=False)
+            return await router.subscribe('shell', msg_id).get_once()
+
+    try:
+        for n_requests in n_requests_list:
+            start = time.perf_counter()
+            replies = await asyncio.gather(*[request() for _ in range(n_requests)])
+            elapsed = time.perf_counter() - start
+
+            assert len(replies) == n_requests
+            assert all(reply['content']['status'] == 'ok' for reply in replies)
+            assert not router.routes['shell'], 'unclaimed subscriptions'
+            print(f'{n_requests:>7d} requests in {elapsed:7.3f} s: '
+                  f'{n_requests / elapsed:8.1f} req/s')
+    finally:
+        for task in listeners:
+            task.cancel()
+        client.stop_channels()
+        await kernel_manager.shutdown_kernel(now=True)
+
+
+def main():
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', dest='n_requests', type=int, nargs='+',
+                        default=[100, 1000, 5000],
+                        help='number of requests to send')
+    parser.add_argument('--window', type=int, default=500,
+                        help='maximum number of requests in flight at once')
+    parser.add_argument('--kernel', default='python3', help='kernel name')
+    args = parser.parse_args()
+    asyncio.run(run(args.n_requests, args.window, args.kernel))
+
+
+if __name__ == '__main__':
+    main()
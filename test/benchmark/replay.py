@@ -0,0 +1,181 @@
+"""
+Receive path of :obj:`JupyterMessenger` under load, against replay_kernel.py.
+
+For each load, starts the replay kernel on it, connects a messenger as the
+bridge process does (no vim) and runs the cell `-n` times, each until the
+kernel is idle:
+    flood:N    N stream messages of one line
+    payload:M  one stream message of M MB
+    slow:S     a cell running S seconds
+    <file>     the requests of a recording of :JupyterTraceSave, in order
+and reports the messages per second received and the latency of each cell,
+beyond the time the kernel itself took (the `slow` delay).
+
+Needs `jupyter_client` and `pyzmq` (no vim, no kernel):
+    $ python3 test/benchmark/replay.py flood:100000 payload:50 slow:0.5 -n 5
+"""
+
+# Standard
+import argparse
+import asyncio
+import contextlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PYTHON3 = os.path.join(HERE, '..', '..', 'python3')
+sys.path.insert(0, PYTHON3)
+# pylint: disable=wrong-import-position
+from jupyter_messenger import JupyterMessenger  # noqa: E402
+from trace_recorder import load_recording  # noqa: E402
+
+HOOKS = ('', '', '', '')
+
+
+class QuietWaker():
+    """Stand-in for :obj:`VimWaker`: no vim to wake up."""
+    def start(self):
+        """Nothing to connect."""
+
+    def stop(self):
+        """Nothing to close."""
+
+    def wake(self):
+        """Nothing to display."""
+
+
+def run(messenger, coroutine, timeout=600):
+    """Run a coroutine in the thread of the messenger, return its result."""
+    return asyncio.run_coroutine_threadsafe(coroutine, messenger.loop).result(timeout)
+
+
+@contextlib.contextmanager
+def kernel_messenger(kernel_name='python3', quiet=False):
+    """Start a kernel and connect a messenger to it, shut both down on exit.
+
+    Needs `ipykernel`, or the kernel of `kernel_name`.
+
+    Parameters
+    ----------
+    kernel_name : str, optional, default='python3'
+        Name of the kernelspec.
+    quiet : bool, optional, default=False
+        Drop the echom messages of the messenger, i.e. of `send_variable`.
+
+    Yields
+    ------
+    :obj:`JupyterMessenger`
+        The messenger, connected.
+    """
+    from jupyter_client import KernelManager  # pylint: disable=import-outside-toplevel
+    kernel = KernelManager(kernel_name=kernel_name)
+    kernel.start_kernel()
+    messenger = JupyterMessenger()
+    messenger.waker = QuietWaker()
+    if quiet:
+        messenger.thread_echom = lambda *args, **kwargs: None
+    try:
+        messenger.connect('python', kernel.connection_file)
+        while not messenger.check_connection():
+            time.sleep(0.05)
+        yield messenger
+    finally:
+        messenger.close()
+        kernel.shutdown_kernel(now=True)
+
+
+async def run_cell(messenger, code):
+    """Execute `code`, count its iopub messages until idle.
+
+    Returns
+    -------
+    (int, int, float)
+        Messages and bytes of stream text received, seconds until idle.
+    """
+    start = time.perf_counter()
+    msg_id = messenger.execute(code, hooks=HOOKS, allow_stdin=False)
+    outputs = messenger.router.subscribe('iopub', msg_id)
+    reply = messenger.get_reply(msg_id, 'shell')
+    n_msgs = n_bytes = 0
+    try:
+        while True:
+            msg = await outputs.get()
+            n_msgs += 1
+            if msg['header']['msg_type'] == 'stream':
+                n_bytes += len(msg['content']['text'])
+            elif msg['header']['msg_type'] == 'status' and \
+                    msg['content'].get('execution_state') == 'idle':
+                break
+        await reply
+    finally:
+        outputs.close()
+    return n_msgs, n_bytes, time.perf_counter() - start
+
+
+def codes_of(load):
+    """The cells to run for `load`, and the seconds the kernel takes on each."""
+    if os.path.exists(load):
+        _, requests = load_recording(load)
+        cells = [request for request in requests
+                 if request['msg_type'] == 'execute_request']
+        return [(cell['code'] or '', max([reply[0] for reply in cell['replies']], default=0))
+                for cell in cells]
+    kind, _, value = load.partition(':')
+    return [(load, float(value or 5) if kind == 'slow' else 0)]
+
+
+def bench(load, repeat, speed):
+    """Run the cells of `load` `repeat` times on a new replay kernel, print the results."""
+    with tempfile.TemporaryDirectory() as tmp:
+        connection_file = os.path.join(tmp, 'replay.json')
+        kernel = subprocess.Popen([sys.executable, os.path.join(PYTHON3, 'replay_kernel.py'),
+                                   load, '-f', connection_file, '--speed', str(speed)])
+        try:
+            while not os.path.exists(connection_file):
+                time.sleep(0.05)
+            time.sleep(0.1)   # Written, not yet closed
+            messenger = JupyterMessenger()
+            messenger.waker = QuietWaker()
+            messenger.connect('python', connection_file)
+            while not messenger.check_connection():
+                time.sleep(0.05)
+
+            codes = codes_of(load)
+            latencies = list()
+            n_msgs = elapsed = 0
+            for _ in range(repeat):
+                for code, kernel_time in codes:
+                    msgs, _, seconds = asyncio.run_coroutine_threadsafe(
+                        run_cell(messenger, code), messenger.loop).result(600)
+                    n_msgs += msgs
+                    elapsed += seconds
+                    latencies.append(seconds - kernel_time / (speed or float('inf')))
+            messenger.close()
+        finally:
+            kernel.terminate()
+            kernel.wait()
+
+    latencies.sort()
+    print(f'{load:>16s}: {n_msgs / elapsed:9.0f} msg/s, latency '
+          f'p50 {1e3 * latencies[len(latencies) // 2]:8.2f} ms, '
+          f'max {1e3 * latencies[-1]:8.2f} ms ({len(latencies)} cells)')
+
+
+def main():
+    """Parse arguments and run each load."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('loads', nargs='*', default=['flood:100000', 'payload:50', 'slow:0.5'],
+                        help='flood:N, payload:M, slow:S or a recording')
+    parser.add_argument('-n', dest='repeat', type=int, default=5, help='runs of each load')
+    parser.add_argument('--speed', type=float, default=1,
+                        help='divide the recorded delays, 0 for no delay')
+    args = parser.parse_args()
+    for load in args.loads:
+        bench(load, args.repeat, args.speed)
+
+
+if __name__ == '__main__':
+    main()
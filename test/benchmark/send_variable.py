@@ -0,0 +1,77 @@
+"""
+Bind a large text to a variable of the kernel: as code vs as a comm buffer.
+
+For each size, a csv file of `--mb` MB is bound to a variable:
+    execute: as the code `name = '...'`, what `:JupyterSendRange` of the
+             file amounts to: dedented, json escaped, parsed by the kernel
+    comm: as `:JupyterSendBufferAsVariable name file` does, mapped and sent
+          as the binary buffer of a `comm_open`
+and reports the seconds until the kernel replies and the throughput.
+
+Needs `jupyter_client` and `ipykernel` (no vim):
+    $ python3 test/benchmark/send_variable.py --mb 1 10 100
+"""
+
+# Standard
+import argparse
+import mmap
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', '..', 'python3'))
+# pylint: disable=wrong-import-position
+from replay import kernel_messenger, run  # noqa: E402
+
+
+def write_csv(filename, megabytes):
+    """Write a csv of about `megabytes` MB."""
+    line = '2024-01-01,label,0.123456,42,true\n'
+    with open(filename, 'w', encoding='utf-8') as f_csv:
+        f_csv.write(line * int(megabytes * 2**20 / len(line)))
+
+
+def through_execute(messenger, filename):
+    """Bind the text of the file as code, return the seconds."""
+    start = time.perf_counter()
+    with open(filename, encoding='utf-8') as f_csv:
+        code = f'data = {f_csv.read()!r}'
+    _, status, _ = run(messenger, messenger.execute_timed(code, ('', '', '', '')))
+    assert status == 'ok', status
+    return time.perf_counter() - start
+
+
+def through_comm(messenger, filename):
+    """Bind the file as a comm buffer, return the seconds."""
+    start = time.perf_counter()
+    with open(filename, 'rb') as f_csv:
+        data = mmap.mmap(f_csv.fileno(), 0, access=mmap.ACCESS_READ)
+    reply = messenger.send_variable('data', data).result(600)
+    assert reply['status'] == 'ok', reply
+    return time.perf_counter() - start
+
+
+def main():
+    """Parse arguments, start a kernel and compare both paths for each size."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mb', type=float, nargs='+', default=[1, 10, 100],
+                        help='sizes of the file in MB')
+    parser.add_argument('-n', dest='repeat', type=int, default=3, help='runs, the best is kept')
+    args = parser.parse_args()
+
+    with kernel_messenger(quiet=True) as messenger:
+        with tempfile.TemporaryDirectory() as tmp:
+            for megabytes in args.mb:
+                filename = os.path.join(tmp, f'{megabytes}.csv')
+                write_csv(filename, megabytes)
+                execute = min(through_execute(messenger, filename) for _ in range(args.repeat))
+                comm = min(through_comm(messenger, filename) for _ in range(args.repeat))
+                print(f'{megabytes:6.0f} MB: execute {1e3 * execute:9.1f} ms '
+                      f'({megabytes / execute:6.0f} MB/s), comm {1e3 * comm:8.1f} ms '
+                      f'({megabytes / comm:6.0f} MB/s), {execute / comm:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Decode throughput of the packers of `g:jupyter_session_packer`.
+
+Serializes large outputs as a kernel would, with each packer installed, then
+decodes them as the channel listener does (`Session.deserialize`):
+    dataframe: a `display_data` with the html and text reprs of a table
+    image: a `display_data` with a base64 png
+    stream: a `stream` of text lines
+or the messages of a recording of `:JupyterTraceSave` (`--recording`), and
+reports the MB per second decoded and the time per message of each packer.
+
+Needs `jupyter_client`, and orjson or msgpack to compare them (no vim, no
+kernel):
+    $ python3 test/benchmark/session_packer.py --mb 10
+    $ python3 test/benchmark/session_packer.py --recording session.jsonl.gz
+"""
+
+# Standard
+import argparse
+import base64
+import os
+import sys
+import time
+
+# Py module
+from jupyter_client.session import Session
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'python3'))
+# pylint: disable=wrong-import-position
+from session_packer import list_packers, set_packer  # noqa: E402
+from trace_recorder import load_recording  # noqa: E402
+
+KEY = b'benchmark'
+
+
+def dataframe(megabytes):
+    """The display_data of a DataFrame of about `megabytes` MB (html and text)."""
+    n_rows = max(1, int(megabytes * 2**20 / 120))
+    html = ''.join(f'<tr><th>{i}</th><td>{i * 0.5:.3f}</td><td>label_{i % 97}</td>'
+                   f'<td>2024-01-{i % 28 + 1:02d}</td></tr>\n' for i in range(n_rows))
+    text = ''.join(f'{i:>8d}  {i * 0.5:12.3f}  label_{i % 97:<3d}  2024-01-{i % 28 + 1:02d}\n'
+                   for i in range(n_rows))
+    return 'display_data', {'data': {'text/html': f'<table>{html}</table>', 'text/plain': text},
+                            'metadata': {}, 'transient': {}}
+
+
+def image(megabytes):
+    """The display_data of a png of about `megabytes` MB, base64 encoded."""
+    png = os.urandom(int(megabytes * 2**20 * 3 / 4))
+    return 'display_data', {'data': {'image/png': base64.b64encode(png).decode(),
+                                     'text/plain': '<Figure size 640x480 with 1 Axes>'},
+                            'metadata': {}, 'transient': {}}
+
+
+def stream(megabytes):
+    """A stream message of about `megabytes` MB of lines."""
+    line = 'epoch 12/100 loss=0.123456 accuracy=0.987654\n'
+    return 'stream', {'name': 'stdout', 'text': line * int(megabytes * 2**20 / len(line))}
+
+
+def recorded(filename):
+    """The (msg_type, content) of the messages of a recording."""
+    _, requests = load_recording(filename)
+    return [(msg_type, content) for request in requests
+            for _, _, msg_type, content, _ in request['replies']]
+
+
+def decode(packer, frames):
+    """Deserialize every message, return the seconds elapsed."""
+    # A new session each time: a session rejects the signatures it saw
+    session = Session(key=KEY)
+    set_packer(session, packer)
+    start = time.perf_counter()
+    for msg_frames in frames:
+        session.deserialize(session.feed_identities(msg_frames)[1])
+    return time.perf_counter() - start
+
+
+def bench(name, msgs, packers, repeat):
+    """Encode `msgs` with each packer, print the decode throughput of each."""
+    for packer in packers:
+        session = Session(key=KEY)
+        set_packer(session, packer)
+        frames = [session.serialize(session.msg(msg_type, content)) for msg_type, content in msgs]
+        n_bytes = sum(len(frame) for msg_frames in frames for frame in msg_frames)
+        elapsed = min(decode(packer, frames) for _ in range(repeat))
+        print(f'{name:>10s} {packer:>8s}: {n_bytes / 2**20 / elapsed:8.1f} MB/s, '
+              f'{1e3 * elapsed / len(frames):8.2f} ms/msg, {n_bytes / 2**20:7.2f} MB on the wire')
+
+
+def main():
+    """Parse arguments and compare the packers on each payload."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mb', type=float, default=10, help='size of each payload in MB')
+    parser.add_argument('--recording', help='file saved by :JupyterTraceSave, instead')
+    parser.add_argument('-n', dest='repeat', type=int, default=5, help='runs, the best is kept')
+    args = parser.parse_args()
+
+    packers = list_packers()
+    if args.recording:
+        bench(os.path.basename(args.recording)[:10], recorded(args.recording), packers,
+              args.repeat)
+        return
+    for make in (dataframe, image, stream):
+        bench(make.__name__, [make(args.mb)], packers, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
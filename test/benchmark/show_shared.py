@@ -0,0 +1,75 @@
+"""
+Large outputs through the sockets vs through a shared file (`:JupyterShow`).
+
+For each size, the kernel holds a text of `--mb` MB, then:
+    stream: prints it, the client receives the stream messages until idle,
+            as the monitor would
+    shared: writes it to a file (`Language.share`), the client maps it and
+            reads the first page of `g:jupyter_view_page_lines`, as
+            `:JupyterShow` does; then all the pages, to compare the same work
+and reports the seconds of each and the bytes received through the sockets.
+
+Needs `jupyter_client` and `ipykernel` (no vim):
+    $ python3 test/benchmark/show_shared.py --mb 1 10 100
+"""
+
+# Standard
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', '..', 'python3'))
+# pylint: disable=wrong-import-position
+from scratch_view import MappedText  # noqa: E402
+from replay import kernel_messenger, run, run_cell  # noqa: E402
+
+
+def through_stream(messenger):
+    """Print the text, receive it. Return the seconds and bytes received."""
+    _, n_bytes, seconds = run(messenger, run_cell(
+        messenger, 'import sys; sys.stdout.write(text); sys.stdout.flush()'))
+    return seconds, n_bytes
+
+
+def through_file(messenger, page_lines, pages=1):
+    """Share the text, map it and read `pages` pages (all if 0). Return the seconds."""
+    start = time.perf_counter()
+    path, _ = run(messenger, messenger.share('text'))
+    source = MappedText(path)
+    while not source.done and pages != 1:
+        source.read_lines(page_lines)
+        pages -= 1
+    source.read_lines(page_lines)
+    seconds = time.perf_counter() - start
+    source.close()
+    return seconds
+
+
+def main():
+    """Parse arguments, start a kernel and compare both paths for each size."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mb', type=float, nargs='+', default=[1, 10, 100],
+                        help='sizes of the text in MB')
+    parser.add_argument('--page-lines', type=int, default=1000,
+                        help='lines of a page, as g:jupyter_view_page_lines')
+    parser.add_argument('-n', dest='repeat', type=int, default=3, help='runs, the best is kept')
+    args = parser.parse_args()
+
+    with kernel_messenger() as messenger:
+        for megabytes in args.mb:
+            run(messenger, messenger.execute_timed(
+                f"text = ('x' * 79 + '\\n') * {int(megabytes * 2**20 / 80)}",
+                ('', '', '', '')))
+            stream = min(through_stream(messenger) for _ in range(args.repeat))
+            first = min(through_file(messenger, args.page_lines) for _ in range(args.repeat))
+            full = min(through_file(messenger, args.page_lines, pages=0)
+                       for _ in range(args.repeat))
+            print(f'{megabytes:6.0f} MB: stream {1e3 * stream[0]:9.1f} ms '
+                  f'({stream[1] / 2**20:.1f} MB received), shared: first page '
+                  f'{1e3 * first:7.1f} ms, all pages {1e3 * full:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
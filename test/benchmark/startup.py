@@ -0,0 +1,83 @@
+"""
+Vim startup time with jupyter-vim, and cost of its first command.
+
+Runs `vim --startuptime` `-n` times on a python file, with a minimal vimrc
+loading only this plugin:
+    open: vim starts and quits, jupyter-vim must not run any python
+    first command: vim runs `:JupyterNextCell` before quitting, which
+                   initializes python and imports jupyter_vim, but not
+                   jupyter_client nor asyncio (loaded by `:JupyterConnect`)
+and reports the median time until vim quits.
+
+Needs a vim with `+python3` and `jupyter` in its python (no kernel):
+    $ python3 test/benchmark/startup.py -n 20
+"""
+
+# Standard
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+VIMRC = f"""\
+set nocompatible
+let &runtimepath = '{ROOT},' . &runtimepath
+filetype plugin on
+syntax on
+"""
+
+SCENARIOS = (
+    ('open', []),
+    ('first command', ['-c', 'JupyterNextCell']),
+)
+
+
+def startup_ms(vim, vimrc, filename, args, log):
+    """Run vim once, return the time until it quits in ms."""
+    if os.path.exists(log):
+        os.remove(log)
+    subprocess.run([vim, '--not-a-term', '--startuptime', log, '-Nu', vimrc, '-i', 'NONE',
+                    *args, '-c', 'qa!', filename],
+                   check=True, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+    # `-c qa!` quits before `VIM STARTED`: take the last clock logged
+    with open(log, encoding='utf-8') as f_log:
+        clocks = [float(line.split()[0]) for line in f_log if line[:1].isdigit()]
+    if not clocks:
+        raise RuntimeError(f'nothing logged in {log}')
+    return clocks[-1]
+
+
+def main():
+    """Parse arguments, run vim in each scenario and print the medians."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', type=int, default=20, help='runs per scenario')
+    parser.add_argument('--vim', default='vim', help='vim executable')
+    args = parser.parse_args()
+
+    has_python = subprocess.run(
+        [args.vim, '--not-a-term', '-Nu', 'NONE', '-es', '-c', 'if !has("python3") | cquit | endif',
+         '-c', 'qa!'], check=False, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL).returncode
+    if has_python != 0:
+        sys.exit(f'{args.vim} has no +python3: jupyter-vim would not load')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vimrc = os.path.join(tmp, 'vimrc')
+        with open(vimrc, 'w', encoding='utf-8') as f_vimrc:
+            f_vimrc.write(VIMRC)
+        filename = os.path.join(tmp, 'cells.py')
+        with open(filename, 'w', encoding='utf-8') as f_py:
+            f_py.write('## Cell 1\nx = 1\n## Cell 2\nprint(x)\n')
+        log = os.path.join(tmp, 'startuptime.log')
+
+        for name, vim_args in SCENARIOS:
+            times = [startup_ms(args.vim, vimrc, filename, vim_args, log) for _ in range(args.n)]
+            print(f'{name:>14s}: median {statistics.median(times):7.1f} ms, '
+                  f'min {min(times):7.1f} ms over {args.n:d} runs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Throughput of the stream coalescer of the monitor on an output flood.
+
+Feeds the `stream` messages of `for i in range(N): print(i)` (one message per
+line, the worst case) to a :obj:`StreamCoalescer` while flushing it as vim
+would every `--interval` ms, and reports the messages per second, the lines
+displayed and dropped.
+
+Needs nothing but python (no vim, no kernel):
+    $ python3 test/benchmark/stream_flood.py -n 1000000
+"""
+
+# Standard
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'python3'))
+from stream_coalescer import StreamCoalescer  # noqa: E402  pylint: disable=wrong-import-position
+
+
+def stream_msg(text):
+    """A minimal iopub stream message."""
+    return {'header': {'msg_type': 'stream'}, 'parent_header': {'msg_id': 'flood'},
+            'content': {'name': 'stdout', 'text': text}}
+
+
+def run(n_messages, interval, max_rate):
+    """Feed the flood, flushing every `interval` seconds of the clock."""
+    coalescer = StreamCoalescer(max_rate)
+    msgs = [stream_msg(f'{i}\n') for i in range(n_messages)]
+    displayed = 0
+    n_flushes = 0
+
+    start = time.perf_counter()
+    next_flush = start + interval
+    for msg in msgs:
+        now = time.perf_counter()
+        coalescer.feed(msg, now)
+        if now >= next_flush:
+            displayed += len(coalescer.flush(now)[1])
+            n_flushes += 1
+            next_flush = now + interval
+    displayed += len(coalescer.flush(time.perf_counter())[1])
+    elapsed = time.perf_counter() - start
+
+    print(f'{n_messages:>8d} messages in {elapsed:6.3f} s: '
+          f'{n_messages / elapsed:10.1f} msg/s, {n_flushes} flushes, '
+          f'{displayed} lines displayed, {coalescer.dropped} dropped')
+
+
+def main():
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', dest='n_messages', type=int, nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help='number of stream messages')
+    parser.add_argument('--interval', type=float, default=20,
+                        help='ms between two flushes')
+    parser.add_argument('--max-rate', type=int, default=500,
+                        help='maximum lines displayed per second')
+    args = parser.parse_args()
+    for n_messages in args.n_messages:
+        run(n_messages, args.interval / 1000, args.max_rate)
+
+
+if __name__ == '__main__':
+    main()
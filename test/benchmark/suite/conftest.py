@@ -0,0 +1,159 @@
+"""
+Fake `vim` module and fixtures of the pytest-benchmark suite.
+
+The plugin imports `vim`, only available inside vim: a stand-in module is
+installed before the plugin is imported. It keeps the buffers as python
+lists, answers `vim.eval` from a dict of expressions and records the
+commands, so that the python side runs as it does in vim, minus vim itself.
+"""
+
+# Standard
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'python3'))
+
+
+class FakeBuffer(list):
+    """A vim buffer: a list of lines, appending a list appends its lines."""
+    def __init__(self, lines=(), number=1, name=''):
+        super().__init__(lines)
+        self.number = number
+        self.name = name
+        self.vars = dict()
+        self.options = {'modifiable': True}
+
+    def append(self, lines, nr=None):
+        """Append a line or a list of lines, at the end or below line `nr`."""
+        lines = [lines] if isinstance(lines, str) else list(lines)
+        if nr is None:
+            self.extend(lines)
+        else:
+            self[nr:nr] = lines
+
+
+class FakeWindow():
+    """A vim window, showing a buffer with a (1-based line, column) cursor."""
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.cursor = (1, 0)
+
+
+def make_vim():
+    """Make the stand-in `vim` module, empty.
+
+    Attributes
+    ----------
+    evals : dict
+        The value of each expression given to `vim.eval`, or a callable
+        returning it. The variables not in it (`g:`, `b:`...) do not exist.
+    commands : list of str
+        The commands run, in order.
+    """
+    module = types.ModuleType('vim')
+
+    class error(Exception):  # noqa: N801  pylint: disable=invalid-name
+        """As vim.error."""
+
+    def eval_(expr):
+        if expr in module.evals:
+            value = module.evals[expr]
+            return value() if callable(value) else value
+        if expr[:2] in ('g:', 'b:', 'w:', 't:', 's:', 'l:'):
+            raise error(f'E121: Undefined variable: {expr}')
+        return '0'
+
+    def reset(lines=()):
+        """Forget everything, with a current buffer of `lines`."""
+        buffer = FakeBuffer(lines)
+        module.buffers = {buffer.number: buffer}
+        module.current = types.SimpleNamespace(buffer=buffer, window=FakeWindow(buffer))
+        module.current.range = None
+        module.vars = dict()
+        module.commands = list()
+        module.evals = {'&encoding': 'utf-8', 'has("channel")': 0,
+                        'jupyter#ExecHooks()': ['', '', '', '']}
+        return buffer
+
+    def add_buffer(lines=(), name=''):
+        """Add a buffer, not current, return it."""
+        buffer = FakeBuffer(lines, max(module.buffers) + 1, name)
+        module.buffers[buffer.number] = buffer
+        module.evals[f'bufnr("{name}")'] = str(buffer.number)
+        return buffer
+
+    module.error = error
+    module.eval = eval_
+    module.command = lambda cmd: module.commands.append(cmd)
+    module.reset = reset
+    module.add_buffer = add_buffer
+    reset()
+    return module
+
+
+# Before the plugin imports it
+sys.modules['vim'] = VIM = make_vim()
+
+
+@pytest.fixture
+def vim():
+    """The stand-in `vim` module, emptied."""
+    VIM.reset()
+    return VIM
+
+
+@pytest.fixture
+def messenger():
+    """A :obj:`JupyterMessenger`, its thread started, not connected."""
+    from jupyter_messenger import JupyterMessenger  # pylint: disable=import-outside-toplevel
+    client = JupyterMessenger()
+    client.kernel_thread.start()
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def replay(vim):  # pylint: disable=redefined-outer-name,unused-argument
+    """Start `python3/replay_kernel.py` on a load, connect a messenger to it.
+
+    Returns
+    -------
+    callable
+        `connect(load, kernel_thread=None)`, i.e. `connect('flood:20000')`:
+        the connected :obj:`JupyterMessenger`, on its own thread if None.
+    """
+    from jupyter_messenger import JupyterMessenger  # pylint: disable=import-outside-toplevel
+    script = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'python3',
+                          'replay_kernel.py')
+    tmp = tempfile.TemporaryDirectory()
+    started = list()
+
+    def connect(load, kernel_thread=None):
+        connection_file = os.path.join(tmp.name, f'replay-{len(started)}.json')
+        kernel = subprocess.Popen([sys.executable, script, load, '-f', connection_file,
+                                   '--speed', '0'])
+        client = JupyterMessenger(kernel_thread)
+        started.append((kernel, client))
+        deadline = time.monotonic() + 10
+        while not os.path.exists(connection_file) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        time.sleep(0.1)   # Written, not yet closed
+        client.connect('python', connection_file)
+        while not client.check_connection() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        if not client.check_connection():
+            pytest.fail(f'Replay kernel on {load} did not answer')
+        return client
+
+    yield connect
+    for kernel, client in started:
+        client.close()
+        kernel.terminate()
+        kernel.wait()
+    tmp.cleanup()
@@ -0,0 +1,270 @@
+"""
+Benchmarks of the hot paths of the plugin, with synthetic workloads.
+
+    cells: the cell index of a 100k-line buffer, rebuilt, updated after an
+           edit and queried for the bounds of the cell under the cursor
+    messenger: a flood of stream messages and a 10 MB one, received from
+               replay_kernel.py through the sockets, until the kernel is idle
+    monitor: 1M stream messages routed to the monitor, then written to its
+             buffer
+    parsing: `parse_iopub_for_reply` on 100k messages, `echom`, `str_to_vim`
+             and the monitor format of a 10 MB traceback
+
+Run from the root of the repository, see test/README.md.
+"""
+
+# Standard
+import asyncio
+import re
+import time
+
+import pytest
+
+# Local
+from cell_index import CellIndex
+from jupyter_messenger import parse_iopub_for_reply
+from jupyter_util import echom, str_to_vim
+from stream_coalescer import StreamCoalescer
+
+HOOKS = ('', '', '', '')
+N_LINES = 100000
+N_MESSAGES = 1000000
+TRACEBACK_MB = 10
+
+
+def python_buffer(n_lines, cell_lines=20):
+    """Lines of a python file with a `##` cell every `cell_lines` lines."""
+    return ['##' if i % cell_lines == 0 else f'x_{i} = {i} * 2' for i in range(n_lines)]
+
+
+def traceback_lines(megabytes):
+    """The lines of a traceback of about `megabytes` MB."""
+    line = '  File "/site-packages/module.py", line 1234, in function\n    raise ValueError("x")'
+    return [line] * (megabytes * 2**20 // len(line))
+
+
+def stream_msg(msg_id, text, execution_count=None):
+    """A minimal iopub stream message, replying to `msg_id`."""
+    content = {'name': 'stdout', 'text': text}
+    if execution_count is not None:
+        content['execution_count'] = execution_count
+    return {'header': {'msg_type': 'stream'}, 'parent_header': {'msg_id': msg_id},
+            'content': content}
+
+
+# -----------------------------------------------------------------------------
+#        Cells
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def session(vim):
+    """A session without kernel on a 100k-line buffer, cursor in the middle."""
+    from jupyter_vim import JupyterVimSession  # pylint: disable=import-outside-toplevel
+    buffer = vim.reset(python_buffer(N_LINES))
+    vim.current.window.cursor = (N_LINES // 2 + 5, 0)
+    vim.evals['g:jupyter_cell_separators'] = ['##']
+    vim.evals[f'jupyter#cell#Changes({buffer.number})'] = {'tick': 1, 'changes': []}
+    return JupyterVimSession()
+
+
+def test_cell_index_rebuild(benchmark):
+    """Index the separators of a 100k-line buffer."""
+    buffer = python_buffer(N_LINES)
+    index = CellIndex(['##'])
+    benchmark(index.rebuild, buffer)
+    assert len(index.lines) == N_LINES // 20
+
+
+def test_cell_index_update(benchmark):
+    """Update the index of a 100k-line buffer after a line is inserted at the top."""
+    buffer = python_buffer(N_LINES)
+    index = CellIndex(['##'])
+    index.rebuild(buffer)
+
+    def insert_then_delete():
+        buffer.insert(1, 'y = 1')
+        index.update(buffer, [(1, 1, 1)])
+        del buffer[1]
+        index.update(buffer, [(1, 2, -1)])
+    benchmark(insert_then_delete)
+    assert index.lines == [i for i in range(N_LINES) if i % 20 == 0]
+
+
+def test_cell_index_update_batch():
+    """Several changes of one listener call, applied in order, as a rebuild."""
+    buffer = python_buffer(100)
+    index = CellIndex(['##'])
+    index.rebuild(buffer)
+    # Delete lines 10 to 14, then set line 50 (after the delete)
+    del buffer[9:14]
+    buffer[49] = '##'
+    index.update(buffer, [(9, 14, -5), (49, 50, 0)])
+    rebuilt = CellIndex(['##'])
+    rebuilt.rebuild(buffer)
+    assert 49 in rebuilt.lines
+    assert index.lines == rebuilt.lines
+
+
+def test_run_cell_bounds(benchmark, session):  # pylint: disable=redefined-outer-name
+    """Find the cell under the cursor, as `:JupyterSendCell` does."""
+    session.cell_index()
+    bounds = benchmark(session.cell_bounds)
+    assert bounds == (N_LINES // 2 + 1, N_LINES // 2 + 19)
+
+
+# -----------------------------------------------------------------------------
+#        Messenger
+# -----------------------------------------------------------------------------
+async def run_until_idle(client, code):
+    """Execute `code`, count its iopub messages until the kernel is idle."""
+    msg_id = client.execute(code, hooks=HOOKS, allow_stdin=False)
+    outputs = client.router.subscribe('iopub', msg_id, maxlen=N_MESSAGES)
+    reply = client.get_reply(msg_id, 'shell')
+    n_msgs = 0
+    try:
+        while True:
+            msg = await outputs.get()
+            n_msgs += 1
+            if msg['header']['msg_type'] == 'status' and \
+                    msg['content'].get('execution_state') == 'idle':
+                break
+        await reply
+    finally:
+        outputs.close()
+    return n_msgs
+
+
+@pytest.mark.parametrize('load, n_msgs', [('flood:20000', 20003), ('payload:10', 4)])
+def test_messenger_receive(benchmark, replay, load, n_msgs):
+    """Receive the messages of a cell from the replay kernel until it is idle."""
+    client = replay(load)
+
+    def run():
+        return asyncio.run_coroutine_threadsafe(
+            run_until_idle(client, load), client.loop).result(120)
+    assert benchmark.pedantic(run, rounds=3, warmup_rounds=1) == n_msgs
+
+
+@pytest.fixture
+def kernel_thread():
+    """A :obj:`KernelThread` to share, stopped after the clients closed."""
+    from jupyter_messenger import KernelThread  # pylint: disable=import-outside-toplevel
+    thread = KernelThread()
+    yield thread
+    thread.stop()
+
+
+def test_sessions_share_context(kernel_thread, replay):  # pylint: disable=redefined-outer-name
+    """The clients of two kernels use the zmq context of their thread."""
+    first = replay('payload:1', kernel_thread)
+    second = replay('payload:1', kernel_thread)
+    assert first.km_client.context is second.km_client.context
+    assert first.km_client.context is kernel_thread.context
+    # Connected: let the kernel info arrive before closing
+    deadline = time.monotonic() + 10
+    while not (first.kernel_info and second.kernel_info) and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+
+# -----------------------------------------------------------------------------
+#        Monitor
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def monitor(vim, messenger):  # pylint: disable=redefined-outer-name
+    """A monitor of the iopub channel of a messenger, and its buffer."""
+    from monitor_console import Monitor, MonitorFilter  # pylint: disable=import-outside-toplevel
+    buffer = vim.add_buffer(name='__jupyter_monitor__')
+    watch = Monitor(messenger, MonitorFilter(channels=['iopub']))
+    yield watch, buffer
+    watch.stop()
+
+
+def test_monitor_stream_flood(benchmark, messenger, monitor):  # pylint: disable=redefined-outer-name
+    """Route 1M one-line stream messages to the monitor, write them to its buffer."""
+    watch, buffer = monitor
+    # The same message, the coalescer does not keep them
+    msgs = [stream_msg('flood', 'x\n')] * N_MESSAGES
+
+    async def flood():
+        subs = messenger.router.wildcards['iopub']
+        for i_msg, msg in enumerate(msgs):
+            messenger.router.dispatch('iopub', msg)
+            # Let the monitor consume before its queue is full
+            if i_msg % 512 == 511:
+                await asyncio.sleep(0)
+        while any(sub.queue for sub in subs):
+            await asyncio.sleep(0)
+
+    runs = list()
+
+    def run():
+        runs.append(1)
+        asyncio.run_coroutine_threadsafe(flood(), messenger.loop).result(600)
+        watch.write_msgs()
+    benchmark.pedantic(run, rounds=3, warmup_rounds=0)
+    assert buffer.options['modifiable'] is False
+    assert not any(sub.dropped for sub in messenger.router.wildcards['iopub'])
+    # Each line is either shown or counted as dropped by the rate limit
+    shown = [line for line in buffer if line == '[stdout] x']
+    notices = [line for line in buffer if line not in shown]
+    assert all(re.fullmatch(r'\[stdout\] \.\.\. \d+ lines dropped', line) for line in notices)
+    assert len(notices) == len(runs)
+    assert sum(int(line.split()[2]) for line in notices) == watch.coalescer.dropped
+    assert len(shown) + watch.coalescer.dropped == len(runs) * N_MESSAGES
+    assert 0 < len(shown) <= len(runs) * watch.coalescer.max_rate
+
+
+def test_stream_coalescer_max_pending():
+    """The oldest entries beyond max_pending are dropped, and counted."""
+    coalescer = StreamCoalescer(max_rate=100, max_pending=2)
+    coalescer.add_line('a', 0)
+    coalescer.feed(stream_msg('r1', 'x\ny\npartial'), 0)
+    coalescer.add_line('b', 0)
+    coalescer.add_line('c', 0)
+    assert coalescer.flush(1) == (0, ['... 4 lines dropped', 'b', 'c'], 0)
+    assert coalescer.dropped == 4
+    # Counted once
+    coalescer.add_line('d', 0)
+    assert coalescer.flush(2) == (0, ['d'], 0)
+
+
+# -----------------------------------------------------------------------------
+#        Parsing and display
+# -----------------------------------------------------------------------------
+def test_parse_iopub_for_reply(benchmark):
+    """Find the result of a request behind 100k messages of other executions."""
+    msgs = [stream_msg('other', f'{i}\n', execution_count=2) for i in range(100000)]
+    msgs.append({'header': {'msg_type': 'error'}, 'parent_header': {'msg_id': 'info'},
+                 'content': {'execution_count': 1, 'ename': 'ValueError', 'evalue': '',
+                             'traceback': traceback_lines(TRACEBACK_MB)}})
+    msgs.append({'header': {'msg_type': 'execute_result'}, 'parent_header': {'msg_id': 'info'},
+                 'content': {'execution_count': 1, 'data': {'text/plain': "'result'"}}})
+    assert benchmark(parse_iopub_for_reply, msgs, 1) == "'result'"
+
+
+def test_echom_traceback(benchmark, vim):  # pylint: disable=redefined-outer-name
+    """Echo a 10 MB traceback, one `:echom` per line."""
+    traceback = '\n'.join(traceback_lines(TRACEBACK_MB))
+
+    def run():
+        vim.commands.clear()
+        echom(traceback, style='ErrorMsg')
+    benchmark.pedantic(run, rounds=5)
+    assert len(vim.commands) == traceback.count('\n') + 3
+
+
+def test_str_to_vim_traceback(benchmark):
+    """Quote a 10 MB traceback for vim."""
+    traceback = '\n'.join(traceback_lines(TRACEBACK_MB))
+    quoted = benchmark(str_to_vim, traceback)
+    assert quoted.startswith('"') and quoted.endswith('"')
+
+
+@pytest.mark.parametrize('maxlen', [None, 200])
+def test_monitor_format_traceback(benchmark, maxlen):
+    """Format an error message with a 10 MB traceback for the monitor."""
+    from monitor_console import MonitorFilter  # pylint: disable=import-outside-toplevel
+    msg = {'header': {'msg_type': 'error'}, 'parent_header': {'msg_id': 'x'},
+           'content': {'ename': 'ValueError', 'evalue': '',
+                       'traceback': traceback_lines(TRACEBACK_MB)}}
+    line = benchmark(MonitorFilter(maxlen=maxlen).format, 'iopub', msg)
+    assert maxlen is None or len(line) <= maxlen + 3
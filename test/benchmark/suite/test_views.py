@@ -0,0 +1,368 @@
+"""
+Checks of the buffers filled from the kernel, with the fake `vim` module.
+
+    view: the lines of :obj:`MappedText`, cut and decoded, and the
+          `__jupyter_view__` buffer filled page by page
+    fetch: the pages of the kernel, parsed and read a page ahead by
+           :obj:`KernelPages`
+    variables: the rows of the `__jupyter_variables__` sidebar, edited in
+               place from the diffs of the kernel, written once shown, and
+               the snapshot hook of the kernel making the diffs
+
+Plain tests, no benchmark: run with the suite, see test/README.md.
+"""
+
+# Standard
+import asyncio
+import itertools
+import json
+import textwrap
+import types
+
+import pytest
+
+# Local
+import scratch_view
+from jupyter_messenger import parse_page
+from language import Python
+from scratch_view import KernelPages, MappedText, ScratchView
+from variable_explorer import HEADER, VariableExplorer, format_row, format_size
+
+
+def mapped(tmp_path, data):
+    """A :obj:`MappedText` of the bytes `data`."""
+    path = tmp_path / 'text.txt'
+    path.write_bytes(data)
+    return MappedText(str(path))
+
+
+# -----------------------------------------------------------------------------
+#        View
+# -----------------------------------------------------------------------------
+def test_mapped_text_lines(tmp_path):
+    """Read the lines a page at a time, the file removed once mapped."""
+    text = mapped(tmp_path, b'a\nb\n\nc\n')
+    assert not (tmp_path / 'text.txt').exists()
+    assert text.read_lines(2) == ['a', 'b']
+    assert not text.done
+    assert text.read_lines(5) == ['', 'c']
+    assert text.done
+    assert text.read_lines(5) == []
+    text.close()
+
+
+def test_mapped_text_empty(tmp_path):
+    """An empty file has no line, and is done at once."""
+    text = mapped(tmp_path, b'')
+    assert text.done
+    assert text.read_lines(10) == []
+    text.close()
+
+
+def test_mapped_text_nul(tmp_path):
+    """NUL is shown as `\\0`: vim cannot hold it in a line."""
+    text = mapped(tmp_path, b'a\0b\n\0')
+    assert text.read_lines(10) == ['a\\0b', '\\0']
+
+
+def test_mapped_text_long_line(tmp_path, monkeypatch):
+    """A line longer than MAX_LINE_BYTES is cut, never inside a character."""
+    monkeypatch.setattr(scratch_view, 'MAX_LINE_BYTES', 8)
+    # 'é' is 2 bytes: the 8th byte is the first half of the 4th one
+    text = mapped(tmp_path, 'aéééé\nb'.encode('utf-8'))
+    assert text.read_lines(1) == ['aééé']
+    assert text.read_lines(1) == ['é']
+    assert text.read_lines(5) == ['b']
+    assert text.done
+
+
+def test_mapped_text_long_line_no_newline(tmp_path, monkeypatch):
+    """A text without newline is cut in lines of MAX_LINE_BYTES."""
+    monkeypatch.setattr(scratch_view, 'MAX_LINE_BYTES', 4)
+    text = mapped(tmp_path, b'0123456789')
+    assert text.read_lines(10) == ['0123', '4567', '89']
+
+
+@pytest.fixture
+def view_buffer(vim):
+    """The `__jupyter_view__` buffer, returned by `jupyter#view#Open()`."""
+    buffer = vim.add_buffer(name='__jupyter_view__')
+    vim.evals['jupyter#view#Open()'] = str(buffer.number)
+    return buffer
+
+
+def test_scratch_view_pages(tmp_path, view_buffer):  # pylint: disable=redefined-outer-name
+    """The first page is shown at once, the next one appended by `more`."""
+    text = mapped(tmp_path, ''.join(f'{i}\n' for i in range(5)).encode())
+    view = ScratchView(text, 'x', page_lines=2)
+    assert view_buffer == ['0', '1']
+    assert view_buffer.vars == {'jupyter_view_title': 'x', 'jupyter_view_done': 0}
+    view.more()
+    view.more()
+    assert view_buffer == ['0', '1', '2', '3', '4']
+    assert view_buffer.vars['jupyter_view_done'] == 1
+    view.close()
+
+
+def test_scratch_view_empty(tmp_path, view_buffer):  # pylint: disable=redefined-outer-name
+    """An empty value shows one empty line, done."""
+    ScratchView(mapped(tmp_path, b''), 'x', page_lines=2)
+    assert view_buffer == ['']
+    assert view_buffer.vars['jupyter_view_done'] == 1
+
+
+# -----------------------------------------------------------------------------
+#        Fetch
+# -----------------------------------------------------------------------------
+def test_parse_page():
+    """Split "last;count;lines", the lines may hold `;`."""
+    assert parse_page('0;2;a\nb') == (['a', 'b'], False)
+    assert parse_page('1;1;a;b') == (['a;b'], True)
+    assert parse_page('1;1;') == ([''], True)
+    assert parse_page('1;0;') == ([], True)
+
+
+@pytest.fixture
+def kernel_lines(messenger):  # pylint: disable=redefined-outer-name
+    """A messenger whose `fetch_page` serves the lines '0' to '6'.
+
+    Returns
+    -------
+    (:obj:`JupyterMessenger`, list, :obj:`asyncio.Event`)
+        The messenger, the (token, count) of each call, and the event a call
+        waits for: set, unless cleared to keep a page on its way.
+    """
+    lines = iter(str(i) for i in range(7))
+    calls = list()
+    arrived = asyncio.Event()
+    arrived.set()
+
+    async def fetch_page(token, count):
+        calls.append((token, count))
+        await arrived.wait()
+        page = list(itertools.islice(lines, count))
+        return page, len(page) < count or not count
+    messenger.fetch_page = fetch_page
+    return messenger, calls, arrived
+
+
+def test_kernel_pages_ahead(kernel_lines):  # pylint: disable=redefined-outer-name
+    """The next page is fetched when the lines run out, until the last."""
+    client, calls, _ = kernel_lines
+    pages = KernelPages(client, 'tok', ['a', 'b', 'c'], False)
+    assert pages.read_lines(2) == ['a', 'b']
+    assert not calls
+    assert pages.read_lines(2) == ['c']
+    pages.ahead.result(5)
+    assert calls == [('tok', 2)]
+    assert pages.read_lines(2) == ['0', '1']
+    for _ in range(2):
+        pages.ahead.result(5)
+        pages.read_lines(2)
+    pages.ahead.result(5)
+    assert pages.read_lines(2) == ['6']
+    assert pages.done
+    assert pages.ahead is None and len(calls) == 4
+    pages.close()
+    assert len(calls) == 4
+
+
+def test_kernel_pages_pending(kernel_lines):  # pylint: disable=redefined-outer-name
+    """Reading never waits: no line while the next page is on its way."""
+    client, _, arrived = kernel_lines
+    client.loop.call_soon_threadsafe(arrived.clear)
+    pages = KernelPages(client, 'tok', [], False)
+    assert pages.read_lines(2) == []
+    assert pages.read_lines(2) == []
+    assert not pages.done
+    client.loop.call_soon_threadsafe(arrived.set)
+    pages.ahead.result(5)
+    assert pages.read_lines(2) == ['0', '1']
+    # The page after, already asked
+    pages.ahead.result(5)
+
+
+def test_kernel_pages_close(kernel_lines):  # pylint: disable=redefined-outer-name
+    """Closing before the last page releases the iterator of its token."""
+    client, calls, _ = kernel_lines
+    pages = KernelPages(client, 'tok', ['a'], False)
+    pages.close()
+    assert pages.done and pages.read_lines(2) == []
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(0), client.loop).result(5)
+    assert calls == [('tok', 0)]
+
+
+def test_scratch_view_kernel_pages(kernel_lines, view_buffer):  # pylint: disable=redefined-outer-name
+    """A page asked before it arrived is appended by `drain` once it did."""
+    client, _, arrived = kernel_lines
+    client.loop.call_soon_threadsafe(arrived.clear)
+    view = ScratchView(KernelPages(client, 'tok', ['a', 'b'], False), 'x', page_lines=2)
+    assert view_buffer == ['a', 'b']
+    view.more()
+    assert view.wanted and view_buffer == ['a', 'b']
+    view.drain()
+    assert view_buffer == ['a', 'b']
+    client.loop.call_soon_threadsafe(arrived.set)
+    view.source.ahead.result(5)
+    view.drain()
+    assert not view.wanted
+    assert view_buffer == ['a', 'b', '0', '1']
+    assert view_buffer.vars['jupyter_view_done'] == 0
+    view.source.ahead.result(5)
+
+
+# -----------------------------------------------------------------------------
+#        Variables
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def sidebar(vim, messenger):  # pylint: disable=redefined-outer-name
+    """A :obj:`VariableExplorer` on no variable, and its buffer.
+
+    The diffs are then put in its queue as the kernel would send them, see
+    :func:`apply`.
+    """
+    buffer = vim.add_buffer(name='__jupyter_variables__')
+    vim.evals['jupyter#variables#Open()'] = str(buffer.number)
+    scroll(vim, buffer, 1, 1000)
+
+    async def evaluate(code, expression):  # pylint: disable=unused-argument
+        return json.dumps({'changed': [], 'deleted': []})
+    messenger.evaluate = evaluate
+    explorer = VariableExplorer(messenger)
+    # The first refresh, full
+    explorer.diffs.put(explorer.diffs.get(timeout=5))
+    explorer.write_rows()
+    yield explorer, buffer
+    explorer.stop()
+
+    async def cancelled():
+        # Before the loop stops
+        await asyncio.gather(*(task for task in asyncio.all_tasks()
+                               if task is not asyncio.current_task()),
+                             return_exceptions=True)
+    asyncio.run_coroutine_threadsafe(cancelled(), messenger.loop).result(5)
+
+
+def scroll(vim, buffer, first, last):  # pylint: disable=redefined-outer-name
+    """Show the lines `first` to `last` of the sidebar in its window."""
+    vim.evals[f'jupyter#variables#Visible({buffer.number:d})'] = [[str(first), str(last)]]
+
+
+def apply(explorer, changed=(), deleted=(), full=False):
+    """Write a diff of the kernel to the sidebar."""
+    explorer.diffs.put((full, {'changed': [list(row) for row in changed],
+                               'deleted': list(deleted)}))
+    explorer.write_rows()
+
+
+def rows(*variables):
+    """The lines of the sidebar listing these (name, type, shape, size)."""
+    return [HEADER] + [format_row(*variable) for variable in variables]
+
+
+A = ('a', 'int', '', 28)
+B = ('b', 'list', '3', 80)
+C = ('c', 'str', '5', 54)
+
+
+def test_format_size():
+    """Sizes in bytes up to 1 kB, then with one decimal."""
+    assert format_size(512) == '512 B'
+    assert format_size(1536) == '1.5 kB'
+    assert format_size(12 * 2**20) == '12.0 MB'
+    assert format_size(3 * 2**40) == '3072.0 GB'
+
+
+def test_variables_sorted(sidebar):  # pylint: disable=redefined-outer-name
+    """The rows are inserted sorted by name, whatever the order of the diff."""
+    explorer, buffer = sidebar
+    assert buffer == [HEADER]
+    apply(explorer, [C, A])
+    apply(explorer, [B])
+    assert buffer == rows(A, B, C)
+    assert explorer.names == ['a', 'b', 'c']
+    assert buffer.vars['jupyter_variables_count'] == 3
+
+
+def test_variables_edit_in_place(sidebar):  # pylint: disable=redefined-outer-name
+    """A changed row is rewritten, a deleted one removed, the others kept."""
+    explorer, buffer = sidebar
+    apply(explorer, [A, B, C])
+    kept = buffer[1]
+    new_b = ('b', 'list', '4', 88)
+    apply(explorer, [new_b], deleted=['c', 'unknown'])
+    assert buffer == rows(A, new_b)
+    assert buffer[1] is kept
+    assert explorer.names == ['a', 'b']
+    apply(explorer, deleted=['a', 'b'])
+    assert buffer == [HEADER]
+    assert buffer.vars['jupyter_variables_count'] == 0
+
+
+def test_variables_full(sidebar):  # pylint: disable=redefined-outer-name
+    """A full diff, i.e. after a restart of the kernel, replaces all the rows."""
+    explorer, buffer = sidebar
+    apply(explorer, [A, B])
+    apply(explorer, [C], full=True)
+    assert buffer == rows(C)
+    assert explorer.names == ['c']
+
+
+def test_variables_large_diff(sidebar):  # pylint: disable=redefined-outer-name
+    """Many rows are merged and written at once, sorted."""
+    explorer, buffer = sidebar
+    apply(explorer, [A, C])
+    many = [(f'v{i:03d}', 'int', '', 28) for i in range(150)]
+    apply(explorer, many[::-1] + [('a', 'float', '', 24)], deleted=['c'])
+    assert buffer == rows(('a', 'float', '', 24), *many)
+    assert explorer.names == ['a'] + [name for name, *_ in many]
+    # Then back to the edits in place
+    apply(explorer, [B])
+    assert buffer == rows(('a', 'float', '', 24), B, *many)
+
+
+def test_variables_dirty_until_shown(vim, sidebar):  # pylint: disable=redefined-outer-name
+    """A changed row out of view is written once scrolled into view."""
+    explorer, buffer = sidebar
+    apply(explorer, [A, B, C])
+    # The header and 'a' shown
+    scroll(vim, buffer, 1, 2)
+    new_a, new_b, new_c = ('a', 'int', '', 32), ('b', 'list', '4', 88), ('c', 'str', '6', 55)
+    apply(explorer, [new_a, new_b, new_c])
+    assert buffer == rows(new_a, B, C)
+    assert buffer.vars['jupyter_variables_dirty'] == 1
+    # Deleted before shown: nothing left to write
+    apply(explorer, deleted=['b'])
+    assert list(explorer.dirty) == ['c']
+    scroll(vim, buffer, 2, 3)
+    explorer.show_rows()
+    assert buffer == rows(new_a, new_c)
+    assert buffer.vars['jupyter_variables_dirty'] == 0
+
+
+def snapshot_hook(user_ns):
+    """The snapshot hook of Python, defined in the namespace `user_ns`."""
+    shell = types.SimpleNamespace(user_ns=user_ns, user_ns_hidden=dict())
+    user_ns['get_ipython'] = lambda: shell
+    exec(textwrap.dedent(Python.variables), user_ns)  # pylint: disable=exec-used
+    return lambda: json.loads(user_ns['_jupyter_vim_variables']())
+
+
+def test_variables_hook_in_place():
+    """The hook reports the variables changed in place, not the others."""
+    user_ns = {'lst': [1, 2], 'table': {i: i for i in range(5)}, 'n': 1}
+    diff = snapshot_hook(user_ns)
+    assert sorted(name for name, *_ in diff()['changed']) == ['lst', 'n', 'table']
+    assert diff() == {'changed': [], 'deleted': []}
+    user_ns['lst'].append(3)
+    # Grown then back to its length: the same shape, not the same size
+    table = user_ns['table']
+    table.update((i, i) for i in range(5, 100))
+    for i in range(5, 100):
+        del table[i]
+    changed = {name: fields for name, *fields in diff()['changed']}
+    assert sorted(changed) == ['lst', 'table']
+    assert changed['lst'][1] == '3'
+    assert changed['table'][1] == '5'
+    del user_ns['n']
+    assert diff() == {'changed': [], 'deleted': ['n']}
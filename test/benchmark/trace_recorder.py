@@ -0,0 +1,75 @@
+"""
+Cost of recording the kernel messages with `:JupyterTraceStart`.
+
+Serializes the `stream` messages of a `print` loop as a kernel would, then
+receives them as the channel listener does:
+    off: deserialize each message (the receive path without trace)
+    on: deserialize then record it in a :obj:`TraceRecorder` of `--size`
+        messages (the ring wraps around when `-n` exceeds it)
+and reports the time per message of each, and the overhead of the recorder.
+
+Needs `jupyter_client` (no vim, no kernel):
+    $ python3 test/benchmark/trace_recorder.py -n 100000
+"""
+
+# Standard
+import argparse
+import os
+import sys
+import time
+
+# Py module
+from jupyter_client.session import Session
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'python3'))
+from trace_recorder import TraceRecorder  # noqa: E402  pylint: disable=wrong-import-position
+
+KEY = b'benchmark'
+
+
+def serialized_flood(session, n_messages):
+    """The frames of `n_messages` stream messages, one per line printed."""
+    parent = session.msg('execute_request')
+    return [session.serialize(session.msg('stream', {'name': 'stdout', 'text': f'{i}\n'},
+                                          parent=parent))
+            for i in range(n_messages)]
+
+
+def receive(key, flood, trace):
+    """Deserialize (and record) every message, return the seconds elapsed."""
+    # A new session each time: a session rejects the signatures it saw
+    session = Session(key=key)
+    start = time.perf_counter()
+    for frames in flood:
+        msg = session.deserialize(session.feed_identities(frames)[1])
+        if trace is not None and trace.active:
+            trace.record(session, 1, msg, sum(map(len, frames)))
+    return time.perf_counter() - start
+
+
+def main():
+    """Parse arguments and receive the flood with and without the recorder."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', dest='n_messages', type=int, default=100000,
+                        help='number of stream messages')
+    parser.add_argument('--size', type=int, default=100000, help='messages kept by the recorder')
+    args = parser.parse_args()
+
+    flood = serialized_flood(Session(key=KEY), args.n_messages)
+    trace = TraceRecorder(args.size)
+    trace.start()
+
+    # Alternate to share the noise, keep the best of each
+    times = {'off': [], 'on': []}
+    for _ in range(3):
+        times['off'].append(receive(KEY, flood, None))
+        times['on'].append(receive(KEY, flood, trace))
+    off, on = min(times['off']), min(times['on'])
+    for mode, elapsed in (('off', off), ('on', on)):
+        print(f'{mode:>3s}: {1e6 * elapsed / args.n_messages:6.2f} us/msg')
+    print(f'recorder: {1e9 * (on - off) / args.n_messages:6.0f} ns/msg, '
+          f'{100 * (on - off) / off:4.1f} % of the receive path')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Variables of the kernel listed whole vs as a diff, as `:JupyterVariables`.
+
+For each size, the kernel holds `-n` variables, then one is assigned and:
+    full: the snapshot hook is defined again, all the variables are listed
+    diff: the hook lists the variables changed since its last call only,
+          as after each execution
+and reports the milliseconds of each, the bytes of the reply and the rows to
+rewrite. The diff should only grow with the number of variables compared,
+not with the rows sent.
+
+Needs `jupyter_client` and `ipykernel` (no vim):
+    $ python3 test/benchmark/variables.py -n 100 1000 10000
+"""
+
+# Standard
+import argparse
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', '..', 'python3'))
+# pylint: disable=wrong-import-position
+from replay import kernel_messenger, run  # noqa: E402
+
+
+def snapshot(messenger, full):
+    """Assign a variable, list the variables. Return the seconds, bytes and rows."""
+    run(messenger, messenger.execute_timed('v0 = [v0]', ('', '', '', '')))
+    lang = messenger.lang
+    start = time.perf_counter()
+    text = run(messenger, messenger.evaluate(lang.variables if full else '',
+                                             lang.variables_diff))
+    seconds = time.perf_counter() - start
+    diff = json.loads(text)
+    return seconds, len(text), len(diff['changed']) + len(diff['deleted'])
+
+
+def main():
+    """Parse arguments, start a kernel and compare both listings for each size."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', dest='sizes', type=int, nargs='+',
+                        default=[100, 1000, 10000], help='variables of the kernel')
+    parser.add_argument('-r', dest='repeat', type=int, default=5, help='runs, the best is kept')
+    args = parser.parse_args()
+
+    with kernel_messenger() as messenger:
+        for size in args.sizes:
+            run(messenger, messenger.execute_timed(
+                f'for _i in range({size}): globals()[f"v{{_i}}"] = list(range(_i % 100))',
+                ('', '', '', '')))
+            full = min(snapshot(messenger, True) for _ in range(args.repeat))
+            diff = min(snapshot(messenger, False) for _ in range(args.repeat))
+            print(f'{size:>8d} variables: full {1e3 * full[0]:7.1f} ms ({full[1]:>8d} B, '
+                  f'{full[2]:>6d} rows), diff {1e3 * diff[0]:7.1f} ms ({diff[1]:>8d} B, '
+                  f'{diff[2]:>6d} rows)')
+
+
+if __name__ == '__main__':
+    main()